@@ -54,6 +54,53 @@ class DocumentConverterService {
     }
   }
 
+  /**
+   * Convert several documents in a single request
+   * @param {Array<{buffer: Buffer, filename: string}>} files - Files to convert
+   * @param {Array} allowedTags - List of allowed HTML tags from TinyMCE
+   * @returns {Object} Per-file results and a summary
+   */
+  async convertDocuments(files, allowedTags = null) {
+    try {
+      const form = new FormData();
+      
+      // Add files
+      for (const file of files) {
+        form.append('files', file.buffer, {
+          filename: file.filename,
+          contentType: this.getMimeType(file.filename)
+        });
+      }
+      
+      // Add allowed tags if provided
+      if (allowedTags && Array.isArray(allowedTags)) {
+        form.append('allowed_tags', allowedTags.join(','));
+      }
+      
+      // Add extract images flag
+      form.append('extract_images', 'true');
+      
+      // Make request to Python service
+      const response = await axios.post(`${this.baseURL}/convert/batch`, form, {
+        headers: {
+          ...form.getHeaders()
+        },
+        maxContentLength: Infinity,
+        maxBodyLength: Infinity
+      });
+      
+      return response.data;
+    } catch (error) {
+      console.error('Batch document conversion error:', error.message);
+      
+      if (error.response) {
+        throw new Error(error.response.data.detail || 'Batch document conversion failed');
+      }
+      
+      throw new Error('Document conversion service unavailable');
+    }
+  }
+
   /**
    * Check if document conversion service is healthy
    * @returns {boolean} Service health status
@@ -0,0 +1,180 @@
+"""Admission control and size-aware scheduling for conversions"""
+import asyncio
+import logging
+import math
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict
+
+from app.config import settings
+from app.utils import count_embedded_images
+
+logger = logging.getLogger(__name__)
+
+
+class AdmissionRejected(Exception):
+    """Raised when the wait queue is full; carries a Retry-After hint"""
+    
+    def __init__(self, retry_after: int):
+        super().__init__(f"Too many conversions in progress, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+def classify(size: int, image_count: int) -> str:
+    """
+    Pick the scheduling lane for a document
+    
+    Args:
+        size: Upload size in bytes
+        image_count: Number of packaged images
+        
+    Returns:
+        'small' for documents eligible for the reserved fast lane,
+        otherwise 'large'
+    """
+    if size <= settings.SMALL_DOCUMENT_MAX_SIZE and image_count <= settings.SMALL_DOCUMENT_MAX_IMAGES:
+        return 'small'
+    return 'large'
+
+
+async def classify_document(document: Dict[str, Any]) -> str:
+    """
+    Pick the scheduling lane for a spooled document
+    
+    The zip directory is read in a worker thread. Archive members must be
+    spooled first, since seeking in a compressed member decompresses it.
+    
+    Args:
+        document: Spooled document returned by DocumentConverter.spool()
+        
+    Returns:
+        Lane name for AdmissionController.slot()
+    """
+    image_count = await asyncio.to_thread(count_embedded_images, document['source'])
+    return classify(document['size'], image_count)
+
+
+class AdmissionController:
+    """Limit conversions in flight and bound how many may wait for a slot
+    
+    Slots are shared by two lanes: small documents may use any free slot,
+    while large ones may never take the last `reserved_small` slots, so a
+    one-paragraph upload never queues behind a batch of image-heavy manuals.
+    """
+    
+    def __init__(self, max_concurrent: int = 4, max_queued: int = 16, reserved_small: int = 1):
+        """
+        Initialize admission controller
+        
+        Args:
+            max_concurrent: Conversions allowed to run at once
+            max_queued: Conversions allowed to wait for a free slot
+            reserved_small: Slots only small documents may use
+        """
+        self.max_concurrent = max_concurrent
+        self.max_queued = max_queued
+        self.reserved_small = min(reserved_small, max_concurrent - 1)
+        
+        self._condition = None
+        self._loop = None
+        self._in_flight = {'small': 0, 'large': 0}
+        self._queued = {'small': 0, 'large': 0}
+        self._average_seconds = 0.0
+        self._completed = 0
+    
+    @property
+    def in_flight(self) -> int:
+        """Conversions currently holding a slot"""
+        return self._in_flight['small'] + self._in_flight['large']
+    
+    @property
+    def queued(self) -> int:
+        """Conversions waiting for a slot"""
+        return self._queued['small'] + self._queued['large']
+    
+    def check(self, lane: str = 'large'):
+        """Raise AdmissionRejected if a new request in lane would not be queued"""
+        if not self._can_start(lane) and self.queued >= self.max_queued:
+            raise AdmissionRejected(self.retry_after())
+    
+    @asynccontextmanager
+    async def slot(self, lane: str = 'large', reject: bool = True) -> AsyncIterator[None]:
+        """
+        Hold a conversion slot for the duration of the block
+        
+        Args:
+            lane: 'small' or 'large', as returned by classify()
+            reject: Raise AdmissionRejected when the wait queue is full;
+                internal callers that are already admitted (batch items,
+                background jobs) pass False to wait regardless
+        """
+        if reject:
+            self.check(lane)
+        
+        # asyncio primitives are bound to one loop; recreate for a new one
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._condition = asyncio.Condition()
+        condition = self._condition
+        
+        async with condition:
+            self._queued[lane] += 1
+            try:
+                await condition.wait_for(lambda: self._can_start(lane))
+            finally:
+                self._queued[lane] -= 1
+            self._in_flight[lane] += 1
+        
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            async with condition:
+                self._in_flight[lane] -= 1
+                condition.notify_all()
+            self._record(time.monotonic() - started)
+    
+    def retry_after(self) -> int:
+        """Seconds until a queued request could expect to start"""
+        average = self._average_seconds or 1.0
+        waves = math.ceil((self.queued + 1) / self.max_concurrent)
+        return max(1, math.ceil(average * waves))
+    
+    def stats(self) -> Dict[str, Any]:
+        """Return current load for the health endpoint"""
+        return {
+            'in_flight': self.in_flight,
+            'queued': self.queued,
+            'max_concurrent': self.max_concurrent,
+            'max_queued': self.max_queued,
+            'average_seconds': round(self._average_seconds, 3),
+            'lanes': {
+                lane: {'in_flight': self._in_flight[lane], 'queued': self._queued[lane]}
+                for lane in ('small', 'large')
+            },
+            'reserved_small': self.reserved_small
+        }
+    
+    def _can_start(self, lane: str) -> bool:
+        """Whether a conversion in lane could take a slot right now"""
+        if self.in_flight >= self.max_concurrent:
+            return False
+        if lane == 'large':
+            return self._in_flight['large'] < self.max_concurrent - self.reserved_small
+        return True
+    
+    def _record(self, seconds: float):
+        """Update the moving average of conversion time"""
+        self._completed += 1
+        if self._completed == 1:
+            self._average_seconds = seconds
+        else:
+            self._average_seconds += 0.2 * (seconds - self._average_seconds)
+
+
+admission = AdmissionController(
+    max_concurrent=settings.MAX_CONCURRENT_CONVERSIONS,
+    max_queued=settings.MAX_QUEUED_CONVERSIONS,
+    reserved_small=settings.SMALL_LANE_SLOTS
+)
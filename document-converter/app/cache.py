@@ -0,0 +1,340 @@
+"""Content-addressed cache for conversion results"""
+import asyncio
+import copy
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Bump when the shape of cached results or the conversion pipeline changes
+CACHE_SCHEMA_VERSION = 9
+
+# Settings that change the conversion output; changing one must miss the cache
+OUTPUT_SETTINGS = (
+    'PAGEBREAK_MARKER',
+    'SANITIZER_ENGINE',
+    'SANITIZER_INLINE_STYLES',
+    'ODT_STREAMING_PARSE',
+    'MAX_IMAGE_SIZE',
+    'IMAGE_QUALITY',
+    'IMAGE_MAX_DIMENSION',
+    'IMAGE_PASSTHROUGH_MAX_BYTES',
+    'IMAGE_PASSTHROUGH_MAX_DIMENSION',
+    'IMAGE_VARIANT_WIDTHS',
+    'IMAGE_VARIANT_FORMATS',
+    'IMAGE_SIZES',
+    'IMAGE_PLACEHOLDER_SIZE',
+)
+
+
+class ConversionCache:
+    """Two-tier (memory LRU + disk) cache of conversion results
+    
+    get/set block on disk I/O and JSON (de)serialization; coroutines use
+    lookup/store, which run them in a worker thread.
+    """
+    
+    def __init__(
+        self,
+        cache_dir: Path,
+        max_memory_entries: int = 128,
+        max_memory_bytes: int = 64 * 1024 * 1024,
+        max_disk_bytes: int = 512 * 1024 * 1024,
+        ttl_seconds: int = 24 * 60 * 60,
+        enabled: bool = True
+    ):
+        """
+        Initialize conversion cache
+        
+        Args:
+            cache_dir: Directory for the on-disk tier
+            max_memory_entries: Maximum number of results kept in memory
+            max_memory_bytes: Maximum total (serialized) size of the
+                results kept in memory
+            max_disk_bytes: Maximum total size of the on-disk tier
+            ttl_seconds: Maximum age of a cached result
+            enabled: Whether lookups and stores are performed at all
+        """
+        self.cache_dir = Path(cache_dir)
+        self.max_memory_entries = max_memory_entries
+        self.max_memory_bytes = max_memory_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self.ttl_seconds = ttl_seconds
+        self.enabled = enabled
+        
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()
+        self._memory_bytes = 0
+        self._lock = threading.Lock()
+        self._disk_bytes: Optional[int] = None
+        self._counters = {
+            'memory_hits': 0,
+            'disk_hits': 0,
+            'misses': 0,
+            'stores': 0,
+            'evictions': 0
+        }
+    
+    @staticmethod
+    def make_key(
+        content_hash: str,
+        extension: str,
+        allowed_tags: List[str],
+        allowed_attributes: Dict[str, List[str]],
+        allowed_styles: List[str],
+        extract_images: bool
+    ) -> str:
+        """
+        Build cache key from document hash and conversion options
+        
+        The current values of OUTPUT_SETTINGS are part of the key.
+        
+        Args:
+            content_hash: SHA256 hex digest of the document bytes
+            extension: Document extension (selects the parser)
+            allowed_tags: List of allowed HTML tags
+            allowed_attributes: Dict of allowed attributes per tag
+            allowed_styles: List of allowed CSS properties
+            extract_images: Whether images are extracted
+        
+        Returns:
+            Hex digest identifying the conversion
+        """
+        options = json.dumps({
+            'version': CACHE_SCHEMA_VERSION,
+            'extension': extension,
+            'tags': sorted(allowed_tags),
+            'attributes': {tag: sorted(attrs) for tag, attrs in allowed_attributes.items()},
+            'styles': sorted(allowed_styles),
+            'extract_images': extract_images,
+            'settings': {name: getattr(settings, name) for name in OUTPUT_SETTINGS}
+        }, sort_keys=True)
+        return hashlib.sha256(f"{content_hash}:{options}".encode()).hexdigest()
+    
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Return a copy of the cached result for key, or None"""
+        if not self.enabled:
+            return None
+        
+        now = time.time()
+        
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                stored_at, result, _ = entry
+                if now - stored_at <= self.ttl_seconds:
+                    self._memory.move_to_end(key)
+                    self._counters['memory_hits'] += 1
+                    return copy.deepcopy(result)
+                self._forget_memory(key)
+        
+        loaded = self._read_disk(key, now)
+        
+        with self._lock:
+            if loaded is None:
+                self._counters['misses'] += 1
+                return None
+            result, size = loaded
+            self._counters['disk_hits'] += 1
+            self._remember(key, result, size, now)
+        
+        return copy.deepcopy(result)
+    
+    def set(self, key: str, result: Dict[str, Any]):
+        """Store a conversion result in both tiers"""
+        if not self.enabled:
+            return
+        
+        now = time.time()
+        stored = copy.deepcopy(result)
+        payload = json.dumps(stored).encode('utf-8')
+        
+        with self._lock:
+            self._remember(key, stored, len(payload), now)
+            self._counters['stores'] += 1
+        
+        self._write_disk(key, payload)
+    
+    async def lookup(self, key: str) -> Optional[Dict[str, Any]]:
+        """get() in a worker thread, for use on the event loop"""
+        if not self.enabled:
+            return None
+        return await asyncio.to_thread(self.get, key)
+    
+    async def store(self, key: str, result: Dict[str, Any]):
+        """set() in a worker thread, for use on the event loop"""
+        if not self.enabled:
+            return
+        await asyncio.to_thread(self.set, key, result)
+    
+    def clear(self):
+        """Drop every cached result"""
+        with self._lock:
+            self._memory.clear()
+            self._memory_bytes = 0
+            for path in self._disk_entries():
+                self._unlink(path)
+            self._disk_bytes = 0
+    
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/miss counters and tier sizes"""
+        with self._lock:
+            lookups = self._counters['memory_hits'] + self._counters['disk_hits'] + self._counters['misses']
+            hits = self._counters['memory_hits'] + self._counters['disk_hits']
+            return {
+                **self._counters,
+                'hit_ratio': round(hits / lookups, 4) if lookups else 0.0,
+                'memory_entries': len(self._memory),
+                'memory_bytes': self._memory_bytes,
+                'disk_bytes': self._disk_bytes or 0,
+                'enabled': self.enabled
+            }
+    
+    def _remember(self, key: str, result: Dict[str, Any], size: int, stored_at: float):
+        """
+        Insert into the memory tier (caller holds the lock)
+        
+        Least recently used entries are evicted until both the entry count
+        and the byte budget are met; a result larger than the whole budget
+        is only kept on disk.
+        """
+        if key in self._memory:
+            self._forget_memory(key)
+        if size > self.max_memory_bytes:
+            return
+        
+        self._memory[key] = (stored_at, result, size)
+        self._memory_bytes += size
+        while len(self._memory) > self.max_memory_entries or self._memory_bytes > self.max_memory_bytes:
+            self._forget_memory(next(iter(self._memory)))
+            self._counters['evictions'] += 1
+    
+    def _forget_memory(self, key: str):
+        """Drop an entry from the memory tier (caller holds the lock)"""
+        _, _, size = self._memory.pop(key)
+        self._memory_bytes -= size
+    
+    def _entry_path(self, key: str) -> Path:
+        """Path of the on-disk entry for key (sharded by prefix)"""
+        return self.cache_dir / key[:2] / f"{key}.json"
+    
+    def _disk_entries(self) -> List[Path]:
+        """List all on-disk entries"""
+        if not self.cache_dir.exists():
+            return []
+        return list(self.cache_dir.glob('*/*.json'))
+    
+    def _read_disk(self, key: str, now: float) -> Optional[Tuple[Dict[str, Any], int]]:
+        """Load an entry and its size from disk, dropping it if expired or unreadable"""
+        path = self._entry_path(key)
+        try:
+            stat = path.stat()
+        except OSError:
+            return None
+        
+        if now - stat.st_mtime > self.ttl_seconds:
+            with self._lock:
+                self._forget_disk(path, stat.st_size)
+            return None
+        
+        try:
+            return json.loads(path.read_text(encoding='utf-8')), stat.st_size
+        except Exception as e:
+            logger.warning(f"Discarding unreadable cache entry {path.name}: {e}")
+            with self._lock:
+                self._forget_disk(path, stat.st_size)
+            return None
+    
+    def _write_disk(self, key: str, payload: bytes):
+        """Persist a serialized entry to disk and enforce the size budget"""
+        path = self._entry_path(key)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_name(f"{path.name}.{threading.get_ident()}.tmp")
+            tmp_path.write_bytes(payload)
+            previous = path.stat().st_size if path.exists() else 0
+            tmp_path.replace(path)
+        except Exception as e:
+            logger.warning(f"Failed to write cache entry {key}: {e}")
+            return
+        
+        if self._disk_bytes is None:
+            # First write: measure the existing entries outside the lock
+            total = sum(size for _, size, _ in self._stat_disk_entries())
+            with self._lock:
+                if self._disk_bytes is None:
+                    self._disk_bytes = total
+                    previous = len(payload)
+        
+        with self._lock:
+            self._disk_bytes += len(payload) - previous
+            over_budget = self._disk_bytes > self.max_disk_bytes
+        
+        if over_budget:
+            self._evict_disk()
+    
+    def _evict_disk(self):
+        """Remove expired, then oldest, entries until under budget
+        
+        The directory is listed without holding the lock, so memory-tier
+        lookups are not held up by the scan.
+        """
+        now = time.time()
+        entries = []
+        for mtime, size, path in self._stat_disk_entries():
+            if now - mtime > self.ttl_seconds:
+                with self._lock:
+                    self._forget_disk(path, size)
+            else:
+                entries.append((mtime, size, path))
+        
+        entries.sort()
+        for _, size, path in entries:
+            with self._lock:
+                if self._disk_bytes <= self.max_disk_bytes:
+                    break
+                self._forget_disk(path, size)
+    
+    def _stat_disk_entries(self) -> List[Tuple[float, int, Path]]:
+        """(mtime, size, path) of every on-disk entry still present"""
+        entries = []
+        for path in self._disk_entries():
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+    
+    def _forget_disk(self, path: Path, size: int):
+        """Unlink an on-disk entry and account for it (caller holds the lock)"""
+        if self._unlink(path):
+            self._counters['evictions'] += 1
+            if self._disk_bytes is not None:
+                self._disk_bytes = max(0, self._disk_bytes - size)
+    
+    @staticmethod
+    def _unlink(path: Path) -> bool:
+        """Remove a file, ignoring errors"""
+        try:
+            path.unlink()
+            return True
+        except OSError:
+            return False
+
+
+conversion_cache = ConversionCache(
+    cache_dir=settings.CACHE_DIR,
+    max_memory_entries=settings.CACHE_MEMORY_ENTRIES,
+    max_memory_bytes=settings.CACHE_MEMORY_MAX_BYTES,
+    max_disk_bytes=settings.CACHE_MAX_DISK_BYTES,
+    ttl_seconds=settings.CACHE_TTL_SECONDS,
+    enabled=settings.CACHE_ENABLED
+)
@@ -32,6 +32,10 @@ class Settings:
     # File size limits
     MAX_FILE_SIZE: int = 50 * 1024 * 1024  # 50MB
     MAX_IMAGE_SIZE: int = 10 * 1024 * 1024  # 10MB per image
+    BATCH_MAX_FILES: int = int(os.getenv("DOC_CONVERTER_BATCH_MAX_FILES", "50"))
+    BATCH_MAX_PARALLEL: int = int(os.getenv("DOC_CONVERTER_BATCH_MAX_PARALLEL", "4"))
+    UPLOAD_CHUNK_SIZE: int = int(os.getenv("DOC_CONVERTER_UPLOAD_CHUNK_SIZE", str(1024 * 1024)))  # 1MB
+    IN_MEMORY_MAX_SIZE: int = int(os.getenv("DOC_CONVERTER_IN_MEMORY_MAX_SIZE", str(5 * 1024 * 1024)))  # parse smaller uploads without a temp file
     
     # Supported formats
     SUPPORTED_EXTENSIONS: List[str] = [".docx", ".doc", ".odt", ".rtf"]
@@ -48,7 +52,8 @@ class Settings:
     DEFAULT_ALLOWED_ATTRIBUTES: dict = {
         '*': ['class', 'style', 'id'],
         'a': ['href', 'title', 'target', 'rel'],
-        'img': ['src', 'alt', 'title', 'width', 'height'],
+        'ol': ['start'],
+        'img': ['src', 'srcset', 'sizes', 'alt', 'title', 'width', 'height', 'loading', 'decoding'],
         'table': ['border', 'cellpadding', 'cellspacing'],
         'td': ['colspan', 'rowspan', 'align', 'valign'],
         'th': ['colspan', 'rowspan', 'align', 'valign']
@@ -60,9 +65,79 @@ class Settings:
         'border', 'width', 'height', 'display', 'float', 'clear'
     ]
     
+    # Sanitizer engine: "bleach" (default) or "lxml" to apply the same policy
+    # in a single walk over one lxml parse
+    SANITIZER_ENGINE: str = os.getenv("DOC_CONVERTER_SANITIZER_ENGINE", "bleach").lower()
+    # Keep the allowed declarations of inline style attributes; off by
+    # default, which drops every style attribute
+    SANITIZER_INLINE_STYLES: bool = os.getenv("DOC_CONVERTER_SANITIZER_INLINE_STYLES", "False").lower() == "true"
+    # Compiled sanitizer policies kept per process, keyed by whitelist
+    SANITIZER_POLICY_CACHE_SIZE: int = int(os.getenv("DOC_CONVERTER_SANITIZER_POLICY_CACHE_SIZE", "32"))
+    
     # Conversion settings
     PRESERVE_PAGEBREAKS: bool = True
     PAGEBREAK_MARKER: str = "<!-- pagebreak -->"
     IMAGE_QUALITY: int = 85  # JPEG quality for converted images
+    # Longest side of stored images; larger ones are downscaled (0 = unlimited)
+    IMAGE_MAX_DIMENSION: int = int(os.getenv("DOC_CONVERTER_IMAGE_MAX_DIMENSION", "2048"))
+    # Web-format images within both limits are stored as-is, without re-encoding
+    IMAGE_PASSTHROUGH_MAX_BYTES: int = int(os.getenv("DOC_CONVERTER_IMAGE_PASSTHROUGH_MAX_BYTES", str(512 * 1024)))  # 512KB
+    IMAGE_PASSTHROUGH_MAX_DIMENSION: int = int(os.getenv("DOC_CONVERTER_IMAGE_PASSTHROUGH_MAX_DIMENSION", "2048"))
+    
+    # Responsive variants (opt-in; none while IMAGE_VARIANT_WIDTHS is empty):
+    # widths (px) narrower than the image are generated for srcset, in the
+    # first of IMAGE_VARIANT_FORMATS Pillow can encode; the remaining formats
+    # (e.g. avif) are generated and listed only
+    IMAGE_VARIANT_WIDTHS: List[int] = [
+        int(width) for width in os.getenv("DOC_CONVERTER_IMAGE_VARIANT_WIDTHS", "").split(",") if width.strip()
+    ]
+    IMAGE_VARIANT_FORMATS: List[str] = [
+        fmt.strip().lower() for fmt in os.getenv("DOC_CONVERTER_IMAGE_VARIANT_FORMATS", "webp,avif").split(",") if fmt.strip()
+    ]
+    IMAGE_SIZES: str = os.getenv("DOC_CONVERTER_IMAGE_SIZES", "(max-width: 960px) 100vw, 960px")
+    # Longest side (px) of the inline placeholder recorded per image (0 = none)
+    IMAGE_PLACEHOLDER_SIZE: int = int(os.getenv("DOC_CONVERTER_IMAGE_PLACEHOLDER_SIZE", "16"))
+    
+    # Image transcoding runs on a shared thread pool; each document may keep
+    # at most IMAGE_MAX_PARALLEL_PER_DOCUMENT of its images in flight (the
+    # process engine splits IMAGE_WORKERS between its worker processes)
+    IMAGE_WORKERS: int = int(os.getenv("DOC_CONVERTER_IMAGE_WORKERS", "0")) or (os.cpu_count() or 1)
+    IMAGE_MAX_PARALLEL_PER_DOCUMENT: int = int(os.getenv("DOC_CONVERTER_IMAGE_MAX_PARALLEL", "4"))
+    
+    # Convert ODT bodies incrementally (iterparse) instead of building the
+    # whole content.xml tree first
+    ODT_STREAMING_PARSE: bool = os.getenv("DOC_CONVERTER_ODT_STREAMING", "True").lower() == "true"
+    
+    # Conversion engine: "thread" (default) or "process" to run parse +
+    # sanitize in a worker process pool, escaping the GIL
+    CONVERSION_ENGINE: str = os.getenv("DOC_CONVERTER_ENGINE", "thread").lower()
+    PROCESS_POOL_WORKERS: int = int(os.getenv("DOC_CONVERTER_PROCESS_WORKERS", "0")) or (os.cpu_count() or 1)
+    PROCESS_POOL_MAX_TASKS_PER_WORKER: int = int(os.getenv("DOC_CONVERTER_PROCESS_MAX_TASKS", "100"))
+    
+    # Admission control: conversions running at once, and how many more may
+    # wait for a slot before requests are rejected with 429
+    MAX_CONCURRENT_CONVERSIONS: int = int(os.getenv("DOC_CONVERTER_MAX_CONCURRENT", "4"))
+    MAX_QUEUED_CONVERSIONS: int = int(os.getenv("DOC_CONVERTER_MAX_QUEUED", "16"))
+    
+    # Size-aware scheduling: documents at or under both limits are "small"
+    # and may use SMALL_LANE_SLOTS slots that large documents never take
+    SMALL_DOCUMENT_MAX_SIZE: int = int(os.getenv("DOC_CONVERTER_SMALL_MAX_SIZE", str(1024 * 1024)))  # 1MB
+    SMALL_DOCUMENT_MAX_IMAGES: int = int(os.getenv("DOC_CONVERTER_SMALL_MAX_IMAGES", "3"))
+    SMALL_LANE_SLOTS: int = int(os.getenv("DOC_CONVERTER_SMALL_LANE_SLOTS", "1"))
+    
+    # Asynchronous conversion jobs
+    JOB_WORKERS: int = int(os.getenv("DOC_CONVERTER_JOB_WORKERS", "2"))
+    JOB_MAX_QUEUED: int = int(os.getenv("DOC_CONVERTER_JOB_MAX_QUEUED", "100"))
+    JOB_RESULT_TTL_SECONDS: int = int(os.getenv("DOC_CONVERTER_JOB_RESULT_TTL_SECONDS", str(60 * 60)))
+    
+    # Conversion result cache
+    CACHE_ENABLED: bool = os.getenv("DOC_CONVERTER_CACHE_ENABLED", "True").lower() == "true"
+    CACHE_DIR: Path = Path(os.getenv("DOC_CONVERTER_CACHE_DIR", str(TEMP_DIR / "cache")))
+    CACHE_MEMORY_ENTRIES: int = int(os.getenv("DOC_CONVERTER_CACHE_MEMORY_ENTRIES", "128"))
+    CACHE_MEMORY_MAX_BYTES: int = int(os.getenv("DOC_CONVERTER_CACHE_MEMORY_MAX_BYTES", str(64 * 1024 * 1024)))
+    CACHE_MAX_DISK_BYTES: int = int(os.getenv("DOC_CONVERTER_CACHE_MAX_DISK_BYTES", str(512 * 1024 * 1024)))
+    CACHE_TTL_SECONDS: int = int(os.getenv("DOC_CONVERTER_CACHE_TTL_SECONDS", str(24 * 60 * 60)))
+    # Split pages of recently paginated conversions kept per process (0: off)
+    PAGE_CACHE_ENTRIES: int = int(os.getenv("DOC_CONVERTER_PAGE_CACHE_ENTRIES", "16"))
 
 settings = Settings()
\ No newline at end of file
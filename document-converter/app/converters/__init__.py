@@ -1,4 +1,5 @@
 """Document converter module"""
 from .base import DocumentConverter
+from .engine import ThreadEngine, ProcessPoolEngine, get_engine
 
-__all__ = ['DocumentConverter']
\ No newline at end of file
+__all__ = ['DocumentConverter', 'ThreadEngine', 'ProcessPoolEngine', 'get_engine']
\ No newline at end of file
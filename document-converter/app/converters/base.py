@@ -3,16 +3,21 @@ import logging
 from pathlib import Path
 from typing import Dict, List, Optional, Any
 import asyncio
+import tempfile
+import zipfile
 
 from fastapi import UploadFile
 
 from app.config import settings
 from app.utils import (
-    save_temp_file, cleanup_temp_file, is_supported_format,
+    hash_upload, spool_upload, cleanup_temp_file, is_supported_format,
     get_file_extension
 )
-from app.parsers import get_parser
+from app.cache import ConversionCache, conversion_cache
+from app.admission import admission, classify_document
+from app.parsers import ProgressCallback
 from app.sanitizers import HTMLSanitizer
+from .engine import get_engine
 
 logger = logging.getLogger(__name__)
 
@@ -25,7 +30,8 @@ class DocumentConverter:
         allowed_tags: Optional[List[str]] = None,
         allowed_attributes: Optional[Dict[str, List[str]]] = None,
         allowed_styles: Optional[List[str]] = None,
-        extract_images: bool = True
+        extract_images: bool = True,
+        cache: Optional[ConversionCache] = None
     ):
         """
         Initialize document converter
@@ -35,8 +41,10 @@ class DocumentConverter:
             allowed_attributes: Dict of allowed attributes per tag
             allowed_styles: List of allowed CSS properties
             extract_images: Whether to extract embedded images
+            cache: Conversion result cache (defaults to the shared cache)
         """
         self.extract_images = extract_images
+        self.cache = cache or conversion_cache
         
         # Initialize HTML sanitizer
         self.sanitizer = HTMLSanitizer(
@@ -45,71 +53,263 @@ class DocumentConverter:
             allowed_styles=allowed_styles or settings.DEFAULT_ALLOWED_STYLES
         )
     
-    async def convert(self, file: UploadFile) -> Dict[str, Any]:
+    async def convert(
+        self,
+        file: UploadFile,
+        progress: Optional[ProgressCallback] = None,
+        admit: bool = False
+    ) -> Dict[str, Any]:
         """
         Convert uploaded document to HTML
         
         Args:
             file: Uploaded file object
+            progress: Optional callback receiving (stage, details) events
+            admit: Take an admission slot before converting (see
+                convert_spooled)
             
         Returns:
             Dictionary with converted HTML and metadata
         """
-        temp_path = None
-        
         try:
-            # Validate file
-            if not is_supported_format(file.filename):
-                raise ValueError(
-                    f"Unsupported file format. Supported formats: {', '.join(settings.SUPPORTED_EXTENSIONS)}"
-                )
-            
-            # Check file size
-            content = await file.read()
-            if len(content) > settings.MAX_FILE_SIZE:
-                raise ValueError(f"File size exceeds maximum limit of {settings.MAX_FILE_SIZE // 1024 // 1024}MB")
-            
-            # Save to temporary file
-            temp_path = save_temp_file(content, file.filename)
-            logger.info(f"Processing document: {file.filename}")
+            document = await self.spool(file)
+        except Exception as e:
+            logger.error(f"Error converting document {file.filename}: {str(e)}", exc_info=True)
+            raise
+        
+        return await self.convert_spooled(document, progress=progress, admit=admit)
+    
+    async def spool(self, file: UploadFile, persist: bool = False) -> Dict[str, Any]:
+        """
+        Validate an upload and prepare it for conversion
+        
+        An upload Starlette has received into its temp file is parsed from
+        that file in place. Otherwise, or with persist, it is copied into
+        memory or a temporary file.
+        
+        Args:
+            file: Uploaded file object
+            persist: Copy the upload so it outlives the request (for
+                queued jobs)
             
-            # Get appropriate parser
-            parser = get_parser(get_file_extension(file.filename))
+        Returns:
+            Spooled document with 'filename', 'source', 'size' and
+            'content_hash'; pass it to convert_spooled (or discard it)
+        """
+        # Validate file
+        if not is_supported_format(file.filename):
+            raise ValueError(
+                f"Unsupported file format. Supported formats: {', '.join(settings.SUPPORTED_EXTENSIONS)}"
+            )
+        
+        if not persist and isinstance(file.file, tempfile.SpooledTemporaryFile):
+            source, size, content_hash = await hash_upload(file)
+        else:
+            # Stream upload into memory (small files) or a temporary file,
+            # enforcing the size limit
+            source, size, content_hash = await spool_upload(file, file.filename)
+        
+        return {
+            'filename': file.filename,
+            'source': source,
+            'size': size,
+            'content_hash': content_hash
+        }
+    
+    @staticmethod
+    def discard(document: Dict[str, Any]):
+        """Release the temporary file of a spooled document"""
+        if isinstance(document['source'], Path):
+            cleanup_temp_file(document['source'])
+    
+    async def convert_spooled(
+        self,
+        document: Dict[str, Any],
+        progress: Optional[ProgressCallback] = None,
+        admit: bool = False,
+        reject: bool = True
+    ) -> Dict[str, Any]:
+        """
+        Convert a spooled document to HTML
+        
+        Cached results are returned straight away; with admit, only a cache
+        miss waits for an admission slot in the document's size lane.
+        
+        Args:
+            document: Spooled document returned by spool()
+            progress: Optional callback receiving (stage, details) events;
+                it may be called from a worker thread
+            admit: Take an admission slot before converting
+            reject: With admit, raise AdmissionRejected when the wait queue
+                is full instead of waiting
             
-            # Parse document
-            parse_result = await asyncio.to_thread(
-                parser.parse,
-                temp_path,
-                extract_images=self.extract_images
+        Returns:
+            Dictionary with converted HTML and metadata
+        """
+        filename = document['filename']
+        extension = get_file_extension(filename)
+        
+        try:
+            # Return cached result for identical document and options
+            cache_key = self.cache.make_key(
+                document['content_hash'],
+                extension,
+                self.sanitizer.allowed_tags,
+                self.sanitizer.allowed_attributes,
+                self.sanitizer.allowed_styles,
+                self.extract_images
             )
+            cached = await self.cache.lookup(cache_key)
+            if cached is not None:
+                cached['metadata']['original_filename'] = filename
+                cached['metadata']['cached'] = True
+                logger.info(f"Serving cached conversion for document: {filename}")
+                return cached
             
-            # Sanitize HTML
-            sanitized_html = self.sanitizer.sanitize(parse_result['html'])
+            if admit:
+                async with admission.slot(await classify_document(document), reject=reject):
+                    parse_result = await self._parse(document, extension, progress)
+            else:
+                parse_result = await self._parse(document, extension, progress)
+            sanitized_html = parse_result['html']
             
             # Prepare response
             result = {
                 'html': sanitized_html,
                 'metadata': {
-                    'original_filename': file.filename,
-                    'format': get_file_extension(file.filename),
+                    'original_filename': filename,
+                    'format': extension,
                     'has_pagebreaks': settings.PAGEBREAK_MARKER in sanitized_html,
                     'image_count': len(parse_result.get('images', [])),
-                    'allowed_tags': self.sanitizer.allowed_tags
+                    'allowed_tags': self.sanitizer.allowed_tags,
+                    'cached': False
                 }
             }
             
+            # Pages can only be fetched back while the result is cached
+            if self.cache.enabled:
+                result['metadata']['conversion_id'] = cache_key
+            
             # Add image URLs if extracted
             if self.extract_images and parse_result.get('images'):
                 result['images'] = parse_result['images']
             
-            logger.info(f"Successfully converted document: {file.filename}")
+            await self.cache.store(cache_key, result)
+            
+            logger.info(f"Successfully converted document: {filename}")
             return result
             
         except Exception as e:
-            logger.error(f"Error converting document {file.filename}: {str(e)}", exc_info=True)
+            logger.error(f"Error converting document {filename}: {str(e)}", exc_info=True)
             raise
         
         finally:
             # Cleanup temporary file
-            if temp_path:
-                cleanup_temp_file(temp_path)
\ No newline at end of file
+            self.discard(document)
+    
+    async def _parse(
+        self,
+        document: Dict[str, Any],
+        extension: str,
+        progress: Optional[ProgressCallback]
+    ) -> Dict[str, Any]:
+        """Parse and sanitize off the event loop (worker thread or process)"""
+        logger.info(f"Processing document: {document['filename']}")
+        
+        return await get_engine().run(
+            document['source'],
+            extension,
+            self.extract_images,
+            {
+                'allowed_tags': self.sanitizer.allowed_tags,
+                'allowed_attributes': self.sanitizer.allowed_attributes,
+                'allowed_styles': self.sanitizer.allowed_styles
+            },
+            progress=progress
+        )
+    
+    async def convert_batch(
+        self,
+        files: List[UploadFile],
+        max_parallel: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Convert several uploaded documents concurrently
+        
+        Args:
+            files: Uploaded file objects
+            max_parallel: Maximum conversions in flight (defaults to
+                BATCH_MAX_PARALLEL)
+            
+        Returns:
+            Per-file entries in upload order, each with 'filename',
+            'status' ('success' or 'error') and 'result' or 'error'
+        """
+        if len(files) > settings.BATCH_MAX_FILES:
+            raise ValueError(f"Batch exceeds maximum of {settings.BATCH_MAX_FILES} files")
+        
+        semaphore = asyncio.Semaphore(max_parallel or settings.BATCH_MAX_PARALLEL)
+        
+        async def convert_one(file: UploadFile) -> Dict[str, Any]:
+            async with semaphore:
+                try:
+                    # Spool before classifying: for archive members the zip
+                    # directory can only be reached by decompressing the member
+                    document = await self.spool(file)
+                    
+                    # The batch was admitted as a whole; items wait for a slot
+                    result = await self.convert_spooled(document, admit=True, reject=False)
+                    return {'filename': file.filename, 'status': 'success', 'result': result}
+                except ValueError as e:
+                    return {'filename': file.filename, 'status': 'error', 'error': str(e)}
+                except Exception:
+                    return {
+                        'filename': file.filename,
+                        'status': 'error',
+                        'error': 'Internal server error during conversion'
+                    }
+        
+        return await asyncio.gather(*(convert_one(file) for file in files))
+    
+    async def convert_archive(
+        self,
+        archive: UploadFile,
+        max_parallel: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Convert every document inside an uploaded .zip archive
+        
+        Members are streamed straight out of the archive; directories and
+        hidden/metadata entries are skipped.
+        
+        Args:
+            archive: Uploaded .zip file
+            max_parallel: Maximum conversions in flight
+            
+        Returns:
+            Per-file entries as returned by convert_batch
+        """
+        try:
+            zip_file = zipfile.ZipFile(archive.file)
+        except zipfile.BadZipFile:
+            raise ValueError("Invalid zip archive")
+        
+        with zip_file:
+            members = [
+                info for info in zip_file.infolist()
+                if not info.is_dir()
+                and not info.filename.startswith('__MACOSX/')
+                and not Path(info.filename).name.startswith('.')
+            ]
+            if len(members) > settings.BATCH_MAX_FILES:
+                raise ValueError(f"Archive exceeds maximum of {settings.BATCH_MAX_FILES} files")
+            
+            uploads = [
+                UploadFile(file=zip_file.open(info), filename=info.filename, size=info.file_size)
+                for info in members
+            ]
+            try:
+                return await self.convert_batch(uploads, max_parallel=max_parallel)
+            finally:
+                for upload in uploads:
+                    upload.file.close()
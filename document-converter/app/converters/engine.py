@@ -0,0 +1,258 @@
+"""Engines that run the CPU-bound conversion stages off the event loop"""
+import asyncio
+import io
+import logging
+import multiprocessing
+import os
+import sys
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Any, Optional, Union, Callable
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+def convert_document_sync(
+    source: Any,
+    extension: str,
+    extract_images: bool,
+    sanitizer_options: Dict[str, Any],
+    progress: Optional[Callable[..., None]] = None
+) -> Dict[str, Any]:
+    """
+    Parse and sanitize a document in the calling thread/process
+    
+    Args:
+        source: Path or buffer accepted by BaseParser.parse
+        extension: Document extension used to select the parser
+        extract_images: Whether to extract embedded images
+        sanitizer_options: Keyword arguments for HTMLSanitizer
+        progress: Optional callback for "images", "parsed" and
+            "sanitized" events
+    
+    Returns:
+        Parser result with 'html' already sanitized
+    """
+    from app.parsers import get_parser
+    from app.sanitizers import HTMLSanitizer
+    
+    parser = get_parser(extension)
+    parse_result = parser.parse(source, extract_images=extract_images, progress=progress)
+    if progress:
+        progress('parsed', image_count=len(parse_result.get('images', [])))
+    
+    parse_result['html'] = HTMLSanitizer(**sanitizer_options).sanitize(parse_result['html'])
+    if progress:
+        progress('sanitized')
+    return parse_result
+
+
+def _init_worker(worker_settings: Dict[str, Any]):
+    """
+    Apply the parent's settings and pre-import parser and sanitizer modules
+    
+    Spawned workers start from a fresh import of app.config, so settings
+    changed at runtime in the parent would otherwise be lost.
+    
+    Args:
+        worker_settings: Settings values to apply (see _worker_settings)
+    """
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    
+    for name, value in worker_settings.items():
+        setattr(settings, name, value)
+    
+    # The pipeline was created on import, but its pool only on first use
+    from app.media import image_pipeline
+    image_pipeline.workers = settings.IMAGE_WORKERS
+    
+    import mammoth  # noqa: F401
+    import bleach  # noqa: F401
+    import bs4  # noqa: F401
+    from PIL import Image  # noqa: F401
+    import app.parsers  # noqa: F401
+    import app.sanitizers  # noqa: F401
+    
+    logger.info(f"Conversion worker {os.getpid()} ready")
+
+
+def _worker_settings(workers: int) -> Dict[str, Any]:
+    """
+    Snapshot of the settings for worker processes
+    
+    IMAGE_WORKERS is shared out between the workers, so the image threads
+    of all processes together stay at IMAGE_WORKERS instead of growing
+    with the square of the CPU count.
+    
+    Args:
+        workers: Number of worker processes
+    
+    Returns:
+        Dict of setting name to value
+    """
+    values = {name: getattr(settings, name) for name in dir(settings) if name.isupper()}
+    values['IMAGE_WORKERS'] = max(1, settings.IMAGE_WORKERS // max(workers, 1))
+    return values
+
+
+def _warm_up() -> int:
+    """No-op task used to start workers eagerly"""
+    return os.getpid()
+
+
+class ThreadEngine:
+    """Run parse + sanitize as one unit in the default thread pool"""
+    
+    workers = None
+    
+    def start(self):
+        """Nothing to start; the event loop owns the thread pool"""
+    
+    def shutdown(self):
+        """Nothing to stop; the event loop owns the thread pool"""
+    
+    async def run(
+        self,
+        source: Any,
+        extension: str,
+        extract_images: bool,
+        sanitizer_options: Dict[str, Any],
+        progress: Optional[Callable[..., None]] = None
+    ) -> Dict[str, Any]:
+        """Convert a document in a worker thread (progress is called from that thread)"""
+        return await asyncio.to_thread(
+            convert_document_sync,
+            source,
+            extension,
+            extract_images,
+            sanitizer_options,
+            progress
+        )
+
+
+class ProcessPoolEngine:
+    """Run parse + sanitize in a pool of worker processes"""
+    
+    def __init__(self, workers: Optional[int] = None, max_tasks_per_worker: int = 100):
+        """
+        Initialize process-pool engine
+        
+        Args:
+            workers: Number of worker processes (defaults to CPU count)
+            max_tasks_per_worker: Tasks per worker process before it is
+                replaced, to contain memory leaked by parser libraries
+                (0 = never). Before Python 3.11, which cannot replace
+                single workers, the whole pool is recycled after
+                workers * max_tasks_per_worker tasks instead
+        """
+        self.workers = workers or os.cpu_count() or 1
+        self.max_tasks_per_worker = max_tasks_per_worker
+        
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._tasks_submitted = 0
+        self._lock = threading.Lock()
+    
+    def start(self):
+        """Create the pool and spawn all workers up front (with the current settings)"""
+        with self._lock:
+            executor = self._get_executor()
+        for _ in range(self.workers):
+            executor.submit(_warm_up)
+    
+    def shutdown(self):
+        """Stop the pool, waiting for running conversions to finish"""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor:
+            executor.shutdown(wait=True)
+    
+    async def run(
+        self,
+        source: Any,
+        extension: str,
+        extract_images: bool,
+        sanitizer_options: Dict[str, Any],
+        progress: Optional[Callable[..., None]] = None
+    ) -> Dict[str, Any]:
+        """
+        Convert a document in a worker process
+        
+        Buffers and file objects are sent to the worker as bytes; paths are
+        sent as-is so large documents are read by the worker instead of
+        being pickled.
+        Callbacks cannot cross the process boundary, so progress only
+        receives the "parsed" and "sanitized" events once the worker is done.
+        """
+        if isinstance(source, io.BytesIO):
+            source = source.getvalue()
+        elif isinstance(source, memoryview):
+            source = source.tobytes()
+        elif hasattr(source, 'read'):
+            source.seek(0)
+            source = await asyncio.to_thread(source.read)
+        
+        with self._lock:
+            if self._recycles_pool() and self._tasks_submitted >= self.workers * self.max_tasks_per_worker:
+                self._recycle()
+            future = self._get_executor().submit(
+                convert_document_sync,
+                source,
+                extension,
+                extract_images,
+                sanitizer_options
+            )
+            self._tasks_submitted += 1
+        
+        parse_result = await asyncio.wrap_future(future)
+        if progress:
+            progress('parsed', image_count=len(parse_result.get('images', [])))
+            progress('sanitized')
+        return parse_result
+    
+    def _get_executor(self) -> ProcessPoolExecutor:
+        """Return the current pool, creating it if needed (caller holds the lock)"""
+        if self._executor is None:
+            options = {}
+            if self.max_tasks_per_worker > 0 and not self._recycles_pool():
+                options['max_tasks_per_child'] = self.max_tasks_per_worker
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_worker,
+                initargs=(_worker_settings(self.workers),),
+                **options
+            )
+            self._tasks_submitted = 0
+        return self._executor
+    
+    def _recycles_pool(self) -> bool:
+        """Whether workers are recycled as a whole pool (Python < 3.11)"""
+        return self.max_tasks_per_worker > 0 and sys.version_info < (3, 11)
+    
+    def _recycle(self):
+        """Retire the current pool; queued work still completes on it (caller holds the lock)"""
+        logger.info(f"Recycling conversion worker pool after {self._tasks_submitted} tasks")
+        retired, self._executor = self._executor, None
+        retired.shutdown(wait=False)
+
+
+_engine: Optional[Union[ThreadEngine, ProcessPoolEngine]] = None
+
+
+def get_engine() -> Union[ThreadEngine, ProcessPoolEngine]:
+    """Return the shared conversion engine selected by CONVERSION_ENGINE"""
+    global _engine
+    if _engine is None:
+        if settings.CONVERSION_ENGINE == 'process':
+            _engine = ProcessPoolEngine(
+                workers=settings.PROCESS_POOL_WORKERS,
+                max_tasks_per_worker=settings.PROCESS_POOL_MAX_TASKS_PER_WORKER
+            )
+        else:
+            _engine = ThreadEngine()
+    return _engine
@@ -0,0 +1,207 @@
+"""Asynchronous conversion jobs with progress events"""
+import asyncio
+import logging
+import time
+import uuid
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class JobQueueFull(Exception):
+    """Raised when no more jobs can be queued"""
+
+
+class Job:
+    """A single queued conversion and its progress events"""
+    
+    def __init__(self, filename: str):
+        """
+        Initialize job
+        
+        Args:
+            filename: Original filename of the document
+        """
+        self.id = uuid.uuid4().hex
+        self.filename = filename
+        self.status = 'queued'
+        self.created_at = time.time()
+        self.finished_at: Optional[float] = None
+        self.result: Optional[Dict[str, Any]] = None
+        self.error: Optional[str] = None
+        self.events: List[Dict[str, Any]] = []
+        self._updated = asyncio.Event()
+        self._closed = False
+    
+    @property
+    def finished(self) -> bool:
+        """Whether the job has completed or failed"""
+        return self.status in ('completed', 'failed')
+    
+    def publish(self, stage: str, **details):
+        """Record a progress event and wake up listeners (event loop thread only)"""
+        self.events.append({'stage': stage, 'time': time.time(), **details})
+        self._updated.set()
+        self._updated = asyncio.Event()
+    
+    def close(self):
+        """Publish the final status event; streams end after it"""
+        self.publish(self.status)
+        self._closed = True
+    
+    async def stream(self) -> AsyncIterator[Dict[str, Any]]:
+        """Yield every event, past and future, until the final status event"""
+        index = 0
+        while True:
+            updated = self._updated
+            while index < len(self.events):
+                yield self.events[index]
+                index += 1
+            if self._closed:
+                return
+            await updated.wait()
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """Serialize job status (and result once completed)"""
+        data = {
+            'job_id': self.id,
+            'filename': self.filename,
+            'status': self.status,
+            'created_at': self.created_at,
+            'finished_at': self.finished_at,
+            'progress': self.events[-1] if self.events else None
+        }
+        if self.status == 'completed':
+            data['result'] = self.result
+        if self.status == 'failed':
+            data['error'] = self.error
+        return data
+
+
+class JobManager:
+    """In-process job queue served by a bounded set of worker tasks"""
+    
+    def __init__(self, workers: int = 2, max_queued: int = 100, result_ttl: int = 3600):
+        """
+        Initialize job manager
+        
+        Args:
+            workers: Number of jobs converted concurrently
+            max_queued: Maximum jobs waiting for a worker
+            result_ttl: Seconds a finished job is kept for polling
+        """
+        self.workers = workers
+        self.max_queued = max_queued
+        self.result_ttl = result_ttl
+        
+        self._jobs: Dict[str, Job] = {}
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+    
+    async def start(self):
+        """Start worker tasks on the running event loop"""
+        self._queue = asyncio.Queue(maxsize=self.max_queued)
+        self._tasks = [
+            asyncio.create_task(self._worker(), name=f"conversion-job-worker-{index}")
+            for index in range(self.workers)
+        ]
+    
+    async def stop(self):
+        """Cancel worker tasks; queued documents are discarded"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        
+        while self._queue is not None and not self._queue.empty():
+            _, converter, document = self._queue.get_nowait()
+            converter.discard(document)
+    
+    def submit(self, converter, document: Dict[str, Any]) -> Job:
+        """
+        Queue a spooled document for conversion
+        
+        Args:
+            converter: DocumentConverter configured for this job
+            document: Spooled document returned by converter.spool()
+        
+        Returns:
+            The queued job
+        
+        Raises:
+            JobQueueFull: If max_queued jobs are already waiting
+        """
+        self._purge_expired()
+        if self._queue is None:
+            raise RuntimeError("Job manager is not running")
+        
+        job = Job(document['filename'])
+        try:
+            self._queue.put_nowait((job, converter, document))
+        except asyncio.QueueFull:
+            raise JobQueueFull(f"Job queue is full ({self.max_queued} waiting)")
+        
+        self._jobs[job.id] = job
+        job.publish('uploaded', size=document['size'])
+        return job
+    
+    def get(self, job_id: str) -> Optional[Job]:
+        """Return a job by id, or None if unknown or expired"""
+        self._purge_expired()
+        return self._jobs.get(job_id)
+    
+    def stats(self) -> Dict[str, int]:
+        """Return job counts by status"""
+        counts = {'queued': 0, 'running': 0, 'completed': 0, 'failed': 0}
+        for job in self._jobs.values():
+            counts[job.status] += 1
+        return counts
+    
+    async def _worker(self):
+        """Convert queued jobs one at a time"""
+        loop = asyncio.get_running_loop()
+        
+        while True:
+            job, converter, document = await self._queue.get()
+            job.status = 'running'
+            
+            def progress(stage: str, **details):
+                # Parsers report from worker threads; hop back to the loop
+                loop.call_soon_threadsafe(lambda: job.publish(stage, **details))
+            
+            try:
+                job.result = await converter.convert_spooled(
+                    document, progress=progress, admit=True, reject=False
+                )
+                job.status = 'completed'
+            except ValueError as e:
+                job.error = str(e)
+                job.status = 'failed'
+            except Exception:
+                job.error = "Internal server error during conversion"
+                job.status = 'failed'
+            finally:
+                job.finished_at = time.time()
+                self._queue.task_done()
+            
+            # Queue the final event behind any progress still in flight
+            loop.call_soon(job.close)
+    
+    def _purge_expired(self):
+        """Forget finished jobs older than result_ttl"""
+        cutoff = time.time() - self.result_ttl
+        expired = [
+            job_id for job_id, job in self._jobs.items()
+            if job.finished and job.finished_at < cutoff
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+
+job_manager = JobManager(
+    workers=settings.JOB_WORKERS,
+    max_queued=settings.JOB_MAX_QUEUED,
+    result_ttl=settings.JOB_RESULT_TTL_SECONDS
+)
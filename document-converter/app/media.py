@@ -0,0 +1,574 @@
+"""Content-addressed storage for extracted images"""
+import base64
+import hashlib
+import html
+import io
+import json
+import logging
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from PIL import Image
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+WEB_IMAGE_EXTENSIONS = ['png', 'jpg', 'jpeg', 'gif', 'bmp', 'webp']
+
+# Formats (by storage extension) and modes browsers display as-is
+PASSTHROUGH_FORMATS = {'png': 'PNG', 'jpg': 'JPEG', 'jpeg': 'JPEG', 'gif': 'GIF', 'webp': 'WEBP'}
+PASSTHROUGH_MODES = ('1', 'L', 'LA', 'P', 'RGB', 'RGBA')
+
+# Index entries live next to the images but are never published
+INDEX_DIR_NAME = '.index'
+
+
+def image_extension(content_type: Optional[str]) -> str:
+    """Map an image MIME type to the extension used for storage"""
+    extension = (content_type or 'image/png').split('/')[-1]
+    if extension not in WEB_IMAGE_EXTENSIONS:
+        extension = 'png'
+    return extension
+
+
+def process_image(image_data: bytes, extension: str) -> Dict[str, Any]:
+    """
+    Prepare an image for the web, re-encoding only when it pays off
+    
+    Images that are already in the web format they are stored as, and
+    within the passthrough size and dimension limits, are kept byte for
+    byte; only their header is read. Everything else is scaled down to
+    IMAGE_MAX_DIMENSION if needed and re-encoded, and the original is
+    still kept if re-encoding at the same size would make it bigger.
+    
+    Args:
+        image_data: Original image bytes
+        extension: Target extension (see image_extension)
+    
+    Returns:
+        Dict with the bytes to store ('data'), how they were produced
+        ('processing': 'passthrough', 'transcoded' or 'unprocessed') and
+        the Pillow image they represent ('image'; None if unprocessed),
+        from which variants can be derived without decoding again
+    """
+    try:
+        # Only parses the header; pixels are decoded on first access
+        img = Image.open(io.BytesIO(image_data))
+    except Exception as e:
+        logger.error(f"Error processing image: {e}")
+        # Fall back to storing raw data
+        return {'data': image_data, 'processing': 'unprocessed', 'image': None}
+    
+    is_web_format = PASSTHROUGH_FORMATS.get(extension) == img.format and img.mode in PASSTHROUGH_MODES
+    if (
+        is_web_format
+        and len(image_data) <= settings.IMAGE_PASSTHROUGH_MAX_BYTES
+        and max(img.size) <= settings.IMAGE_PASSTHROUGH_MAX_DIMENSION
+        and not _exceeds_max_dimension(img.size)
+    ):
+        return {'data': image_data, 'processing': 'passthrough', 'image': img}
+    
+    original_size = img.size
+    try:
+        img = _limit_dimensions(img)
+        output = _encode(img, extension)
+    except Exception as e:
+        logger.error(f"Error processing image: {e}")
+        return {'data': image_data, 'processing': 'unprocessed', 'image': None}
+    
+    if is_web_format and img.size == original_size and len(output) >= len(image_data):
+        return {'data': image_data, 'processing': 'passthrough', 'image': img}
+    return {'data': output, 'processing': 'transcoded', 'image': img}
+
+
+def sharded_path(digest: str, extension: str) -> str:
+    """Relative media path for a content hash, e.g. 'ab/cd/abcd....png'"""
+    return f"{digest[:2]}/{digest[2:4]}/{digest}.{extension}"
+
+
+def store_image(image_data: bytes, content_type: Optional[str]) -> Dict[str, Any]:
+    """
+    Store an extracted image under the hash of its processed bytes
+    
+    Images already seen with the same processing settings are looked up by
+    the hash of their original bytes and reused without decoding or
+    re-encoding, so repeated conversions produce identical URLs and do no
+    image I/O beyond the index lookup.
+    
+    Args:
+        image_data: Original image bytes from the document
+        content_type: MIME type reported by the document
+    
+    Returns:
+        Image info with 'filename' (relative path), 'url', 'size',
+        'content_type', 'processing' (see process_image), 'bytes_saved'
+        (original size minus stored size), 'variants' (see
+        _store_variants, with 'url' instead of 'path'), 'srcset', pixel
+        'width'/'height' and 'placeholder' (a tiny data: URI to show while
+        loading); the last three are None if Pillow could not read it
+    """
+    extension = image_extension(content_type)
+    source_key = hashlib.sha256(
+        image_data + _processing_signature(extension).encode()
+    ).hexdigest()
+    
+    record = _lookup(source_key)
+    if record is None:
+        processed = process_image(image_data, extension)
+        relative_path = _write_content(processed['data'], extension)
+        record = {
+            'path': relative_path,
+            'processing': processed['processing'],
+            'stored_size': len(processed['data']),
+            'width': None,
+            'height': None,
+            'placeholder': None,
+            'variants': []
+        }
+        img = processed['image']
+        if img is not None:
+            record['width'], record['height'] = img.size
+            record['variants'] = _store_variants(img, extension)
+            record['placeholder'] = _placeholder(img)
+        _remember(source_key, record)
+    
+    return {
+        'filename': record['path'],
+        'url': _media_url(record['path']),
+        'size': len(image_data),
+        'content_type': content_type,
+        'processing': record['processing'],
+        'bytes_saved': len(image_data) - record['stored_size'],
+        'variants': [
+            {
+                'url': _media_url(variant['path']),
+                'width': variant['width'],
+                'content_type': variant['content_type'],
+                'size': variant['size']
+            }
+            for variant in record['variants']
+        ],
+        'srcset': _build_srcset(record, extension),
+        'width': record['width'],
+        'height': record['height'],
+        'placeholder': record['placeholder']
+    }
+
+
+def img_attributes(
+    image_info: Dict[str, Any],
+    width: Optional[int] = None,
+    height: Optional[int] = None
+) -> str:
+    """
+    Render the <img> attributes for a stored image
+    
+    width/height reserve the image's box before it loads, so the page does
+    not shift; the image is loaded lazily and decoded off the main thread.
+    
+    Args:
+        image_info: Image info returned by store_image
+        width: Display width in px (defaults to the pixel width)
+        height: Display height in px (defaults to the pixel height)
+    
+    Returns:
+        Attribute string, e.g. 'src="..." srcset="..." sizes="..." width="..."'
+    """
+    attrs = {'src': image_info['url']}
+    if image_info.get('srcset'):
+        attrs['srcset'] = image_info['srcset']
+        attrs['sizes'] = settings.IMAGE_SIZES
+    
+    if width is None or height is None:
+        width, height = image_info.get('width'), image_info.get('height')
+    if width and height:
+        attrs['width'] = str(width)
+        attrs['height'] = str(height)
+    
+    attrs['loading'] = 'lazy'
+    attrs['decoding'] = 'async'
+    return ' '.join(f'{name}="{html.escape(value)}"' for name, value in attrs.items())
+
+
+def variant_formats() -> List[str]:
+    """Enabled IMAGE_VARIANT_FORMATS this Pillow build can encode"""
+    Image.init()
+    return [fmt for fmt in settings.IMAGE_VARIANT_FORMATS if fmt.upper() in Image.SAVE]
+
+
+def write_media(relative_path: str, data: bytes) -> Path:
+    """
+    Write a media file once, directly into the public media directory
+    
+    The file is written through a temp file and atomic rename, so the
+    frontend never serves a partial image. MEDIA_DIR gets a hardlink to the
+    same inode when both directories share a filesystem; otherwise the
+    public copy is the only one. Existing files are left untouched, since
+    identical paths always hold identical content.
+    
+    Args:
+        relative_path: Path relative to the media roots (see sharded_path)
+        data: File contents
+    
+    Returns:
+        Path of the public file
+    """
+    public_path = Path(settings.PUBLIC_MEDIA_PATH) / relative_path
+    if not public_path.exists():
+        _write_atomic(public_path, data)
+    
+    local_path = settings.MEDIA_DIR / relative_path
+    if not local_path.exists():
+        try:
+            local_path.parent.mkdir(parents=True, exist_ok=True)
+            os.link(public_path, local_path)
+        except FileExistsError:
+            pass
+        except OSError as e:
+            logger.debug(f"Not linking {relative_path} into MEDIA_DIR: {e}")
+    
+    return public_path
+
+
+def _media_url(relative_path: str) -> str:
+    """Public URL of a stored media file"""
+    return f"{settings.MEDIA_URL_PREFIX}/{relative_path}"
+
+
+def _write_content(data: bytes, extension: str) -> str:
+    """Store bytes under their content hash and return the relative path"""
+    relative_path = sharded_path(hashlib.sha256(data).hexdigest(), extension)
+    write_media(relative_path, data)
+    return relative_path
+
+
+def _store_variants(img: Image.Image, extension: str) -> List[Dict[str, Any]]:
+    """
+    Encode and store the responsive variants of an image
+    
+    Variants are opt-in: none are made while IMAGE_VARIANT_WIDTHS is empty,
+    since each one means decoding, resampling and encoding the image. The
+    srcset format is the first supported IMAGE_VARIANT_FORMATS entry
+    (the stored format when none is available); it gets every
+    IMAGE_VARIANT_WIDTHS width narrower than the image plus the full width.
+    Other modern formats (e.g. AVIF) get the same widths but are only
+    listed, for clients that negotiate formats themselves. Each width is
+    resampled once and encoded per format.
+    
+    Args:
+        img: Decoded image as stored (already bounded)
+        extension: Extension of the stored image
+    
+    Returns:
+        Variants as dicts with 'path', 'width', 'content_type' and 'size',
+        srcset format first
+    """
+    if not settings.IMAGE_VARIANT_WIDTHS:
+        return []
+    if getattr(img, 'is_animated', False):
+        # Resampling would keep only the first frame
+        return []
+    
+    formats = variant_formats() or [extension]
+    widths = sorted({width for width in settings.IMAGE_VARIANT_WIDTHS if 0 < width < img.width})
+    
+    encoded = {fmt: [] for fmt in formats}
+    for width in widths + [img.width]:
+        if width == img.width:
+            resized = img
+        else:
+            resized = img.resize((width, max(1, round(img.height * width / img.width))), Image.LANCZOS)
+        for fmt in formats:
+            if fmt == extension and width == img.width:
+                # That is the stored image itself
+                continue
+            data = _encode(resized, fmt)
+            encoded[fmt].append({
+                'path': _write_content(data, fmt),
+                'width': width,
+                'content_type': f"image/{'jpeg' if fmt == 'jpg' else fmt}",
+                'size': len(data)
+            })
+    
+    return [variant for fmt in formats for variant in encoded[fmt]]
+
+
+def _build_srcset(record: Dict[str, Any], extension: str) -> str:
+    """Build the srcset value from the srcset-format variants of a record"""
+    if not record['variants']:
+        return ''
+    
+    srcset_type = record['variants'][0]['content_type']
+    candidates = [
+        (variant['path'], variant['width'])
+        for variant in record['variants']
+        if variant['content_type'] == srcset_type
+    ]
+    if srcset_type == f"image/{'jpeg' if extension == 'jpg' else extension}":
+        # The stored image is the widest candidate of its own format
+        candidates.append((record['path'], record['width']))
+    
+    return ', '.join(f"{_media_url(path)} {width}w" for path, width in candidates)
+
+
+def _placeholder(img: Image.Image) -> Optional[str]:
+    """
+    Build a low-quality image placeholder as a data: URI
+    
+    Must be the last use of img: it is shrunk in place, which for a JPEG
+    that was never decoded (a passthrough image without variants) decodes
+    it directly at 1/8 scale.
+    
+    Args:
+        img: Decoded or opened image
+    
+    Returns:
+        data: URI of a thumbnail at most IMAGE_PLACEHOLDER_SIZE px wide,
+        or None if disabled or encoding fails
+    """
+    if settings.IMAGE_PLACEHOLDER_SIZE <= 0:
+        return None
+    
+    try:
+        img.thumbnail((settings.IMAGE_PLACEHOLDER_SIZE, settings.IMAGE_PLACEHOLDER_SIZE))
+        fmt = 'webp' if 'WEBP' in Image.SAVE else 'png'
+        data = _encode(img, fmt)
+    except Exception as e:
+        logger.warning(f"Could not build image placeholder: {e}")
+        return None
+    return f"data:image/{fmt};base64,{base64.b64encode(data).decode('ascii')}"
+
+
+def _exceeds_max_dimension(size: tuple) -> bool:
+    """Whether an image of size must be scaled down (IMAGE_MAX_DIMENSION 0 = unlimited)"""
+    return 0 < settings.IMAGE_MAX_DIMENSION < max(size)
+
+
+def _limit_dimensions(img: Image.Image) -> Image.Image:
+    """
+    Scale an image down to fit within IMAGE_MAX_DIMENSION
+    
+    JPEGs are decoded directly at a reduced scale with draft(), which cuts
+    decode time and peak memory by up to 64x for camera photos; the result
+    (and every other format) is then downsampled to the exact bound.
+    
+    Args:
+        img: Image opened but not yet loaded
+    
+    Returns:
+        The image itself if it already fits, otherwise a scaled copy (the
+        original may have been switched to draft mode)
+    """
+    if not _exceeds_max_dimension(img.size):
+        return img
+    
+    original_size = img.size
+    limit = settings.IMAGE_MAX_DIMENSION
+    scale = limit / max(original_size)
+    target = (max(1, round(original_size[0] * scale)), max(1, round(original_size[1] * scale)))
+    
+    if img.format == 'JPEG':
+        # Picks the smallest 1/2, 1/4 or 1/8 scale that is still >= target
+        img.draft(None, target)
+    
+    logger.debug(f"Downscaling image from {original_size} to {target}")
+    return img.resize(target, Image.LANCZOS)
+
+
+def _encode(img: Image.Image, extension: str) -> bytes:
+    """Encode a Pillow image in the format for extension"""
+    # Convert RGBA to RGB if saving as JPEG
+    if extension in ['jpg', 'jpeg'] and img.mode in ('RGBA', 'LA', 'P'):
+        rgb_img = Image.new('RGB', img.size, (255, 255, 255))
+        if img.mode == 'P':
+            img = img.convert('RGBA')
+        rgb_img.paste(img, mask=img.split()[-1] if 'A' in img.mode else None)
+        img = rgb_img
+    elif extension in ['webp', 'avif'] and img.mode not in ('RGB', 'RGBA'):
+        has_alpha = 'A' in img.mode or 'transparency' in img.info
+        img = img.convert('RGBA' if has_alpha else 'RGB')
+    
+    # Save optimized image
+    output = io.BytesIO()
+    img.save(
+        output,
+        format='JPEG' if extension in ['jpg', 'jpeg'] else extension.upper(),
+        quality=settings.IMAGE_QUALITY,
+        optimize=True
+    )
+    return output.getvalue()
+
+
+def _processing_signature(extension: str) -> str:
+    """Settings that affect processing output; part of the reuse key"""
+    return (
+        f"{extension}:q{settings.IMAGE_QUALITY}"
+        f":pt{settings.IMAGE_PASSTHROUGH_MAX_BYTES}x{settings.IMAGE_PASSTHROUGH_MAX_DIMENSION}"
+        f":max{settings.IMAGE_MAX_DIMENSION}"
+        f":w{','.join(map(str, settings.IMAGE_VARIANT_WIDTHS))}"
+        f":f{','.join(variant_formats())}"
+        f":lqip{settings.IMAGE_PLACEHOLDER_SIZE}"
+    )
+
+
+def _index_path(source_key: str) -> Path:
+    """Index entry mapping a source hash to its stored relative path"""
+    return settings.MEDIA_DIR / INDEX_DIR_NAME / source_key[:2] / source_key
+
+
+def _lookup(source_key: str) -> Optional[Dict[str, Any]]:
+    """Return the stored record for a source hash, if its file is still present"""
+    try:
+        record = json.loads(_index_path(source_key).read_text())
+        relative_path = record['path']
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+    if not (Path(settings.PUBLIC_MEDIA_PATH) / relative_path).exists():
+        return None
+    return record
+
+
+def _remember(source_key: str, record: Dict[str, Any]):
+    """Record what was stored for a source hash"""
+    try:
+        _write_atomic(_index_path(source_key), json.dumps(record).encode())
+    except OSError as e:
+        logger.warning(f"Failed to index image {record['path']}: {e}")
+
+
+def _write_atomic(path: Path, data: bytes):
+    """Write data via a temp file and rename, so readers never see partial files"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    tmp_path.write_bytes(data)
+    os.replace(tmp_path, path)
+
+
+class ImageBatch:
+    """The images of one document, transcoded concurrently"""
+    
+    def __init__(
+        self,
+        executor: ThreadPoolExecutor,
+        max_parallel: int,
+        total: Optional[int] = None,
+        progress: Optional[Callable[..., None]] = None
+    ):
+        """
+        Initialize image batch
+        
+        Args:
+            executor: Shared pool the images run on
+            max_parallel: Images of this document allowed in flight at once
+            total: Expected number of images (reported with progress)
+            progress: Optional callback for "images" events; called from
+                pool threads
+        """
+        self.total = total
+        self.progress = progress
+        
+        self._executor = executor
+        self._slots = threading.BoundedSemaphore(max(1, max_parallel))
+        self._futures: List[Future] = []
+        self._lock = threading.Lock()
+        self._processed = 0
+    
+    def submit(self, image_data: bytes, content_type: Optional[str]) -> int:
+        """
+        Queue an image for storage, blocking while the document is at its cap
+        
+        Returns:
+            Index of the image, used to look up its result
+        """
+        self._slots.acquire()
+        try:
+            future = self._executor.submit(store_image, image_data, content_type)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(self._done)
+        self._futures.append(future)
+        return len(self._futures) - 1
+    
+    def results(self) -> List[Optional[Dict[str, Any]]]:
+        """
+        Wait for every submitted image
+        
+        Returns:
+            Image info per submitted image, in submission order; None for
+            images that could not be stored
+        """
+        results = []
+        for index, future in enumerate(self._futures):
+            try:
+                results.append(future.result())
+            except Exception as e:
+                logger.error(f"Error storing image {index}: {e}")
+                results.append(None)
+        return results
+    
+    def _done(self, future: Future):
+        """Release the document's slot and report progress"""
+        self._slots.release()
+        if self.progress:
+            with self._lock:
+                self._processed += 1
+                processed = self._processed
+            self.progress('images', processed=processed, total=self.total)
+
+
+class ImagePipeline:
+    """Thread pool shared by all parsers for image transcoding
+    
+    Pillow releases the GIL while decoding and encoding, so a document's
+    images are processed side by side and cost roughly the time of the
+    slowest one rather than the sum.
+    """
+    
+    def __init__(self, workers: int, max_parallel_per_document: int = 4):
+        """
+        Initialize image pipeline
+        
+        Args:
+            workers: Size of the shared thread pool
+            max_parallel_per_document: Default per-document concurrency
+                cap, so one image-heavy document cannot occupy every worker
+        """
+        self.workers = workers
+        self.max_parallel_per_document = max_parallel_per_document
+        
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+    
+    def batch(
+        self,
+        total: Optional[int] = None,
+        progress: Optional[Callable[..., None]] = None
+    ) -> ImageBatch:
+        """Start a batch for one document's images"""
+        return ImageBatch(
+            self._get_executor(),
+            self.max_parallel_per_document,
+            total=total,
+            progress=progress
+        )
+    
+    def _get_executor(self) -> ThreadPoolExecutor:
+        """Create the pool on first use (also inside conversion worker processes)"""
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.workers,
+                    thread_name_prefix='image-pipeline'
+                )
+            return self._executor
+
+
+image_pipeline = ImagePipeline(
+    workers=settings.IMAGE_WORKERS,
+    max_parallel_per_document=settings.IMAGE_MAX_PARALLEL_PER_DOCUMENT
+)
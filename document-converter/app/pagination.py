@@ -0,0 +1,171 @@
+"""Split conversion results into pages at PAGEBREAK_MARKER"""
+import asyncio
+import logging
+import re
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from app.config import settings
+from app.cache import ConversionCache, conversion_cache
+
+logger = logging.getLogger(__name__)
+
+# Conversion ids are conversion cache keys (SHA-256 hex digests)
+CONVERSION_ID_PATTERN = re.compile(r'[0-9a-f]{64}')
+
+# Opening/closing tags, to keep elements a page break falls inside balanced
+TAG_PATTERN = re.compile(r'<(/?)([a-zA-Z][a-zA-Z0-9]*)\b[^>]*>')
+VOID_ELEMENTS = frozenset([
+    'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link',
+    'meta', 'source', 'track', 'wbr'
+])
+
+IMG_SRC_PATTERN = re.compile(r'<img\b[^>]*?\ssrc="([^"]*)"')
+TEXT_OR_IMAGE_PATTERN = re.compile(r'(?:^|>)[^<]*?[^<\s]|<img\b')
+
+# Pages of recently paginated conversions, least recently used first. A
+# conversion id hashes the document, options and output settings, so its
+# pages never change; keeping them lets each page fetch skip the cache lookup
+# and split of the whole document.
+_pages: "OrderedDict[str, List[Dict[str, Any]]]" = OrderedDict()
+
+
+def split_pages(html: str, images: Optional[List[Dict[str, Any]]] = None) -> List[Dict[str, Any]]:
+    """
+    Split sanitized HTML into pages at each PAGEBREAK_MARKER
+    
+    Elements a marker falls inside are closed at the end of the page and
+    reopened (with their attributes) on the next, so every page is a
+    well-formed fragment. Pages without text or images are dropped.
+    
+    Args:
+        html: Sanitized HTML
+        images: Image info dicts of the conversion
+    
+    Returns:
+        List of {'html', 'images'} dicts, one per page (at least one);
+        each page lists the images its HTML displays
+    """
+    marker = settings.PAGEBREAK_MARKER
+    pattern = re.compile(f'{re.escape(marker)}|{TAG_PATTERN.pattern}')
+    
+    fragments = []
+    open_tags = []  # (name, opening tag) of the elements currently open
+    reopen = ''
+    start = 0
+    
+    for match in pattern.finditer(html):
+        if match.group() == marker:
+            closing = ''.join(f'</{name}>' for name, _ in reversed(open_tags))
+            fragments.append(reopen + html[start:match.start()] + closing)
+            reopen = ''.join(tag for _, tag in open_tags)
+            start = match.end()
+            continue
+        
+        name = match.group(2).lower()
+        if match.group(1):
+            # Close the innermost matching element (and any left open in it)
+            for index in range(len(open_tags) - 1, -1, -1):
+                if open_tags[index][0] == name:
+                    del open_tags[index:]
+                    break
+        elif name not in VOID_ELEMENTS and not match.group().endswith('/>'):
+            open_tags.append((name, match.group()))
+    
+    fragments.append(reopen + html[start:])
+    
+    images_by_url = {image['url']: image for image in images or [] if image.get('url')}
+    pages = []
+    for fragment in fragments:
+        fragment = fragment.strip()
+        if not TEXT_OR_IMAGE_PATTERN.search(fragment):
+            continue
+        
+        page_images = []
+        for url in dict.fromkeys(IMG_SRC_PATTERN.findall(fragment)):
+            if url in images_by_url:
+                page_images.append(images_by_url[url])
+        pages.append({'html': fragment, 'images': page_images})
+    
+    return pages or [{'html': '', 'images': []}]
+
+
+def _remember_pages(conversion_id: str, pages: List[Dict[str, Any]]):
+    """Keep the pages of a conversion, evicting beyond PAGE_CACHE_ENTRIES"""
+    _pages[conversion_id] = pages
+    _pages.move_to_end(conversion_id)
+    while len(_pages) > max(settings.PAGE_CACHE_ENTRIES, 0):
+        _pages.popitem(last=False)
+
+
+def _page_response(conversion_id: str, pages: List[Dict[str, Any]], page: int) -> Dict[str, Any]:
+    """Response body for one page of a conversion"""
+    return {
+        'conversion_id': conversion_id,
+        'page': page,
+        'page_count': len(pages),
+        **pages[page - 1]
+    }
+
+
+async def paginate_result(result: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Turn a conversion result into its first page
+    
+    The remaining pages are fetched with get_page, so the response stays
+    small however long the document is.
+    
+    Args:
+        result: Cached result returned by DocumentConverter.convert
+            (its metadata carries the conversion_id)
+    
+    Returns:
+        Dict with conversion_id, page (1), page_count, the first page's
+        html and images, and the conversion metadata
+    """
+    conversion_id = result['metadata']['conversion_id']
+    pages = await asyncio.to_thread(split_pages, result['html'], result.get('images'))
+    _remember_pages(conversion_id, pages)
+    return {
+        **_page_response(conversion_id, pages, 1),
+        'metadata': result['metadata']
+    }
+
+
+async def get_page(
+    conversion_id: str,
+    page: int,
+    cache: Optional[ConversionCache] = None
+) -> Optional[Dict[str, Any]]:
+    """
+    Return one page of a cached conversion
+    
+    The document is split once, by paginate_result or the first fetch;
+    later pages come from the page cache.
+    
+    Args:
+        conversion_id: metadata.conversion_id of the conversion
+        page: Page number, starting at 1
+        cache: Conversion result cache (defaults to the shared cache)
+    
+    Returns:
+        Dict with conversion_id, page, page_count, html and images, or
+        None if the conversion is in neither cache or has no such page
+    """
+    if not CONVERSION_ID_PATTERN.fullmatch(conversion_id):
+        return None
+    
+    pages = _pages.get(conversion_id)
+    if pages is not None:
+        _pages.move_to_end(conversion_id)
+    else:
+        result = await (cache or conversion_cache).lookup(conversion_id)
+        if result is None:
+            return None
+        pages = await asyncio.to_thread(split_pages, result['html'], result.get('images'))
+        _remember_pages(conversion_id, pages)
+    
+    if not 1 <= page <= len(pages):
+        return None
+    
+    return _page_response(conversion_id, pages, page)
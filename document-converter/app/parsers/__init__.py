@@ -1,6 +1,6 @@
 """Document parser module"""
 from typing import Type
-from .base import BaseParser
+from .base import BaseParser, DocumentSource, ProgressCallback
 from .docx_parser import DocxParser
 from .odt_parser import OdtParser
 
@@ -21,4 +21,4 @@ def get_parser(extension: str) -> BaseParser:
     return parser_class()
 
 
-__all__ = ['BaseParser', 'DocxParser', 'OdtParser', 'get_parser']
\ No newline at end of file
+__all__ = ['BaseParser', 'DocumentSource', 'ProgressCallback', 'DocxParser', 'OdtParser', 'get_parser']
\ No newline at end of file
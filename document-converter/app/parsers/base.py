@@ -1,23 +1,53 @@
 """Base parser class for document conversion"""
 from abc import ABC, abstractmethod
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, Union, BinaryIO, Iterator, Callable
+import io
 import logging
+import re
 
 logger = logging.getLogger(__name__)
 
+# A document can be parsed from a path or from an in-memory, seekable buffer
+DocumentSource = Union[Path, str, BinaryIO, bytes, memoryview]
+
+# Called as progress(stage, **details), e.g. progress("images", processed=3, total=10)
+ProgressCallback = Callable[..., None]
+
+# Page break markup, as one alternation: known empty page break elements
+# first, then any element whose style asks for a page break
+PAGEBREAK_PATTERN = re.compile(
+    r'<div style="page-break-after: always"><span style="display: none">&nbsp;</span></div>'
+    r'|<(?P<empty>div|p) style="page-break-(?:after|before): always"></(?P=empty)>'
+    r'|<br style="page-break-(?:after|before): always">'
+    r'|<p><hr class="pagebreak"\s*/?></p>'
+    r'|<hr class="pagebreak"\s*/?>'
+    r'|<div class="page-break"></div>'
+    r'|<(?P<tag>\w+)(?P<before>[^>]*?)style="(?P<style>[^"]*page-break-(?:after|before):\s*always[^"]*)"(?P<after>[^>]*)>',
+    re.IGNORECASE
+)
+PAGEBREAK_STYLE = re.compile(r'page-break-(?:after|before):\s*always;?\s*', re.IGNORECASE)
+
 
 class BaseParser(ABC):
     """Abstract base class for document parsers"""
     
     @abstractmethod
-    def parse(self, file_path: Path, extract_images: bool = True) -> Dict[str, Any]:
+    def parse(
+        self,
+        source: DocumentSource,
+        extract_images: bool = True,
+        progress: Optional[ProgressCallback] = None
+    ) -> Dict[str, Any]:
         """
         Parse document and return HTML with metadata
         
         Args:
-            file_path: Path to document file
+            source: Path to document file, or a seekable binary buffer
+                (file object, BytesIO, bytes or memoryview)
             extract_images: Whether to extract embedded images
+            progress: Optional callback for "images" progress events
             
         Returns:
             Dictionary containing:
@@ -27,9 +57,26 @@ class BaseParser(ABC):
         """
         pass
     
+    @contextmanager
+    def _open_source(self, source: DocumentSource) -> Iterator[BinaryIO]:
+        """
+        Open a document source as a seekable binary file object
+        
+        Paths are opened (and closed afterwards); buffers are wrapped or
+        rewound and left open for the caller.
+        """
+        if isinstance(source, (str, Path)):
+            with open(source, 'rb') as file_obj:
+                yield file_obj
+        elif isinstance(source, (bytes, bytearray, memoryview)):
+            yield io.BytesIO(source)
+        else:
+            source.seek(0)
+            yield source
+    
     def _process_pagebreaks(self, html: str) -> str:
         """
-        Process and normalize page breaks in HTML
+        Normalize page break markup to PAGEBREAK_MARKER in a single scan
         
         Args:
             html: HTML content
@@ -39,47 +86,18 @@ class BaseParser(ABC):
         """
         from app.config import settings
         
-        # Common page break patterns to replace
-        pagebreak_patterns = [
-            '<div style="page-break-after: always"><span style="display: none">&nbsp;</span></div>',
-            '<div style="page-break-after: always"></div>',
-            '<div style="page-break-before: always"></div>',
-            '<br style="page-break-after: always">',
-            '<br style="page-break-before: always">',
-            '<p style="page-break-after: always"></p>',
-            '<p style="page-break-before: always"></p>',
-            '<hr class="pagebreak">',
-            '<div class="page-break"></div>'
-        ]
-        
-        # Replace all patterns with our standard marker
-        for pattern in pagebreak_patterns:
-            html = html.replace(pattern, settings.PAGEBREAK_MARKER)
-        
-        # Also handle page-break styles in any element
-        import re
-        
-        # Pattern to find elements with page-break styles
-        pagebreak_style_pattern = r'<(\w+)([^>]*?)style="([^"]*page-break-(?:after|before):\s*always[^"]*)"([^>]*)>'
-        
-        def replace_pagebreak_style(match):
-            tag = match.group(1)
-            before_style = match.group(2)
-            style = match.group(3)
-            after_style = match.group(4)
+        def replace_pagebreak(match):
+            tag = match.group('tag')
+            if tag is None:
+                # Known empty page break element
+                return settings.PAGEBREAK_MARKER
             
-            # Remove page-break style
-            new_style = re.sub(r'page-break-(?:after|before):\s*always;?\s*', '', style).strip()
-            
-            # Reconstruct element
+            # Remove page-break style, add pagebreak marker after element
+            new_style = PAGEBREAK_STYLE.sub('', match.group('style')).strip()
             if new_style:
-                element = f'<{tag}{before_style}style="{new_style}"{after_style}>'
+                element = f'<{tag}{match.group("before")}style="{new_style}"{match.group("after")}>'
             else:
-                element = f'<{tag}{before_style}{after_style}>'
-            
-            # Add pagebreak marker after element
+                element = f'<{tag}{match.group("before")}{match.group("after")}>'
             return element + settings.PAGEBREAK_MARKER
         
-        html = re.sub(pagebreak_style_pattern, replace_pagebreak_style, html, flags=re.IGNORECASE)
-        
-        return html
\ No newline at end of file
+        return PAGEBREAK_PATTERN.sub(replace_pagebreak, html)
\ No newline at end of file
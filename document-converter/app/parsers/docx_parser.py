@@ -1,17 +1,15 @@
 """DOCX/DOC parser using mammoth"""
 import logging
-from pathlib import Path
-from typing import Dict, List, Any
+import re
 import uuid
-import base64
-import io
+from pathlib import Path
+from typing import Dict, List, Any, Optional
+import zipfile
 
 import mammoth
-from PIL import Image
 
-from app.config import settings
-from app.utils import copy_to_public_media, generate_unique_filename
-from .base import BaseParser
+from app.media import image_pipeline, img_attributes
+from .base import BaseParser, DocumentSource, ProgressCallback
 
 logger = logging.getLogger(__name__)
 
@@ -19,9 +17,14 @@ logger = logging.getLogger(__name__)
 class DocxParser(BaseParser):
     """Parser for DOCX/DOC files using mammoth"""
     
-    def parse(self, file_path: Path, extract_images: bool = True) -> Dict[str, Any]:
-        """Parse DOCX/DOC file and convert to HTML"""
-        logger.info(f"Parsing DOCX file: {file_path}")
+    def parse(
+        self,
+        source: DocumentSource,
+        extract_images: bool = True,
+        progress: Optional[ProgressCallback] = None
+    ) -> Dict[str, Any]:
+        """Parse DOCX/DOC file (path or buffer) and convert to HTML"""
+        logger.info(f"Parsing DOCX file: {source if isinstance(source, (str, Path)) else '<buffer>'}")
         
         # Configure mammoth options
         style_map = """
@@ -37,74 +40,34 @@ class DocxParser(BaseParser):
         p[style-name='Intense Quote'] => blockquote:fresh
         r[style-name='Strong'] => strong
         r[style-name='Emphasis'] => em
+        br[type='page'] => hr.pagebreak
         """
         
         # Image handling
         images = []
+        batch = None
+        placeholder = f"image-pending-{uuid.uuid4().hex}-"
         
         def convert_image(image):
-            """Handle image conversion"""
+            """Queue the image for transcoding and return a placeholder src"""
             if not extract_images:
                 return {"src": ""}
             
             with image.open() as image_bytes:
                 image_data = image_bytes.read()
             
-            # Get image format
-            content_type = image.content_type or "image/png"
-            extension = content_type.split('/')[-1]
-            if extension not in ['png', 'jpg', 'jpeg', 'gif', 'bmp', 'webp']:
-                extension = 'png'
-            
-            # Generate filename
-            image_filename = generate_unique_filename(
-                f"image.{extension}",
-                prefix="doc_image"
-            )
-            
-            # Save image to media directory
-            image_path = settings.MEDIA_DIR / image_filename
-            
-            # Process image with PIL for optimization
-            try:
-                img = Image.open(io.BytesIO(image_data))
-                
-                # Convert RGBA to RGB if saving as JPEG
-                if extension in ['jpg', 'jpeg'] and img.mode in ('RGBA', 'LA', 'P'):
-                    rgb_img = Image.new('RGB', img.size, (255, 255, 255))
-                    if img.mode == 'P':
-                        img = img.convert('RGBA')
-                    rgb_img.paste(img, mask=img.split()[-1] if 'A' in img.mode else None)
-                    img = rgb_img
-                
-                # Save optimized image
-                img.save(
-                    image_path,
-                    format='JPEG' if extension in ['jpg', 'jpeg'] else extension.upper(),
-                    quality=settings.IMAGE_QUALITY,
-                    optimize=True
-                )
-            except Exception as e:
-                logger.error(f"Error processing image: {e}")
-                # Fall back to saving raw data
-                image_path.write_bytes(image_data)
-            
-            # Copy to public media directory
-            public_url = copy_to_public_media(image_path, image_filename)
-            
-            # Store image info
-            images.append({
-                'filename': image_filename,
-                'url': public_url,
-                'size': len(image_data),
-                'content_type': content_type
-            })
-            
-            return {"src": public_url}
+            index = batch.submit(image_data, image.content_type or "image/png")
+            return {"src": f"{placeholder}{index}"}
         
         # Convert document
         try:
-            with open(file_path, "rb") as docx_file:
+            with self._open_source(source) as docx_file:
+                if extract_images:
+                    batch = image_pipeline.batch(
+                        total=self._count_media(docx_file) if progress else None,
+                        progress=progress
+                    )
+                
                 result = mammoth.convert_to_html(
                     docx_file,
                     style_map=style_map,
@@ -113,7 +76,18 @@ class DocxParser(BaseParser):
             
             html = result.value
             
-            # Process page breaks
+            # Images were transcoded while mammoth kept converting; swap in src/srcset
+            if batch is not None:
+                stored = batch.results()
+                images = [image_info for image_info in stored if image_info]
+                
+                def resolve(match):
+                    image_info = stored[int(match.group(1))]
+                    return img_attributes(image_info) if image_info else 'src=""'
+                
+                html = re.sub(r'src="' + re.escape(placeholder) + r'(\d+)"', resolve, html)
+            
+            # Page breaks (mapped to hr.pagebreak above) become markers
             html = self._process_pagebreaks(html)
             
             # Log any messages from mammoth
@@ -131,6 +105,16 @@ class DocxParser(BaseParser):
             logger.error(f"Error parsing DOCX file: {e}", exc_info=True)
             raise ValueError(f"Failed to parse DOCX file: {str(e)}")
     
+    def _count_media(self, docx_file) -> Optional[int]:
+        """Count image references in the DOCX body (for progress reporting)"""
+        try:
+            with zipfile.ZipFile(docx_file) as package:
+                return package.read('word/document.xml').count(b'<a:blip ')
+        except (zipfile.BadZipFile, KeyError):
+            return None
+        finally:
+            docx_file.seek(0)
+    
     def _extract_styles(self, html: str) -> str:
         """Extract and generate CSS styles from HTML"""
         # For now, return empty styles as mammoth handles most styling
@@ -1,18 +1,21 @@
 """ODT parser for OpenDocument Text files"""
 import logging
+import mimetypes
+import re
 import zipfile
 import xml.etree.ElementTree as ET
 from pathlib import Path
-from typing import Dict, List, Any
+from typing import Any, Callable, Dict, List, Optional
+from html import unescape
 import base64
 import io
 
-from PIL import Image
 from bs4 import BeautifulSoup
 
 from app.config import settings
-from app.utils import copy_to_public_media, generate_unique_filename
-from .base import BaseParser
+from app.media import image_pipeline, img_attributes
+from .base import BaseParser, DocumentSource, ProgressCallback
+from .odt_styles import StyleTable
 
 logger = logging.getLogger(__name__)
 
@@ -28,211 +31,223 @@ class OdtParser(BaseParser):
         'svg': 'urn:oasis:names:tc:opendocument:xmlns:svg-compatible:1.0',
         'draw': 'urn:oasis:names:tc:opendocument:xmlns:drawing:1.0',
         'xlink': 'http://www.w3.org/1999/xlink',
+        'table': 'urn:oasis:names:tc:opendocument:xmlns:table:1.0',
         'office': 'urn:oasis:names:tc:opendocument:xmlns:office:1.0',
         'manifest': 'urn:oasis:names:tc:opendocument:xmlns:manifest:1.0'
     }
     
-    def parse(self, file_path: Path, extract_images: bool = True) -> Dict[str, Any]:
-        """Parse ODT file and convert to HTML"""
-        logger.info(f"Parsing ODT file: {file_path}")
+    # <draw:image xlink:href="..."> in raw content.xml, whatever the prefixes
+    IMAGE_HREF_PATTERN = re.compile(
+        rb'<(?:[\w.-]+:)?image\b[^>]*?\s(?:[\w.-]+:)?href\s*=\s*["\']([^"\']+)["\']'
+    )
+    
+    # Cap on table:number-rows-repeated / number-columns-repeated; spreadsheet-
+    # style tables repeat trailing empty rows and columns into the millions.
+    # Repeats beyond it are dropped, with a warning
+    MAX_REPEATED = 256
+    
+    # CSS pixels per absolute length unit (96px = 1in)
+    PX_PER_UNIT = {
+        'in': 96.0,
+        'cm': 96.0 / 2.54,
+        'mm': 96.0 / 25.4,
+        'pt': 96.0 / 72,
+        'pc': 16.0,
+        'px': 1.0
+    }
+    
+    def parse(
+        self,
+        source: DocumentSource,
+        extract_images: bool = True,
+        progress: Optional[ProgressCallback] = None
+    ) -> Dict[str, Any]:
+        """Parse ODT file (path or buffer) and convert to HTML"""
+        logger.info(f"Parsing ODT file: {source if isinstance(source, (str, Path)) else '<buffer>'}")
+        
+        # Per-document list state: the last number of each list, for
+        # continue-numbering
+        self._list_counters: Dict[tuple, int] = {}
         
         try:
-            with zipfile.ZipFile(file_path, 'r') as odt:
-                # Parse content.xml
+            with self._open_source(source) as odt_file, zipfile.ZipFile(odt_file, 'r') as odt:
+                # Read content.xml (parsed below, whole or streamed)
                 content_xml = odt.read('content.xml')
-                content_root = ET.fromstring(content_xml)
                 
-                # Parse styles.xml for style definitions
-                styles_xml = odt.read('styles.xml')
-                styles_root = ET.fromstring(styles_xml)
+                # styles.xml is only parsed if a style is missing from content.xml
+                def load_styles_xml():
+                    return ET.fromstring(odt.read('styles.xml'))
                 
                 # Extract images if requested
                 images = []
                 image_map = {}
                 if extract_images:
-                    images, image_map = self._extract_images(odt)
+                    referenced = self._referenced_images(content_xml)
+                    images, image_map = self._extract_images(odt, referenced, progress)
                 
                 # Convert to HTML
-                html_parts = []
-                styles_dict = self._parse_styles(content_root, styles_root)
-                
-                # Find body content
-                body = content_root.find('.//office:body/office:text', self.NAMESPACES)
-                if body is not None:
-                    for element in body:
-                        html_element = self._convert_element(element, styles_dict, image_map)
-                        if html_element:
-                            html_parts.append(html_element)
+                if settings.ODT_STREAMING_PARSE:
+                    html_parts, style_table = self._convert_body_streaming(content_xml, load_styles_xml, image_map)
+                else:
+                    html_parts, style_table = self._convert_body(content_xml, load_styles_xml, image_map)
                 
+                # Page breaks were emitted as markers during conversion
                 html = ''.join(html_parts)
                 
-                # Process page breaks
-                html = self._process_pagebreaks(html)
-                
-                # Generate CSS from styles
-                css = self._generate_css(styles_dict)
+                # Generate CSS from the styles the document used
+                css = style_table.css()
                 
                 return {
                     'html': html,
                     'images': images,
                     'styles': css
                 }
-                
+        
         except Exception as e:
             logger.error(f"Error parsing ODT file: {e}", exc_info=True)
             raise ValueError(f"Failed to parse ODT file: {str(e)}")
     
-    def _extract_images(self, odt_zip: zipfile.ZipFile) -> tuple:
-        """Extract images from ODT file"""
+    def _convert_body(self, content_xml: bytes, load_styles_xml: Callable, image_map: dict) -> tuple:
+        """
+        Convert the document body from a fully parsed content.xml
+        
+        Returns:
+            Tuple of (HTML fragments, StyleTable)
+        """
+        content_root = ET.fromstring(content_xml)
+        style_table = StyleTable(
+            content_root.find('office:automatic-styles', self.NAMESPACES),
+            load_styles_xml
+        )
+        
+        html_parts = []
+        
+        # Find body content
+        body = content_root.find('.//office:body/office:text', self.NAMESPACES)
+        if body is not None:
+            for element in body:
+                html_element = self._convert_element(element, style_table, image_map)
+                if html_element:
+                    html_parts.append(html_element)
+        
+        return html_parts, style_table
+    
+    def _convert_body_streaming(self, content_xml: bytes, load_styles_xml: Callable, image_map: dict) -> tuple:
+        """
+        Convert the document body incrementally with iterparse
+        
+        office:automatic-styles precedes office:body in content.xml, so
+        styles are resolved as soon as it closes. Each top-level child of
+        office:text is then converted when it closes and dropped from the
+        tree, so memory use is bounded by the largest top-level element
+        instead of growing with document length.
+        
+        Returns:
+            Tuple of (HTML fragments, StyleTable)
+        """
+        office_ns = self.NAMESPACES['office']
+        automatic_styles_tag = f'{{{office_ns}}}automatic-styles'
+        body_tag = f'{{{office_ns}}}body'
+        text_tag = f'{{{office_ns}}}text'
+        
+        html_parts = []
+        style_table = None
+        stack = []
+        body = None
+        
+        for event, element in ET.iterparse(io.BytesIO(content_xml), events=('start', 'end')):
+            if event == 'start':
+                if element.tag == text_tag and stack and stack[-1].tag == body_tag:
+                    body = element
+                stack.append(element)
+                continue
+            
+            stack.pop()
+            
+            if element.tag == automatic_styles_tag and style_table is None:
+                style_table = StyleTable(element, load_styles_xml)
+            elif body is not None and stack and stack[-1] is body:
+                if style_table is None:
+                    # Document without automatic styles
+                    style_table = StyleTable(None, load_styles_xml)
+                html_element = self._convert_element(element, style_table, image_map)
+                if html_element:
+                    html_parts.append(html_element)
+                body.remove(element)
+        
+        return html_parts, style_table or StyleTable(None, load_styles_xml)
+    
+    def _referenced_images(self, content_xml: bytes) -> set:
+        """
+        Collect the image hrefs used by the document body
+        
+        A byte-level scan, so it costs far less than parsing content.xml;
+        thumbnails and pictures left over from edits are never referenced.
+        
+        Args:
+            content_xml: Raw content.xml
+        
+        Returns:
+            Package paths of referenced images
+        """
+        return {
+            unescape(href.decode('utf-8'))
+            for href in self.IMAGE_HREF_PATTERN.findall(content_xml)
+        }
+    
+    def _extract_images(
+        self,
+        odt_zip: zipfile.ZipFile,
+        referenced: set,
+        progress: Optional[ProgressCallback] = None
+    ) -> tuple:
+        """Extract the referenced images from ODT file"""
         images = []
         image_map = {}
         
-        # Get manifest to find images
+        # Get manifest to find image types
         try:
             manifest_xml = odt_zip.read('META-INF/manifest.xml')
             manifest_root = ET.fromstring(manifest_xml)
             
+            media_types = {}
             for file_entry in manifest_root.findall('.//manifest:file-entry', self.NAMESPACES):
                 full_path = file_entry.get('{urn:oasis:names:tc:opendocument:xmlns:manifest:1.0}full-path')
                 media_type = file_entry.get('{urn:oasis:names:tc:opendocument:xmlns:manifest:1.0}media-type')
-                
-                if full_path and media_type and media_type.startswith('image/'):
-                    try:
-                        image_data = odt_zip.read(full_path)
-                        
-                        # Get image extension
-                        extension = media_type.split('/')[-1]
-                        if extension not in ['png', 'jpg', 'jpeg', 'gif', 'bmp', 'webp']:
-                            extension = 'png'
-                        
-                        # Generate filename
-                        image_filename = generate_unique_filename(
-                            f"image.{extension}",
-                            prefix="odt_image"
-                        )
-                        
-                        # Save image to media directory
-                        image_path = settings.MEDIA_DIR / image_filename
-                        
-                        # Process image with PIL
-                        try:
-                            img = Image.open(io.BytesIO(image_data))
-                            
-                            # Convert RGBA to RGB if saving as JPEG
-                            if extension in ['jpg', 'jpeg'] and img.mode in ('RGBA', 'LA', 'P'):
-                                rgb_img = Image.new('RGB', img.size, (255, 255, 255))
-                                if img.mode == 'P':
-                                    img = img.convert('RGBA')
-                                rgb_img.paste(img, mask=img.split()[-1] if 'A' in img.mode else None)
-                                img = rgb_img
-                            
-                            # Save optimized image
-                            img.save(
-                                image_path,
-                                format='JPEG' if extension in ['jpg', 'jpeg'] else extension.upper(),
-                                quality=settings.IMAGE_QUALITY,
-                                optimize=True
-                            )
-                        except Exception as e:
-                            logger.error(f"Error processing image: {e}")
-                            # Fall back to saving raw data
-                            image_path.write_bytes(image_data)
-                        
-                        # Copy to public media directory
-                        public_url = copy_to_public_media(image_path, image_filename)
-                        
-                        # Store image info
-                        image_info = {
-                            'filename': image_filename,
-                            'url': public_url,
-                            'size': len(image_data),
-                            'content_type': media_type
-                        }
-                        images.append(image_info)
-                        image_map[full_path] = public_url
-                        
-                    except Exception as e:
-                        logger.error(f"Error extracting image {full_path}: {e}")
+                if full_path:
+                    media_types[full_path] = media_type
+            
+            packaged = set(odt_zip.namelist())
+            image_entries = []
+            for full_path in sorted(referenced):
+                if full_path not in packaged:
+                    # External links and missing parts
+                    continue
+                media_type = media_types.get(full_path) or mimetypes.guess_type(full_path)[0]
+                if media_type and media_type.startswith('image/'):
+                    image_entries.append((full_path, media_type))
+            
+            # Transcode all images concurrently on the shared pipeline
+            batch = image_pipeline.batch(total=len(image_entries), progress=progress)
+            submitted = []
+            for full_path, media_type in image_entries:
+                try:
+                    batch.submit(odt_zip.read(full_path), media_type)
+                    submitted.append(full_path)
+                except Exception as e:
+                    logger.error(f"Error extracting image {full_path}: {e}")
+            
+            for full_path, image_info in zip(submitted, batch.results()):
+                if image_info:
+                    images.append(image_info)
+                    image_map[full_path] = image_info
         
         except Exception as e:
             logger.error(f"Error reading manifest: {e}")
         
         return images, image_map
     
-    def _parse_styles(self, content_root: ET.Element, styles_root: ET.Element) -> dict:
-        """Parse style definitions from ODT"""
-        styles = {}
-        
-        # Parse automatic styles from content.xml
-        for style in content_root.findall('.//style:style', self.NAMESPACES):
-            style_name = style.get('{urn:oasis:names:tc:opendocument:xmlns:style:1.0}name')
-            if style_name:
-                styles[style_name] = self._extract_style_properties(style)
-        
-        # Parse styles from styles.xml
-        for style in styles_root.findall('.//style:style', self.NAMESPACES):
-            style_name = style.get('{urn:oasis:names:tc:opendocument:xmlns:style:1.0}name')
-            if style_name:
-                styles[style_name] = self._extract_style_properties(style)
-        
-        return styles
-    
-    def _extract_style_properties(self, style_element: ET.Element) -> dict:
-        """Extract CSS properties from ODT style element"""
-        css_props = {}
-        
-        # Text properties
-        text_props = style_element.find('.//style:text-properties', self.NAMESPACES)
-        if text_props is not None:
-            # Font weight
-            font_weight = text_props.get('{urn:oasis:names:tc:opendocument:xmlns:xsl-fo-compatible:1.0}font-weight')
-            if font_weight == 'bold':
-                css_props['font-weight'] = 'bold'
-            
-            # Font style
-            font_style = text_props.get('{urn:oasis:names:tc:opendocument:xmlns:xsl-fo-compatible:1.0}font-style')
-            if font_style == 'italic':
-                css_props['font-style'] = 'italic'
-            
-            # Text decoration
-            text_decoration = text_props.get('{urn:oasis:names:tc:opendocument:xmlns:style:1.0}text-underline-style')
-            if text_decoration and text_decoration != 'none':
-                css_props['text-decoration'] = 'underline'
-            
-            # Font size
-            font_size = text_props.get('{urn:oasis:names:tc:opendocument:xmlns:xsl-fo-compatible:1.0}font-size')
-            if font_size:
-                css_props['font-size'] = font_size
-            
-            # Color
-            color = text_props.get('{urn:oasis:names:tc:opendocument:xmlns:xsl-fo-compatible:1.0}color')
-            if color:
-                css_props['color'] = color
-        
-        # Paragraph properties
-        para_props = style_element.find('.//style:paragraph-properties', self.NAMESPACES)
-        if para_props is not None:
-            # Text alignment
-            text_align = para_props.get('{urn:oasis:names:tc:opendocument:xmlns:xsl-fo-compatible:1.0}text-align')
-            if text_align:
-                css_props['text-align'] = text_align
-            
-            # Margins
-            margin_left = para_props.get('{urn:oasis:names:tc:opendocument:xmlns:xsl-fo-compatible:1.0}margin-left')
-            if margin_left:
-                css_props['margin-left'] = margin_left
-            
-            # Check for page breaks
-            break_before = para_props.get('{urn:oasis:names:tc:opendocument:xmlns:xsl-fo-compatible:1.0}break-before')
-            break_after = para_props.get('{urn:oasis:names:tc:opendocument:xmlns:xsl-fo-compatible:1.0}break-after')
-            if break_before == 'page':
-                css_props['page-break-before'] = 'always'
-            if break_after == 'page':
-                css_props['page-break-after'] = 'always'
-        
-        return css_props
-    
-    def _convert_element(self, element: ET.Element, styles: dict, image_map: dict) -> str:
+    def _convert_element(self, element: ET.Element, styles: StyleTable, image_map: dict) -> str:
         """Convert ODT element to HTML"""
         tag = element.tag.split('}')[-1]  # Remove namespace
         
@@ -262,62 +277,183 @@ class OdtParser(BaseParser):
         
         return ''
     
-    def _convert_paragraph(self, para: ET.Element, styles: dict, image_map: dict = None) -> str:
+    def _convert_paragraph(self, para: ET.Element, styles: StyleTable, image_map: dict = None) -> str:
         """Convert paragraph element to HTML"""
         style_name = para.get('{urn:oasis:names:tc:opendocument:xmlns:text:1.0}style-name')
-        style_attr = ''
-        
-        if style_name and style_name in styles:
-            style_props = styles[style_name]
-            style_parts = [f"{k}: {v}" for k, v in style_props.items()]
-            if style_parts:
-                style_attr = f' style="{"; ".join(style_parts)}"'
+        style_attr = styles.style_attribute(style_name)
         
         content = self._get_text_content(para, styles, image_map)
-        return f'<p{style_attr}>{content}</p>'
+        return self._with_page_breaks(f'<p{style_attr}>{content}</p>', styles, style_name)
     
-    def _convert_heading(self, heading: ET.Element, styles: dict, image_map: dict = None) -> str:
+    def _convert_heading(self, heading: ET.Element, styles: StyleTable, image_map: dict = None) -> str:
         """Convert heading element to HTML"""
         level = heading.get('{urn:oasis:names:tc:opendocument:xmlns:text:1.0}outline-level', '1')
+        style_name = heading.get('{urn:oasis:names:tc:opendocument:xmlns:text:1.0}style-name')
         content = self._get_text_content(heading, styles, image_map)
-        return f'<h{level}>{content}</h{level}>'
+        return self._with_page_breaks(f'<h{level}>{content}</h{level}>', styles, style_name)
+    
+    def _with_page_breaks(self, html: str, styles: StyleTable, style_name: Optional[str]) -> str:
+        """Surround converted block HTML with the page break markers its style asks for"""
+        break_before, break_after = styles.page_breaks(style_name)
+        if break_before:
+            html = settings.PAGEBREAK_MARKER + html
+        if break_after:
+            html += settings.PAGEBREAK_MARKER
+        return html
     
-    def _convert_list(self, list_elem: ET.Element, styles: dict, image_map: dict = None) -> str:
-        """Convert list element to HTML"""
+    def _convert_list(
+        self,
+        list_elem: ET.Element,
+        styles: StyleTable,
+        image_map: dict = None,
+        level: int = 1,
+        list_style: Optional[str] = None
+    ) -> str:
+        """
+        Convert list element, and the lists nested in it, to HTML
+        
+        Walks only direct children, so each item is visited exactly once
+        however deeply lists are nested.
+        
+        Args:
+            list_elem: text:list element
+            styles: Parsed styles
+            image_map: Extracted images by package path
+            level: Nesting level (1 for a top-level list)
+            list_style: List style inherited from the enclosing list
+        """
+        list_style = list_elem.get('{urn:oasis:names:tc:opendocument:xmlns:text:1.0}style-name') or list_style
+        list_tag = styles.list_levels(list_style).get(level, 'ul')
+        
         list_items = []
+        item_count = 0
+        first_value = None
         
-        for item in list_elem.findall('.//text:list-item', self.NAMESPACES):
+        for item in list_elem:
+            tag = item.tag.split('}')[-1]
+            if tag not in ('list-item', 'list-header'):
+                continue
+            
+            if tag == 'list-item':
+                item_count += 1
+                if item_count == 1:
+                    first_value = item.get('{urn:oasis:names:tc:opendocument:xmlns:text:1.0}start-value')
+            
             item_content = []
             for child in item:
-                if child.tag.endswith('p'):
+                child_tag = child.tag.split('}')[-1]
+                if child_tag in ('p', 'h'):
                     item_content.append(self._get_text_content(child, styles, image_map))
+                elif child_tag == 'list':
+                    item_content.append(self._convert_list(child, styles, image_map, level + 1, list_style))
+                else:
+                    item_content.append(self._convert_element(child, styles, image_map))
             list_items.append(f'<li>{"".join(item_content)}</li>')
         
-        # Determine if ordered or unordered (simplified)
-        list_tag = 'ul'  # Default to unordered
-        return f'<{list_tag}>{"".join(list_items)}</{list_tag}>'
+        start_attr = ''
+        if list_tag == 'ol' and level == 1:
+            start = self._list_start(list_elem, list_style, first_value)
+            self._remember_list_end(list_elem, list_style, start + item_count - 1)
+            if start != 1:
+                start_attr = f' start="{start}"'
+        
+        return f'<{list_tag}{start_attr}>{"".join(list_items)}</{list_tag}>'
     
-    def _convert_table(self, table: ET.Element, styles: dict, image_map: dict = None) -> str:
-        """Convert table element to HTML"""
-        html_parts = ['<table>']
+    def _list_start(self, list_elem: ET.Element, list_style: Optional[str], first_value: Optional[str]) -> int:
+        """Number of the first item of a top-level ordered list"""
+        if first_value and first_value.isdigit():
+            return int(first_value)
+        
+        continue_list = list_elem.get('{urn:oasis:names:tc:opendocument:xmlns:text:1.0}continue-list')
+        if continue_list:
+            return self._list_counters.get(('id', continue_list), 0) + 1
+        if list_elem.get('{urn:oasis:names:tc:opendocument:xmlns:text:1.0}continue-numbering') == 'true':
+            return self._list_counters.get(('style', list_style), 0) + 1
+        return 1
+    
+    def _remember_list_end(self, list_elem: ET.Element, list_style: Optional[str], last_number: int):
+        """Record the last number of a list so later lists can continue it"""
+        self._list_counters[('style', list_style)] = last_number
+        list_id = list_elem.get('{http://www.w3.org/XML/1998/namespace}id')
+        if list_id:
+            self._list_counters[('id', list_id)] = last_number
+    
+    def _convert_table(self, table: ET.Element, styles: StyleTable, image_map: dict = None) -> str:
+        """
+        Convert table element to HTML
+        
+        Rows and cells are reached through direct children only, so nested
+        tables are converted once, inside their own cell. Repeated rows and
+        columns are rendered once and multiplied, capped at MAX_REPEATED.
+        """
+        header_rows = []
+        rows = []
+        self._convert_table_rows(table, styles, image_map, rows, header_rows)
         
-        for row in table.findall('.//table:table-row', self.NAMESPACES):
-            html_parts.append('<tr>')
+        if not header_rows:
+            table_html = f'<table>{"".join(rows)}</table>'
+        else:
+            table_html = f'<table><thead>{"".join(header_rows)}</thead><tbody>{"".join(rows)}</tbody></table>'
+        
+        style_name = table.get('{urn:oasis:names:tc:opendocument:xmlns:table:1.0}style-name')
+        return self._with_page_breaks(table_html, styles, style_name)
+    
+    def _convert_table_rows(self, container: ET.Element, styles: StyleTable, image_map: dict, rows: list, header_rows: list):
+        """Append the HTML of the rows in container (and its row groups) to rows/header_rows"""
+        for child in container:
+            tag = child.tag.split('}')[-1]
+            if tag == 'table-row':
+                rows.append(self._convert_table_row(child, styles, image_map))
+            elif tag == 'table-header-rows':
+                self._convert_table_rows(child, styles, image_map, header_rows, header_rows)
+            elif tag in ('table-rows', 'table-row-group'):
+                self._convert_table_rows(child, styles, image_map, rows, header_rows)
+    
+    def _convert_table_row(self, row: ET.Element, styles: StyleTable, image_map: dict) -> str:
+        """Convert a table row, including its repeats"""
+        cells = []
+        for cell in row:
+            # Covered cells are spanned by an earlier cell; they produce no <td>
+            if cell.tag.split('}')[-1] != 'table-cell':
+                continue
             
-            for cell in row.findall('.//table:table-cell', self.NAMESPACES):
-                html_parts.append('<td>')
-                
-                for child in cell:
-                    if child.tag.endswith('p'):
-                        content = self._get_text_content(child, styles, image_map)
-                        html_parts.append(f'<p>{content}</p>')
-                
-                html_parts.append('</td>')
+            attrs = ''
+            colspan = self._repeat_count(cell, 'number-columns-spanned')
+            rowspan = self._repeat_count(cell, 'number-rows-spanned')
+            if colspan > 1:
+                attrs += f' colspan="{colspan}"'
+            if rowspan > 1:
+                attrs += f' rowspan="{rowspan}"'
             
-            html_parts.append('</tr>')
+            cell_html = f'<td{attrs}>{self._convert_cell_content(cell, styles, image_map)}</td>'
+            cells.append(cell_html * self._repeat_count(cell, 'number-columns-repeated', capped=True))
         
-        html_parts.append('</table>')
-        return ''.join(html_parts)
+        row_html = f'<tr>{"".join(cells)}</tr>'
+        return row_html * self._repeat_count(row, 'number-rows-repeated', capped=True)
+    
+    def _convert_cell_content(self, cell: ET.Element, styles: StyleTable, image_map: dict) -> str:
+        """Convert the block content of a table cell"""
+        parts = []
+        for child in cell:
+            tag = child.tag.split('}')[-1]
+            if tag in ('p', 'h'):
+                content = self._get_text_content(child, styles, image_map)
+                parts.append(f'<p>{content}</p>')
+            else:
+                parts.append(self._convert_element(child, styles, image_map))
+        return ''.join(parts)
+    
+    def _repeat_count(self, element: ET.Element, attribute: str, capped: bool = False) -> int:
+        """Read a table:number-* attribute as a positive count"""
+        value = element.get(f'{{urn:oasis:names:tc:opendocument:xmlns:table:1.0}}{attribute}', '1')
+        count = int(value) if value.isdigit() and int(value) > 0 else 1
+        if capped and count > self.MAX_REPEATED:
+            logger.warning(
+                f"table:{attribute}={count} exceeds {self.MAX_REPEATED}; "
+                f"dropping the other {count - self.MAX_REPEATED} repeats"
+            )
+            return self.MAX_REPEATED
+        return count
     
     def _convert_frame(self, frame: ET.Element, image_map: dict) -> str:
         """Convert frame (image) element to HTML"""
@@ -326,23 +462,19 @@ class OdtParser(BaseParser):
         if image is not None:
             href = image.get('{http://www.w3.org/1999/xlink}href')
             if href and href in image_map:
-                url = image_map[href]
+                image_info = image_map[href]
                 
-                # Get dimensions if available
+                # Display size from the frame, if given in absolute units
                 width = frame.get('{urn:oasis:names:tc:opendocument:xmlns:svg-compatible:1.0}width')
                 height = frame.get('{urn:oasis:names:tc:opendocument:xmlns:svg-compatible:1.0}height')
+                width = self._convert_dimension(width) if width else None
+                height = self._convert_dimension(height) if height else None
                 
-                attrs = [f'src="{url}"']
-                if width:
-                    attrs.append(f'width="{self._convert_dimension(width)}"')
-                if height:
-                    attrs.append(f'height="{self._convert_dimension(height)}"')
-                
-                return f'<img {" ".join(attrs)} alt="">'
+                return f'<img {img_attributes(image_info, width=width, height=height)} alt="">'
         
         return ''
     
-    def _get_text_content(self, element: ET.Element, styles: dict, image_map: dict = None) -> str:
+    def _get_text_content(self, element: ET.Element, styles: StyleTable, image_map: dict = None) -> str:
         """Extract text content from element with formatting"""
         parts = []
         
@@ -356,20 +488,10 @@ class OdtParser(BaseParser):
             
             if tag == 'span':
                 style_name = child.get('{urn:oasis:names:tc:opendocument:xmlns:text:1.0}style-name')
-                text = child.text or ''
                 
-                if style_name and style_name in styles:
-                    style_props = styles[style_name]
-                    
-                    # Apply inline formatting
-                    if style_props.get('font-weight') == 'bold':
-                        text = f'<strong>{text}</strong>'
-                    if style_props.get('font-style') == 'italic':
-                        text = f'<em>{text}</em>'
-                    if style_props.get('text-decoration') == 'underline':
-                        text = f'<u>{text}</u>'
-                
-                parts.append(text)
+                # Apply inline formatting
+                opening, closing = styles.inline_tags(style_name)
+                parts.append(f'{opening}{child.text or ""}{closing}')
             
             elif tag == 'frame' and image_map:
                 # Handle embedded images
@@ -393,24 +515,10 @@ class OdtParser(BaseParser):
         
         return ''.join(parts)
     
-    def _convert_dimension(self, dim: str) -> str:
-        """Convert ODT dimension to CSS dimension"""
-        # Simple conversion - can be enhanced
-        if dim.endswith('cm'):
-            # Convert cm to approximate pixels
-            cm_value = float(dim[:-2])
-            px_value = int(cm_value * 37.8)  # 1cm ≈ 37.8px
-            return f"{px_value}"
-        return dim
-    
-    def _generate_css(self, styles: dict) -> str:
-        """Generate CSS from parsed styles"""
-        css_rules = []
-        
-        for style_name, props in styles.items():
-            if props:
-                css_props = [f"{k}: {v}" for k, v in props.items() if k != 'page-break-before' and k != 'page-break-after']
-                if css_props:
-                    css_rules.append(f".{style_name} {{ {'; '.join(css_props)}; }}")
-        
-        return '\n'.join(css_rules)
\ No newline at end of file
+    def _convert_dimension(self, dim: str) -> Optional[int]:
+        """Convert ODT length (cm, mm, in, pt, pc, px) to CSS pixels"""
+        match = re.fullmatch(r'\s*([0-9]*\.?[0-9]+)\s*(cm|mm|in|pt|pc|px)\s*', dim)
+        if not match:
+            # Relative units (e.g. %) have no pixel equivalent
+            return None
+        return round(float(match.group(1)) * self.PX_PER_UNIT[match.group(2)])
@@ -0,0 +1,243 @@
+"""Resolved style table for ODT documents"""
+import logging
+import xml.etree.ElementTree as ET
+from typing import Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+STYLE_NS = 'urn:oasis:names:tc:opendocument:xmlns:style:1.0'
+TEXT_NS = 'urn:oasis:names:tc:opendocument:xmlns:text:1.0'
+FO_NS = 'urn:oasis:names:tc:opendocument:xmlns:xsl-fo-compatible:1.0'
+
+STYLE_TAG = f'{{{STYLE_NS}}}style'
+LIST_STYLE_TAG = f'{{{TEXT_NS}}}list-style'
+NAME_ATTR = f'{{{STYLE_NS}}}name'
+PARENT_ATTR = f'{{{STYLE_NS}}}parent-style-name'
+
+# Properties that become page break markers rather than CSS
+PAGE_BREAK_PROPERTIES = ('page-break-before', 'page-break-after')
+
+
+class StyleTable:
+    """Per-document table of ODT styles, resolved on first use
+    
+    Styles are looked up in content.xml's automatic styles first; styles.xml
+    is only parsed when a style (or a parent style) is not found there.
+    Each style's properties are resolved once, merged over its
+    style:parent-style-name chain, and the inline style attribute and
+    wrapper tags are rendered once per style name.
+    """
+    
+    def __init__(
+        self,
+        automatic_styles: Optional[ET.Element],
+        load_styles_xml: Optional[Callable[[], Optional[ET.Element]]] = None
+    ):
+        """
+        Initialize style table
+        
+        Args:
+            automatic_styles: office:automatic-styles element of content.xml
+                (or any element containing the style definitions)
+            load_styles_xml: Returns the parsed styles.xml root; called at
+                most once, when a style is missing from automatic_styles
+        """
+        self._definitions: Dict[str, ET.Element] = {}
+        self._list_definitions: Dict[str, ET.Element] = {}
+        self._load_styles_xml = load_styles_xml
+        
+        self._properties: Dict[str, Dict[str, str]] = {}
+        self._style_attributes: Dict[str, str] = {}
+        self._inline_tags: Dict[str, Tuple[str, str]] = {}
+        self._list_levels: Dict[str, Dict[int, str]] = {}
+        
+        if automatic_styles is not None:
+            self._index(automatic_styles, override=True)
+    
+    def properties(self, name: Optional[str]) -> Dict[str, str]:
+        """CSS properties of a style, including inherited ones"""
+        if not name:
+            return {}
+        
+        properties = self._properties.get(name)
+        if properties is not None:
+            return properties
+        
+        # Mark as in progress so a cyclic parent chain terminates
+        self._properties[name] = {}
+        
+        definition = self._definition(name)
+        if definition is None:
+            return {}
+        
+        properties = dict(self.properties(definition.get(PARENT_ATTR)))
+        properties.update(self._own_properties(definition))
+        self._properties[name] = properties
+        return properties
+    
+    def style_attribute(self, name: Optional[str]) -> str:
+        """Rendered ' style="..."' attribute for a paragraph style, or ''"""
+        if not name:
+            return ''
+        
+        attribute = self._style_attributes.get(name)
+        if attribute is None:
+            style_parts = [
+                f"{k}: {v}" for k, v in self.properties(name).items() if k not in PAGE_BREAK_PROPERTIES
+            ]
+            attribute = f' style="{"; ".join(style_parts)}"' if style_parts else ''
+            self._style_attributes[name] = attribute
+        return attribute
+    
+    def page_breaks(self, name: Optional[str]) -> Tuple[bool, bool]:
+        """Whether a paragraph or table style breaks the page before / after it"""
+        properties = self.properties(name)
+        return 'page-break-before' in properties, 'page-break-after' in properties
+    
+    def inline_tags(self, name: Optional[str]) -> Tuple[str, str]:
+        """Opening and closing wrapper tags (strong/em/u) for a text style"""
+        if not name:
+            return '', ''
+        
+        tags = self._inline_tags.get(name)
+        if tags is None:
+            properties = self.properties(name)
+            wrappers = []
+            if properties.get('font-weight') == 'bold':
+                wrappers.append('strong')
+            if properties.get('font-style') == 'italic':
+                wrappers.append('em')
+            if properties.get('text-decoration') == 'underline':
+                wrappers.append('u')
+            
+            opening = ''.join(f'<{tag}>' for tag in reversed(wrappers))
+            closing = ''.join(f'</{tag}>' for tag in wrappers)
+            tags = (opening, closing)
+            self._inline_tags[name] = tags
+        return tags
+    
+    def list_levels(self, name: Optional[str]) -> Dict[int, str]:
+        """Map each level of a list style to 'ol' (numbered) or 'ul'"""
+        if not name:
+            return {}
+        
+        levels = self._list_levels.get(name)
+        if levels is None:
+            definition = self._list_definitions.get(name)
+            if definition is None and self._load_pending():
+                definition = self._list_definitions.get(name)
+            
+            levels = {}
+            for level_style in definition if definition is not None else ():
+                level = level_style.get(f'{{{TEXT_NS}}}level', '1')
+                if level.isdigit():
+                    is_numbered = level_style.tag.endswith('list-level-style-number')
+                    levels[int(level)] = 'ol' if is_numbered else 'ul'
+            self._list_levels[name] = levels
+        return levels
+    
+    def css(self) -> str:
+        """CSS rules for every style resolved so far"""
+        css_rules = []
+        
+        for style_name, props in self._properties.items():
+            css_props = [f"{k}: {v}" for k, v in props.items() if k not in PAGE_BREAK_PROPERTIES]
+            if css_props:
+                css_rules.append(f".{style_name} {{ {'; '.join(css_props)}; }}")
+        
+        return '\n'.join(css_rules)
+    
+    def _definition(self, name: str) -> Optional[ET.Element]:
+        """Find a style:style definition, loading styles.xml if needed"""
+        definition = self._definitions.get(name)
+        if definition is None and self._load_pending():
+            definition = self._definitions.get(name)
+        return definition
+    
+    def _load_pending(self) -> bool:
+        """Index styles.xml if it has not been loaded yet; True if it was just loaded"""
+        if self._load_styles_xml is None:
+            return False
+        
+        load, self._load_styles_xml = self._load_styles_xml, None
+        try:
+            styles_root = load()
+        except Exception as e:
+            logger.warning(f"Could not read styles.xml: {e}")
+            return False
+        if styles_root is None:
+            return False
+        
+        # Automatic styles win over same-named common styles
+        self._index(styles_root, override=False)
+        return True
+    
+    def _index(self, root: ET.Element, override: bool):
+        """Record the style and list style definitions under root by name"""
+        for element in root.iter():
+            if element.tag == STYLE_TAG:
+                target = self._definitions
+            elif element.tag == LIST_STYLE_TAG:
+                target = self._list_definitions
+            else:
+                continue
+            name = element.get(NAME_ATTR)
+            if name and (override or name not in target):
+                target[name] = element
+    
+    @staticmethod
+    def _own_properties(style_element: ET.Element) -> Dict[str, str]:
+        """Extract CSS properties declared directly on an ODT style element"""
+        css_props = {}
+        
+        # Text properties
+        text_props = style_element.find(f'{{{STYLE_NS}}}text-properties')
+        if text_props is not None:
+            # Font weight
+            font_weight = text_props.get(f'{{{FO_NS}}}font-weight')
+            if font_weight == 'bold':
+                css_props['font-weight'] = 'bold'
+            
+            # Font style
+            font_style = text_props.get(f'{{{FO_NS}}}font-style')
+            if font_style == 'italic':
+                css_props['font-style'] = 'italic'
+            
+            # Text decoration
+            text_decoration = text_props.get(f'{{{STYLE_NS}}}text-underline-style')
+            if text_decoration and text_decoration != 'none':
+                css_props['text-decoration'] = 'underline'
+            
+            # Font size
+            font_size = text_props.get(f'{{{FO_NS}}}font-size')
+            if font_size:
+                css_props['font-size'] = font_size
+            
+            # Color
+            color = text_props.get(f'{{{FO_NS}}}color')
+            if color:
+                css_props['color'] = color
+        
+        # Paragraph properties
+        para_props = style_element.find(f'{{{STYLE_NS}}}paragraph-properties')
+        if para_props is not None:
+            # Text alignment
+            text_align = para_props.get(f'{{{FO_NS}}}text-align')
+            if text_align:
+                css_props['text-align'] = text_align
+            
+            # Margins
+            margin_left = para_props.get(f'{{{FO_NS}}}margin-left')
+            if margin_left:
+                css_props['margin-left'] = margin_left
+        
+        # Check for page breaks (paragraph and table styles)
+        for break_props in (para_props, style_element.find(f'{{{STYLE_NS}}}table-properties')):
+            if break_props is None:
+                continue
+            if break_props.get(f'{{{FO_NS}}}break-before') == 'page':
+                css_props['page-break-before'] = 'always'
+            if break_props.get(f'{{{FO_NS}}}break-after') == 'page':
+                css_props['page-break-after'] = 'always'
+        
+        return css_props
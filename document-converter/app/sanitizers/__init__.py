@@ -1,4 +1,5 @@
 """HTML sanitizer module"""
 from .html_sanitizer import HTMLSanitizer
+from .policy import SanitizerPolicy, get_policy
 
-__all__ = ['HTMLSanitizer']
\ No newline at end of file
+__all__ = ['HTMLSanitizer', 'SanitizerPolicy', 'get_policy']
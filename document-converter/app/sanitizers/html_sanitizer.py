@@ -1,15 +1,41 @@
-"""HTML sanitizer using bleach"""
+"""HTML sanitizer using bleach, or a single lxml tree walk"""
+import inspect
 import logging
+from html import escape
 from typing import List, Dict, Optional
+from urllib.parse import urlparse
 import re
 
-import bleach
+from bleach.html5lib_shim import HTML_TAGS_BLOCK_LEVEL
 from bs4 import BeautifulSoup
+from bs4.element import PreformattedString, Tag
+from lxml import etree
+from lxml import html as lxml_html
 
 from app.config import settings
+from .policy import SanitizerPolicy, get_policy
 
 logger = logging.getLogger(__name__)
 
+# Attributes whose values are URIs and must use a safe protocol (as bleach)
+URI_ATTRIBUTES = frozenset([
+    'href', 'src', 'cite', 'action', 'longdesc', 'poster', 'background',
+    'datasrc', 'dynsrc', 'lowsrc', 'ping'
+])
+ALLOWED_PROTOCOLS = frozenset(['http', 'https', 'mailto'])
+
+# Characters bleach ignores when reading a URI's protocol
+URI_IGNORED_CHARACTERS = re.compile(r'[`\000-\040\177-\240\s\ufffd]+')
+
+# Elements removed when they end up empty
+PRUNABLE_TAGS = frozenset(['p', 'div'])
+
+# Tag.extract() finds a tag among its siblings (a linear scan) unless it is
+# given the tag's index through the private _self_index keyword. Use it where
+# this bs4 has it (see requirements.txt); without it pruning is still
+# correct, only quadratic in the number of sibling blocks removed.
+EXTRACT_TAKES_INDEX = '_self_index' in inspect.signature(Tag.extract).parameters
+
 
 class HTMLSanitizer:
     """Sanitize HTML content based on allowed tags and attributes"""
@@ -18,7 +44,9 @@ class HTMLSanitizer:
         self,
         allowed_tags: List[str],
         allowed_attributes: Dict[str, List[str]],
-        allowed_styles: List[str]
+        allowed_styles: List[str],
+        engine: Optional[str] = None,
+        policy: Optional[SanitizerPolicy] = None
     ):
         """
         Initialize HTML sanitizer
@@ -27,13 +55,26 @@ class HTMLSanitizer:
             allowed_tags: List of allowed HTML tags
             allowed_attributes: Dict of allowed attributes per tag
             allowed_styles: List of allowed CSS properties
+            engine: "bleach" or "lxml"; defaults to settings.SANITIZER_ENGINE
+            policy: Compiled policy to use instead of looking one up for
+                the three whitelists
         """
-        self.allowed_tags = allowed_tags
-        self.allowed_attributes = allowed_attributes
-        self.allowed_styles = allowed_styles
+        self.policy = policy or get_policy(allowed_tags, allowed_attributes, allowed_styles)
+        
+        # Normalized whitelists (sorted, lowercased)
+        self.allowed_tags = self.policy.allowed_tags
+        self.allowed_attributes = self.policy.allowed_attributes
+        self.allowed_styles = self.policy.allowed_styles
+        self.engine = engine or settings.SANITIZER_ENGINE
         
         # Ensure pagebreak comments are preserved
         self.pagebreak_marker = settings.PAGEBREAK_MARKER
+        # Whitespace runs and marker runs are each matched once: both
+        # alternatives end in greedy repeats with nothing after them, so the
+        # first attempt at a run takes all of it and nothing is retried from
+        # inside it. (Possessive quantifiers would need Python 3.11.)
+        marker = re.escape(self.pagebreak_marker)
+        self._cleanup_pattern = re.compile(rf'\s+(?:{marker}\s*)*|(?:{marker}\s*)+')
     
     def sanitize(self, html: str) -> str:
         """
@@ -41,7 +82,7 @@ class HTMLSanitizer:
         
         Args:
             html: Raw HTML content
-            
+        
         Returns:
             Sanitized HTML
         """
@@ -49,141 +90,215 @@ class HTMLSanitizer:
             return ""
         
         try:
-            # Step 1: Preserve pagebreak markers by replacing with temporary placeholder
-            pagebreak_placeholder = "___PAGEBREAK_PLACEHOLDER___"
-            html_with_placeholders = html.replace(self.pagebreak_marker, pagebreak_placeholder)
-            
-            # Step 2: Clean with bleach
-            cleaned_html = bleach.clean(
-                html_with_placeholders,
-                tags=self.allowed_tags,
-                attributes=self.allowed_attributes,
-                strip=True,
-                strip_comments=False  # Preserve comments for now
-            )
-            
-            # Step 3: Process styles
-            cleaned_html = self._sanitize_styles(cleaned_html)
-            
-            # Step 4: Additional cleaning with BeautifulSoup
-            soup = BeautifulSoup(cleaned_html, 'html.parser')
-            
-            # Remove empty paragraphs and divs (but preserve those with pagebreak placeholders)
-            for tag in soup.find_all(['p', 'div']):
-                if not tag.text.strip() and pagebreak_placeholder not in str(tag) and not tag.find_all():
-                    tag.decompose()
-            
-            # Clean up excessive whitespace
-            cleaned_html = str(soup)
-            
-            # Step 5: Restore pagebreak markers
-            cleaned_html = cleaned_html.replace(pagebreak_placeholder, self.pagebreak_marker)
+            if self.engine == 'lxml':
+                cleaned_html = self._sanitize_tree(html)
+            else:
+                cleaned_html = self._sanitize_bleach(html)
             
-            # Step 6: Final cleanup
+            # Final cleanup
             cleaned_html = self._final_cleanup(cleaned_html)
             
             logger.info("HTML sanitization completed successfully")
             return cleaned_html
-            
+        
         except Exception as e:
             logger.error(f"Error sanitizing HTML: {e}", exc_info=True)
             # Return original HTML if sanitization fails
             return html
     
-    def _sanitize_styles(self, html: str) -> str:
-        """Sanitize inline styles to only allow permitted CSS properties"""
-        if not self.allowed_styles:
-            # Remove all style attributes
-            return re.sub(r'\s*style\s*=\s*["\'][^"\']*["\']', '', html)
-        
-        def clean_style_attr(match):
-            """Clean individual style attribute"""
-            style_content = match.group(1)
-            cleaned_rules = []
+    def _sanitize_bleach(self, html: str) -> str:
+        """Sanitize with bleach and a BeautifulSoup pass"""
+        # Step 1: Preserve pagebreak markers by replacing with temporary placeholder
+        pagebreak_placeholder = "___PAGEBREAK_PLACEHOLDER___"
+        html_with_placeholders = html.replace(self.pagebreak_marker, pagebreak_placeholder)
+        
+        # Step 2: Clean with bleach (styles are filtered by the policy's
+        # css_sanitizer while bleach still holds the parsed attribute, and
+        # emptied unless SANITIZER_INLINE_STYLES is on)
+        cleaned_html = self.policy.bleach_cleaner().clean(html_with_placeholders)
+        
+        # Step 3: Additional cleaning with BeautifulSoup
+        soup = BeautifulSoup(cleaned_html, 'html.parser')
+        
+        # Drop style attributes with no declarations left
+        for tag in soup.find_all(style=True):
+            if not tag['style']:
+                del tag['style']
+        
+        # Remove empty paragraphs and divs (pagebreak placeholders are text,
+        # so blocks holding one are kept)
+        self._prune_empty(soup)
+        
+        # Clean up excessive whitespace
+        cleaned_html = str(soup)
+        
+        # Step 4: Restore pagebreak markers
+        return cleaned_html.replace(pagebreak_placeholder, self.pagebreak_marker)
+    
+    @staticmethod
+    def _prune_empty(soup: BeautifulSoup):
+        """
+        Remove p/div elements without text or child elements, bottom-up
+        
+        One post-order pass: each element records whether it has
+        non-blank text or a child element left, so a div holding only
+        empty paragraphs is removed along with them.
+        """
+        # Frames of [tag, next child index, has text or child elements]
+        stack = [[soup, 0, False]]
+        while stack:
+            frame = stack[-1]
+            tag, index, has_content = frame
+            if index < len(tag.contents):
+                frame[1] += 1
+                child = tag.contents[index]
+                if isinstance(child, Tag):
+                    stack.append([child, 0, False])
+                elif not has_content and not isinstance(child, PreformattedString) and child.strip():
+                    frame[2] = True
+                continue
             
-            # Parse CSS rules
-            for rule in style_content.split(';'):
-                rule = rule.strip()
-                if ':' in rule:
-                    prop, value = rule.split(':', 1)
-                    prop = prop.strip().lower()
-                    value = value.strip()
-                    
-                    # Check if property is allowed
-                    if prop in self.allowed_styles:
-                        # Additional validation for specific properties
-                        if self._validate_css_value(prop, value):
-                            cleaned_rules.append(f"{prop}: {value}")
+            stack.pop()
+            if not stack:
+                break
+            parent_frame = stack[-1]
             
-            if cleaned_rules:
-                return f' style="{"; ".join(cleaned_rules)}"'
-            return ''
-        
-        # Process all style attributes
-        html = re.sub(
-            r'\s*style\s*=\s*["\']([^"\']*)["\']',
-            clean_style_attr,
-            html,
-            flags=re.IGNORECASE
-        )
-        
-        return html
+            if not has_content and tag.name in PRUNABLE_TAGS:
+                # The tag is the child just visited; removing it shifts the rest
+                parent_frame[1] -= 1
+                if EXTRACT_TAKES_INDEX:
+                    tag.extract(_self_index=parent_frame[1])
+                tag.decompose()
+            else:
+                parent_frame[2] = True
     
-    def _validate_css_value(self, property_name: str, value: str) -> bool:
+    def _sanitize_tree(self, html: str) -> str:
         """
-        Validate CSS property value for safety
+        Sanitize in one post-order walk over an lxml parse
         
-        Args:
-            property_name: CSS property name
-            value: CSS property value
-            
-        Returns:
-            True if value is safe
+        Applies the same policy as the bleach engine: disallowed tags are
+        stripped (keeping their content), attributes, URI protocols and
+        styles are whitelisted, comments (and so pagebreak markers) are kept,
+        and p/div elements left without text, child elements or a pagebreak
+        marker are removed bottom-up.
         """
-        # Remove dangerous values
-        dangerous_patterns = [
-            r'javascript:',
-            r'expression\s*\(',
-            r'@import',
-            r'url\s*\(',
-            r'behavior:',
-            r'-moz-binding',
-        ]
-        
-        value_lower = value.lower()
-        for pattern in dangerous_patterns:
-            if re.search(pattern, value_lower):
+        # huge_tree lifts libxml2's nesting limit, which would drop content
+        parser = lxml_html.HTMLParser(huge_tree=True)
+        root = lxml_html.fragment_fromstring(html, create_parent='div', parser=parser)
+        allowed_tags = self.policy.tags
+        
+        # Frames of [element, remaining children, has child elements]
+        stack = [[root, iter(list(root)), False]]
+        while stack:
+            frame = stack[-1]
+            child = next(frame[1], None)
+            if child is not None:
+                if isinstance(child.tag, str):
+                    stack.append([child, iter(list(child)), False])
+                continue
+            
+            stack.pop()
+            element, _, has_elements = frame
+            if not stack:
+                break
+            parent_frame = stack[-1]
+            
+            if element.tag not in allowed_tags:
+                # Strip the tag; its (already sanitized) content moves up.
+                # Like bleach, a stripped block starts a new line
+                if element.tag in HTML_TAGS_BLOCK_LEVEL and not self._at_start(element, root):
+                    element.text = '\n' + (element.text or '')
+                parent_frame[2] = parent_frame[2] or has_elements
+                element.drop_tag()
+                continue
+            
+            self._sanitize_attributes(element)
+            
+            if element.tag in PRUNABLE_TAGS and not has_elements and self._is_empty(element):
+                element.drop_tree()
+            else:
+                parent_frame[2] = True
+        
+        parts = [escape(root.text, quote=False)] if root.text else []
+        for child in root:
+            parts.append(etree.tostring(child, encoding='unicode', method='html', with_tail=True))
+        return ''.join(parts)
+    
+    def _sanitize_attributes(self, element):
+        """Drop attributes, URIs and styles not allowed on an element"""
+        policy = self.policy
+        
+        for name, value in list(element.attrib.items()):
+            if not policy.allows_attribute(element.tag, name):
+                del element.attrib[name]
+            elif name in URI_ATTRIBUTES and not self._is_safe_uri(value):
+                del element.attrib[name]
+            elif name == 'style':
+                style = policy.sanitize_style(value)
+                if style:
+                    element.set('style', style)
+                else:
+                    del element.attrib['style']
+    
+    @staticmethod
+    def _at_start(element, root) -> bool:
+        """Whether nothing precedes an element in the document"""
+        while element is not root:
+            parent = element.getparent()
+            if element.getprevious() is not None or parent.text:
                 return False
+            element = parent
+        return True
+    
+    def _is_empty(self, element) -> bool:
+        """Whether an element without child elements has no text or pagebreak marker"""
+        if element.text and element.text.strip():
+            return False
         
-        # Additional validation for specific properties
-        if property_name in ['width', 'height', 'margin', 'padding']:
-            # Allow only safe units
-            safe_units = r'^-?\d+(\.\d+)?(px|em|rem|%|pt|cm|mm|in|vh|vw)?$'
-            if not re.match(safe_units, value):
+        for child in element:
+            # Only comments are left at this point
+            if f'<!--{child.text}-->' == self.pagebreak_marker:
+                return False
+            if child.tail and child.tail.strip():
                 return False
         
         return True
     
+    def _is_safe_uri(self, value: str) -> bool:
+        """Whether a URI attribute value uses an allowed protocol (as bleach)"""
+        normalized = URI_IGNORED_CHARACTERS.sub('', value).lower()
+        try:
+            scheme = urlparse(normalized).scheme
+        except ValueError:
+            return False
+        
+        if scheme:
+            return scheme in ALLOWED_PROTOCOLS
+        if normalized.startswith('#'):
+            return True
+        if ':' in normalized and normalized.split(':')[0] in ALLOWED_PROTOCOLS:
+            return True
+        # Relative URIs are treated as http
+        return True
+    
     def _final_cleanup(self, html: str) -> str:
-        """Perform final cleanup on HTML"""
-        # Remove excessive newlines
-        html = re.sub(r'\n\s*\n+', '\n\n', html)
-        
-        # Remove trailing whitespace
-        html = '\n'.join(line.rstrip() for line in html.split('\n'))
-        
-        # Ensure proper spacing around pagebreaks
-        html = re.sub(
-            rf'({re.escape(self.pagebreak_marker)})',
-            r'\n\1\n',
-            html
-        )
-        
-        # Remove duplicate pagebreaks
-        html = re.sub(
-            rf'({re.escape(self.pagebreak_marker)}\s*){{2,}}',
-            self.pagebreak_marker + '\n',
-            html
-        )
-        
-        return html.strip()
\ No newline at end of file
+        """
+        Perform final cleanup on HTML in a single scan
+        
+        Each run of pagebreak markers (and the whitespace around it) becomes
+        one marker on its own line; other whitespace containing newlines
+        loses the spaces before its first newline and is capped at one
+        blank line, keeping the indentation after its last newline.
+        """
+        def replace(match):
+            text = match.group()
+            if self.pagebreak_marker in text:
+                return f'\n{self.pagebreak_marker}\n'
+            
+            newlines = text.count('\n')
+            if not newlines:
+                return text
+            indent = text[text.rfind('\n') + 1:]
+            return ('\n\n' if newlines > 1 else '\n') + indent
+        
+        return self._cleanup_pattern.sub(replace, html).strip()
@@ -0,0 +1,205 @@
+"""Compiled sanitizer policies, shared across requests"""
+import html
+import logging
+import re
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Tuple
+
+import bleach
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Values that are never allowed in a style declaration (matched lowercased)
+DANGEROUS_CSS_VALUE = re.compile(
+    r'javascript:|expression\s*\(|@import|url\s*\(|behavior:|-moz-binding'
+)
+
+# Properties restricted to a plain length
+LENGTH_PROPERTIES = frozenset(['width', 'height', 'margin', 'padding'])
+SAFE_LENGTH = re.compile(r'-?\d+(\.\d+)?(px|em|rem|%|pt|cm|mm|in|vh|vw)?')
+
+# Validated declarations remembered per policy before the memo is reset
+STYLE_MEMO_MAX_ENTRIES = 4096
+
+
+class _PolicyCSSSanitizer:
+    """Filter style values inside bleach with the policy's declaration rules
+    
+    bleach hands over the attribute value with its character references
+    still escaped and serializes the result itself, so quotes in a style
+    value cannot break out of the attribute.
+    """
+    
+    def __init__(self, policy: "SanitizerPolicy"):
+        self.policy = policy
+    
+    def sanitize_css(self, style: str) -> str:
+        return self.policy.sanitize_style(html.unescape(style))
+
+
+class SanitizerPolicy:
+    """Allowed tags, attributes and styles, compiled for fast lookups
+    
+    Policies are immutable apart from their memo of validated style
+    declarations; obtain them through get_policy so identical whitelists
+    share one instance.
+    """
+    
+    def __init__(
+        self,
+        allowed_tags: Iterable[str],
+        allowed_attributes: Dict[str, Iterable[str]],
+        allowed_styles: Iterable[str]
+    ):
+        """
+        Initialize sanitizer policy
+        
+        Args:
+            allowed_tags: Allowed HTML tags
+            allowed_attributes: Allowed attributes per tag ('*' for all tags)
+            allowed_styles: Allowed CSS properties
+        """
+        self.tags = frozenset(allowed_tags)
+        self.attributes = {tag: frozenset(attrs) for tag, attrs in allowed_attributes.items()}
+        self.styles = frozenset(allowed_styles)
+        self.global_attributes = self.attributes.get('*', frozenset())
+        
+        # Plain (sorted) forms for cache keys, metadata and worker processes
+        self.allowed_tags: List[str] = sorted(self.tags)
+        self.allowed_attributes: Dict[str, List[str]] = {
+            tag: sorted(attrs) for tag, attrs in self.attributes.items()
+        }
+        self.allowed_styles: List[str] = sorted(self.styles)
+        
+        self._declarations: Dict[Tuple[str, str], bool] = {}
+        self._cleaners = threading.local()
+    
+    def allows_attribute(self, tag: str, name: str) -> bool:
+        """Whether an attribute is allowed on a tag"""
+        return name in self.global_attributes or name in self.attributes.get(tag, ())
+    
+    def bleach_cleaner(self) -> bleach.Cleaner:
+        """bleach Cleaner for this policy (one per thread; they are not thread-safe)"""
+        cleaner = getattr(self._cleaners, 'cleaner', None)
+        if cleaner is None:
+            cleaner = bleach.Cleaner(
+                tags=self.tags,
+                attributes=self.attributes,
+                strip=True,
+                strip_comments=False,  # Preserve comments for now
+                css_sanitizer=_PolicyCSSSanitizer(self)
+            )
+            self._cleaners.cleaner = cleaner
+        return cleaner
+    
+    def sanitize_style(self, style_content: str) -> str:
+        """
+        Value to keep for a style attribute ('' drops the attribute)
+        
+        Inline styles are dropped entirely unless SANITIZER_INLINE_STYLES
+        is enabled, in which case the allowed, safe declarations are kept.
+        """
+        if not settings.SANITIZER_INLINE_STYLES or not self.styles:
+            return ''
+        return self.clean_style(style_content)
+    
+    def clean_style(self, style_content: str) -> str:
+        """Keep only the allowed, safe declarations of a style attribute value"""
+        cleaned_rules = []
+        
+        # Parse CSS rules
+        for rule in style_content.split(';'):
+            rule = rule.strip()
+            if ':' in rule:
+                prop, value = rule.split(':', 1)
+                prop = prop.strip().lower()
+                value = value.strip()
+                
+                # Check if property is allowed
+                if prop in self.styles and self.validate_css_value(prop, value):
+                    cleaned_rules.append(f"{prop}: {value}")
+        
+        return "; ".join(cleaned_rules)
+    
+    def validate_css_value(self, property_name: str, value: str) -> bool:
+        """
+        Validate CSS property value for safety
+        
+        Args:
+            property_name: CSS property name
+            value: CSS property value
+        
+        Returns:
+            True if value is safe
+        """
+        key = (property_name, value)
+        valid = self._declarations.get(key)
+        if valid is None:
+            valid = not DANGEROUS_CSS_VALUE.search(value.lower()) and (
+                property_name not in LENGTH_PROPERTIES or SAFE_LENGTH.fullmatch(value) is not None
+            )
+            if len(self._declarations) >= STYLE_MEMO_MAX_ENTRIES:
+                self._declarations.clear()
+            self._declarations[key] = valid
+        return valid
+
+
+def normalize_policy(
+    allowed_tags: Iterable[str],
+    allowed_attributes: Dict[str, Iterable[str]],
+    allowed_styles: Iterable[str]
+) -> tuple:
+    """Hashable form of a whitelist; equal for the same sets in any order or case"""
+    def names(values: Iterable[str]) -> Tuple[str, ...]:
+        return tuple(sorted({value.strip().lower() for value in values if value and value.strip()}))
+    
+    return (
+        names(allowed_tags),
+        tuple(sorted((tag.strip().lower(), names(attrs)) for tag, attrs in allowed_attributes.items())),
+        names(allowed_styles)
+    )
+
+
+_policies: "OrderedDict[tuple, SanitizerPolicy]" = OrderedDict()
+_policies_lock = threading.Lock()
+
+
+def get_policy(
+    allowed_tags: Iterable[str],
+    allowed_attributes: Dict[str, Iterable[str]],
+    allowed_styles: Iterable[str]
+) -> SanitizerPolicy:
+    """
+    Return the compiled policy for a whitelist, compiling it on first use
+    
+    Policies are kept in an LRU of SANITIZER_POLICY_CACHE_SIZE entries keyed
+    by the normalized whitelist, so the usual editor whitelist is compiled
+    once per process.
+    
+    Args:
+        allowed_tags: Allowed HTML tags
+        allowed_attributes: Allowed attributes per tag ('*' for all tags)
+        allowed_styles: Allowed CSS properties
+    
+    Returns:
+        Shared SanitizerPolicy
+    """
+    key = normalize_policy(allowed_tags, allowed_attributes, allowed_styles)
+    
+    with _policies_lock:
+        policy = _policies.get(key)
+        if policy is not None:
+            _policies.move_to_end(key)
+            return policy
+        
+        tags, attributes, styles = key
+        policy = SanitizerPolicy(tags, dict(attributes), styles)
+        _policies[key] = policy
+        while len(_policies) > max(settings.SANITIZER_POLICY_CACHE_SIZE, 1):
+            _policies.popitem(last=False)
+    
+    logger.debug(f"Compiled sanitizer policy with {len(tags)} tags")
+    return policy
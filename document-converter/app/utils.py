@@ -1,11 +1,16 @@
 """Utility functions for document conversion service"""
+import asyncio
 import os
 import shutil
 import hashlib
+import io
 import mimetypes
 from pathlib import Path
-from typing import Optional, Tuple
+from typing import BinaryIO, Optional, Tuple, Union
 import uuid
+import zipfile
+
+import aiofiles
 
 from app.config import settings
 
@@ -16,6 +21,7 @@ def setup_directories():
         settings.UPLOAD_DIR,
         settings.MEDIA_DIR,
         settings.TEMP_DIR,
+        settings.CACHE_DIR,
         Path(settings.PUBLIC_MEDIA_PATH)
     ]
     
@@ -53,6 +59,108 @@ def save_temp_file(content: bytes, filename: str) -> Path:
     return temp_path
 
 
+def _file_size_error() -> ValueError:
+    return ValueError(f"File size exceeds maximum limit of {settings.MAX_FILE_SIZE // 1024 // 1024}MB")
+
+
+async def hash_upload(upload) -> Tuple[BinaryIO, int, str]:
+    """
+    Hash an upload Starlette has already received, without copying it
+    
+    Starlette spools the multipart body into its own seekable temp file
+    before the handler runs, so the document can be parsed from that file
+    directly for as long as the request lasts. It is hashed in chunks in
+    a worker thread and rewound.
+    
+    Args:
+        upload: UploadFile backed by Starlette's SpooledTemporaryFile
+        
+    Returns:
+        Tuple of (upload.file, size_in_bytes, sha256_hexdigest)
+    """
+    if upload.size is not None and upload.size > settings.MAX_FILE_SIZE:
+        raise _file_size_error()
+    
+    def digest_file() -> Tuple[int, str]:
+        file = upload.file
+        file.seek(0)
+        digest = hashlib.sha256()
+        size = 0
+        while True:
+            chunk = file.read(settings.UPLOAD_CHUNK_SIZE)
+            if not chunk:
+                break
+            size += len(chunk)
+            if size > settings.MAX_FILE_SIZE:
+                raise _file_size_error()
+            digest.update(chunk)
+        file.seek(0)
+        return size, digest.hexdigest()
+    
+    size, content_hash = await asyncio.to_thread(digest_file)
+    return upload.file, size, content_hash
+
+
+async def spool_upload(upload, filename: str) -> Tuple[Union[Path, io.BytesIO], int, str]:
+    """
+    Copy an upload into memory or a temporary file in chunks
+    
+    Used when the document must outlive the request (queued jobs) or the
+    upload is not a cheaply seekable file (archive members). The upload
+    is hashed while it is read and rejected as soon as it exceeds
+    MAX_FILE_SIZE, so memory use is bounded by UPLOAD_CHUNK_SIZE for large
+    files. Uploads up to IN_MEMORY_MAX_SIZE stay in a BytesIO buffer and
+    never touch the disk.
+    
+    Args:
+        upload: Object with an async read(size) method (e.g. UploadFile)
+        filename: Original filename, used for the temp file name
+        
+    Returns:
+        Tuple of (buffer_or_temp_path, size_in_bytes, sha256_hexdigest)
+    """
+    buffer = io.BytesIO()
+    temp_path = None
+    out = None
+    digest = hashlib.sha256()
+    size = 0
+    
+    try:
+        while True:
+            chunk = await upload.read(settings.UPLOAD_CHUNK_SIZE)
+            if not chunk:
+                break
+            size += len(chunk)
+            if size > settings.MAX_FILE_SIZE:
+                raise _file_size_error()
+            digest.update(chunk)
+            
+            if out is None and size > settings.IN_MEMORY_MAX_SIZE:
+                # Roll over to disk, flushing what was buffered so far
+                temp_path = settings.TEMP_DIR / generate_unique_filename(filename, "temp")
+                out = await aiofiles.open(temp_path, 'wb')
+                await out.write(buffer.getbuffer())
+                buffer = None
+                await out.write(chunk)
+            elif out is not None:
+                await out.write(chunk)
+            else:
+                buffer.write(chunk)
+    except BaseException:
+        if out is not None:
+            await out.close()
+        if temp_path:
+            cleanup_temp_file(temp_path)
+        raise
+    
+    if out is not None:
+        await out.close()
+        return temp_path, size, digest.hexdigest()
+    
+    buffer.seek(0)
+    return buffer, size, digest.hexdigest()
+
+
 def cleanup_temp_file(file_path: Path):
     """Remove temporary file if it exists"""
     try:
@@ -67,6 +175,34 @@ def calculate_file_hash(content: bytes) -> str:
     return hashlib.sha256(content).hexdigest()
 
 
+def count_embedded_images(source) -> int:
+    """
+    Count images packaged in a DOCX/ODT without decompressing anything
+    
+    Only the zip central directory is read. Non-zip documents (.doc, .rtf)
+    report 0. File objects are rewound to where they were.
+    
+    Args:
+        source: Path, or seekable binary file object
+        
+    Returns:
+        Number of image entries under word/media/ or Pictures/
+    """
+    position = None if isinstance(source, (str, Path)) else source.tell()
+    try:
+        with zipfile.ZipFile(source) as package:
+            return sum(
+                1 for name in package.namelist()
+                if name.startswith(('word/media/', 'Pictures/'))
+                and get_file_extension(name) in settings.SUPPORTED_IMAGE_FORMATS
+            )
+    except (zipfile.BadZipFile, OSError):
+        return 0
+    finally:
+        if position is not None:
+            source.seek(position)
+
+
 def get_mime_type(file_path: Path) -> Optional[str]:
     """Get MIME type of file"""
     mime_type, _ = mimetypes.guess_type(str(file_path))
@@ -3,18 +3,24 @@ Document Conversion Microservice
 Converts Word/LibreOffice documents to HTML with style preservation
 """
 import os
+import json
 import logging
 from pathlib import Path
+from typing import List, Optional
 from contextlib import asynccontextmanager
 
-from fastapi import FastAPI, UploadFile, File, HTTPException, Form
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, UploadFile, File, HTTPException, Form, Request
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 import uvicorn
 
 from app.config import settings
-from app.converters import DocumentConverter
-from app.utils import setup_directories
+from app.converters import DocumentConverter, get_engine
+from app.cache import conversion_cache
+from app.pagination import get_page, paginate_result
+from app.jobs import job_manager, JobQueueFull
+from app.admission import admission, AdmissionRejected
+from app.utils import setup_directories, get_file_extension
 
 # Configure logging
 logging.basicConfig(
@@ -23,6 +29,9 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Room for multipart boundaries, part headers and form fields next to a file
+MULTIPART_OVERHEAD = 64 * 1024
+
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -30,9 +39,15 @@ async def lifespan(app: FastAPI):
     # Startup
     logger.info("Starting Document Conversion Service")
     setup_directories()
+    engine = get_engine()
+    logger.info(f"Starting {settings.CONVERSION_ENGINE} conversion engine")
+    engine.start()
+    await job_manager.start()
     yield
     # Shutdown
     logger.info("Shutting down Document Conversion Service")
+    await job_manager.stop()
+    engine.shutdown()
 
 
 app = FastAPI(
@@ -52,17 +67,57 @@ app.add_middleware(
 )
 
 
+def upload_size_limit(path: str) -> Optional[int]:
+    """Largest request body an upload endpoint can accept, or None"""
+    if path in ("/convert", "/jobs"):
+        return settings.MAX_FILE_SIZE + MULTIPART_OVERHEAD
+    if path == "/convert/batch":
+        return settings.BATCH_MAX_FILES * (settings.MAX_FILE_SIZE + MULTIPART_OVERHEAD)
+    return None
+
+
+@app.middleware("http")
+async def reject_oversized_uploads(request: Request, call_next):
+    """
+    Reject uploads that declare a body too large before it is read
+    
+    Form parsing spools the whole body to disk before an endpoint runs, so
+    this is the only point where an oversized Content-Length can be turned
+    away cheaply. Bodies without one (chunked) are checked after spooling.
+    """
+    limit = upload_size_limit(request.url.path) if request.method == "POST" else None
+    if limit is not None:
+        try:
+            declared = int(request.headers.get("content-length", ""))
+        except ValueError:
+            declared = None
+        if declared is not None and declared > limit:
+            logger.warning(f"Rejected {request.url.path} upload of {declared} bytes")
+            return JSONResponse(
+                status_code=413,
+                content={"detail": f"File size exceeds maximum limit of {settings.MAX_FILE_SIZE // 1024 // 1024}MB"}
+            )
+    return await call_next(request)
+
+
 @app.get("/")
 async def root():
     """Health check endpoint"""
-    return {"status": "healthy", "service": "Document Conversion Service"}
+    return {
+        "status": "healthy",
+        "service": "Document Conversion Service",
+        "cache": conversion_cache.stats(),
+        "jobs": job_manager.stats(),
+        "conversions": admission.stats()
+    }
 
 
 @app.post("/convert")
 async def convert_document(
     file: UploadFile = File(...),
     allowed_tags: str = Form(None),
-    extract_images: bool = Form(True)
+    extract_images: bool = Form(True),
+    paginate: bool = Form(False)
 ):
     """
     Convert uploaded document to HTML
@@ -71,15 +126,22 @@ async def convert_document(
         file: The document file to convert
         allowed_tags: Comma-separated list of allowed HTML tags
         extract_images: Whether to extract and save images
+        paginate: Return only the first page; fetch the others from
+            /conversions/{conversion_id}/pages/{page}
         
     Returns:
-        JSON with converted HTML and image URLs
+        JSON with converted HTML and image URLs, or with the first page
+        when paginate is set
     """
     try:
         # Validate file type
         if not file.filename:
             raise HTTPException(status_code=400, detail="No filename provided")
             
+        # Later pages are served from the result cache
+        if paginate and not conversion_cache.enabled:
+            raise ValueError("Pagination requires the conversion cache to be enabled")
+        
         # Parse allowed tags
         allowed_tags_list = None
         if allowed_tags:
@@ -91,11 +153,22 @@ async def convert_document(
             extract_images=extract_images
         )
         
-        # Convert document
-        result = await converter.convert(file)
+        # Cache hits are served at once; conversions wait for a slot in
+        # their size lane
+        result = await converter.convert(file, admit=True)
+        
+        if paginate:
+            result = await paginate_result(result)
         
         return JSONResponse(content=result)
         
+    except AdmissionRejected as e:
+        logger.warning(str(e))
+        raise HTTPException(
+            status_code=429,
+            detail=str(e),
+            headers={"Retry-After": str(e.retry_after)}
+        )
     except ValueError as e:
         logger.error(f"Validation error: {str(e)}")
         raise HTTPException(status_code=400, detail=str(e))
@@ -104,6 +177,166 @@ async def convert_document(
         raise HTTPException(status_code=500, detail="Internal server error during conversion")
 
 
+@app.post("/convert/batch")
+async def convert_batch(
+    files: List[UploadFile] = File(...),
+    allowed_tags: str = Form(None),
+    extract_images: bool = Form(True)
+):
+    """
+    Convert many documents in one request
+    
+    Args:
+        files: The document files to convert, or a single .zip of documents
+        allowed_tags: Comma-separated list of allowed HTML tags
+        extract_images: Whether to extract and save images
+        
+    Returns:
+        JSON with a per-file result or error for every document
+    """
+    try:
+        if not files or any(not file.filename for file in files):
+            raise HTTPException(status_code=400, detail="No filename provided")
+        
+        # Parse allowed tags
+        allowed_tags_list = None
+        if allowed_tags:
+            allowed_tags_list = [tag.strip() for tag in allowed_tags.split(',')]
+        
+        converter = DocumentConverter(
+            allowed_tags=allowed_tags_list,
+            extract_images=extract_images
+        )
+        
+        # Admit the batch as a whole, then convert all documents concurrently
+        admission.check()
+        if len(files) == 1 and get_file_extension(files[0].filename) == '.zip':
+            results = await converter.convert_archive(files[0])
+        else:
+            results = await converter.convert_batch(files)
+        
+        succeeded = sum(1 for entry in results if entry['status'] == 'success')
+        return JSONResponse(content={
+            'results': results,
+            'summary': {
+                'total': len(results),
+                'succeeded': succeeded,
+                'failed': len(results) - succeeded
+            }
+        })
+        
+    except HTTPException:
+        raise
+    except AdmissionRejected as e:
+        logger.warning(str(e))
+        raise HTTPException(
+            status_code=429,
+            detail=str(e),
+            headers={"Retry-After": str(e.retry_after)}
+        )
+    except ValueError as e:
+        logger.error(f"Validation error: {str(e)}")
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Batch conversion error: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Internal server error during conversion")
+
+
+@app.post("/jobs", status_code=202)
+async def create_job(
+    file: UploadFile = File(...),
+    allowed_tags: str = Form(None),
+    extract_images: bool = Form(True)
+):
+    """
+    Queue a document for asynchronous conversion
+    
+    Args:
+        file: The document file to convert
+        allowed_tags: Comma-separated list of allowed HTML tags
+        extract_images: Whether to extract and save images
+        
+    Returns:
+        JSON with the job id and URLs for polling and progress events
+    """
+    try:
+        if not file.filename:
+            raise HTTPException(status_code=400, detail="No filename provided")
+        
+        # Parse allowed tags
+        allowed_tags_list = None
+        if allowed_tags:
+            allowed_tags_list = [tag.strip() for tag in allowed_tags.split(',')]
+        
+        converter = DocumentConverter(
+            allowed_tags=allowed_tags_list,
+            extract_images=extract_images
+        )
+        
+        # The upload is only readable during this request, so copy it now
+        document = await converter.spool(file, persist=True)
+        try:
+            job = job_manager.submit(converter, document)
+        except JobQueueFull:
+            converter.discard(document)
+            raise
+        
+        return {
+            'job_id': job.id,
+            'status': job.status,
+            'status_url': f"/jobs/{job.id}",
+            'events_url': f"/jobs/{job.id}/events"
+        }
+        
+    except HTTPException:
+        raise
+    except JobQueueFull as e:
+        logger.warning(str(e))
+        raise HTTPException(status_code=429, detail=str(e))
+    except ValueError as e:
+        logger.error(f"Validation error: {str(e)}")
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Job submission error: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Internal server error during conversion")
+
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Get status of a conversion job, including the result once completed"""
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict()
+
+
+@app.get("/jobs/{job_id}/events")
+async def stream_job_events(job_id: str):
+    """Stream progress events of a conversion job as Server-Sent Events"""
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    async def event_stream():
+        async for event in job.stream():
+            yield f"event: {event['stage']}\ndata: {json.dumps(event)}\n\n"
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@app.get("/conversions/{conversion_id}/pages/{page}")
+async def get_conversion_page(conversion_id: str, page: int):
+    """Get one page (1-based) of a cached conversion"""
+    result = await get_page(conversion_id, page)
+    if result is None:
+        raise HTTPException(status_code=404, detail="Page not found")
+    return result
+
+
 @app.get("/supported-formats")
 async def get_supported_formats():
     """Get list of supported document formats"""
@@ -0,0 +1,25 @@
+"""Shared fixtures for document conversion service tests"""
+import sys
+from pathlib import Path
+
+import pytest
+
+# Add the service directory to Python path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.config import settings
+from app.cache import conversion_cache
+
+
+@pytest.fixture(autouse=True)
+def isolated_dirs(tmp_path, monkeypatch):
+    """Point all service directories at a per-test temp dir and disable the result cache"""
+    for name in ('UPLOAD_DIR', 'MEDIA_DIR', 'TEMP_DIR', 'CACHE_DIR'):
+        directory = tmp_path / name.lower()
+        directory.mkdir()
+        monkeypatch.setattr(settings, name, directory)
+    public = tmp_path / 'public_media'
+    public.mkdir()
+    monkeypatch.setattr(settings, 'PUBLIC_MEDIA_PATH', str(public))
+    monkeypatch.setattr(conversion_cache, 'enabled', False)
+    return tmp_path
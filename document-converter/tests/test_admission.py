@@ -0,0 +1,218 @@
+"""Admission control: bounded concurrency, 429 backpressure and size lanes"""
+import asyncio
+import io
+import threading
+import zipfile
+from types import SimpleNamespace
+
+import httpx
+import pytest
+
+import main
+from app.config import settings
+from app.admission import AdmissionController, AdmissionRejected, classify, classify_document
+from app.cache import ConversionCache
+from app.parsers.docx_parser import DocxParser
+
+
+async def wait_until(condition, timeout: float = 5.0):
+    """Poll until condition() holds"""
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        assert asyncio.get_running_loop().time() < deadline, "condition not reached"
+        await asyncio.sleep(0.01)
+
+
+@pytest.fixture
+def held_parses(monkeypatch):
+    """Make parses block until the returned event is set"""
+    release = threading.Event()
+    
+    def held_parse(self, source, extract_images=True, progress=None):
+        release.wait(5)
+        return {'html': '<p>done</p>', 'images': [], 'styles': ''}
+    
+    monkeypatch.setattr(DocxParser, 'parse', held_parse)
+    yield release
+    release.set()
+
+
+def use_controller(monkeypatch, controller: AdmissionController):
+    """Admit conversions through controller instead of the shared one"""
+    for module in ('main', 'app.converters.base'):
+        monkeypatch.setattr(f'{module}.admission', controller)
+
+
+@pytest.mark.asyncio
+async def test_full_queue_is_rejected_with_429(monkeypatch, held_parses):
+    controller = AdmissionController(max_concurrent=1, max_queued=1, reserved_small=0)
+    use_controller(monkeypatch, controller)
+    
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url='http://testserver') as client:
+        def convert():
+            return asyncio.create_task(client.post('/convert', files={'file': ('a.docx', b'doc')}))
+        
+        running = convert()
+        await wait_until(lambda: controller.in_flight == 1)
+        queued = convert()
+        await wait_until(lambda: controller.queued == 1)
+        
+        health = (await client.get('/')).json()['conversions']
+        assert health['in_flight'] == 1
+        assert health['queued'] == 1
+        assert health['max_concurrent'] == 1
+        assert health['max_queued'] == 1
+        
+        rejected = await client.post('/convert', files={'file': ('a.docx', b'doc')})
+        assert rejected.status_code == 429
+        # No conversion has finished yet: 1s assumed, and one wave waits ahead
+        assert rejected.headers['Retry-After'] == '2'
+        
+        held_parses.set()
+        assert (await running).status_code == 200
+        assert (await queued).status_code == 200
+        
+        health = (await client.get('/')).json()['conversions']
+        assert health['in_flight'] == 0
+        assert health['queued'] == 0
+
+
+@pytest.mark.asyncio
+async def test_cache_hits_do_not_wait_for_a_slot(monkeypatch, tmp_path, held_parses):
+    controller = AdmissionController(max_concurrent=1, max_queued=1, reserved_small=0)
+    use_controller(monkeypatch, controller)
+    monkeypatch.setattr('app.converters.base.conversion_cache', ConversionCache(tmp_path / 'cache'))
+    
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url='http://testserver') as client:
+        def convert(content: bytes):
+            return asyncio.create_task(client.post('/convert', files={'file': ('a.docx', content)}))
+        
+        held_parses.set()
+        assert (await convert(b'cached')).json()['metadata']['cached'] is False
+        held_parses.clear()
+        
+        running = convert(b'running')
+        await wait_until(lambda: controller.in_flight == 1)
+        queued = convert(b'queued')
+        await wait_until(lambda: controller.queued == 1)
+        
+        # The queue is full, yet the cached document is served at once
+        hit = await client.post('/convert', files={'file': ('a.docx', b'cached')})
+        assert hit.status_code == 200
+        assert hit.json()['metadata']['cached'] is True
+        assert controller.stats()['in_flight'] == 1
+        assert (await client.post('/convert', files={'file': ('a.docx', b'new')})).status_code == 429
+        
+        held_parses.set()
+        assert (await running).status_code == 200
+        assert (await queued).status_code == 200
+
+
+@pytest.mark.asyncio
+async def test_retry_after_follows_conversion_time_and_queue(monkeypatch):
+    controller = AdmissionController(max_concurrent=2, max_queued=2, reserved_small=0)
+    # Swap the module's clock only; the event loop keeps the real one
+    clock = iter([100.0, 104.0])
+    monkeypatch.setattr('app.admission.time', SimpleNamespace(monotonic=lambda: next(clock)))
+    
+    async with controller.slot():
+        pass
+    assert controller.stats()['average_seconds'] == 4.0
+    assert controller.retry_after() == 4
+    
+    release = asyncio.Event()
+    
+    async def hold():
+        async with controller.slot(reject=False):
+            await release.wait()
+    
+    monkeypatch.setattr('app.admission.time', SimpleNamespace(monotonic=lambda: 200.0))
+    holders = [asyncio.create_task(hold()) for _ in range(4)]
+    await wait_until(lambda: controller.in_flight == 2 and controller.queued == 2)
+    
+    # Two queued ahead plus this request make two waves of two slots
+    assert controller.retry_after() == 8
+    with pytest.raises(AdmissionRejected) as rejected:
+        controller.check()
+    assert rejected.value.retry_after == 8
+    
+    release.set()
+    await asyncio.gather(*holders)
+    controller.check()
+
+
+@pytest.mark.asyncio
+async def test_large_documents_never_take_reserved_slots():
+    controller = AdmissionController(max_concurrent=3, max_queued=10, reserved_small=1)
+    releases = {}
+    
+    def start(name: str, lane: str) -> asyncio.Task:
+        releases[name] = asyncio.Event()
+        
+        async def hold():
+            async with controller.slot(lane):
+                await releases[name].wait()
+        
+        return asyncio.create_task(hold())
+    
+    def lane(name: str) -> dict:
+        return controller.stats()['lanes'][name]
+    
+    tasks = [start(f'large-{index}', 'large') for index in range(3)]
+    await wait_until(lambda: lane('large') == {'in_flight': 2, 'queued': 1})
+    
+    # The free slot is held back for small documents...
+    await asyncio.sleep(0.05)
+    assert lane('large') == {'in_flight': 2, 'queued': 1}
+    
+    tasks.append(start('small', 'small'))
+    await wait_until(lambda: lane('small')['in_flight'] == 1)
+    
+    # ...and is not handed to the waiting large document when it frees up
+    releases['small'].set()
+    await wait_until(lambda: lane('small')['in_flight'] == 0)
+    await asyncio.sleep(0.05)
+    assert lane('large') == {'in_flight': 2, 'queued': 1}
+    
+    # Only a large slot freeing up lets it start
+    releases['large-0'].set()
+    await wait_until(lambda: lane('large') == {'in_flight': 2, 'queued': 0})
+    
+    for release in releases.values():
+        release.set()
+    await asyncio.gather(*tasks)
+
+
+def test_reserved_slots_leave_room_for_large_documents():
+    assert AdmissionController(max_concurrent=2, reserved_small=5).reserved_small == 1
+    assert AdmissionController(max_concurrent=1, reserved_small=1).reserved_small == 0
+
+
+@pytest.mark.parametrize('size, images, expected', [
+    (1000, 0, 'small'),
+    (settings.SMALL_DOCUMENT_MAX_SIZE, settings.SMALL_DOCUMENT_MAX_IMAGES, 'small'),
+    (settings.SMALL_DOCUMENT_MAX_SIZE + 1, 0, 'large'),
+    (1000, settings.SMALL_DOCUMENT_MAX_IMAGES + 1, 'large'),
+])
+def test_classify(size, images, expected):
+    assert classify(size, images) == expected
+
+
+@pytest.mark.asyncio
+async def test_classify_document_counts_packaged_images():
+    def docx(images: int) -> io.BytesIO:
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, 'w') as package:
+            package.writestr('word/document.xml', '<w:document/>')
+            for index in range(images):
+                package.writestr(f'word/media/image{index}.png', b'png')
+        buffer.seek(0)
+        return buffer
+    
+    few, many = docx(settings.SMALL_DOCUMENT_MAX_IMAGES), docx(settings.SMALL_DOCUMENT_MAX_IMAGES + 1)
+    
+    assert await classify_document({'source': few, 'size': 1000}) == 'small'
+    assert await classify_document({'source': many, 'size': 1000}) == 'large'
+    assert few.tell() == 0
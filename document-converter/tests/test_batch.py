@@ -0,0 +1,140 @@
+"""Batch conversion of several uploads or one zip archive"""
+import io
+import zipfile
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from app.config import settings
+from app.parsers import DocxParser, OdtParser
+
+OUTCOMES = {
+    b'bad': ValueError("Corrupt document"),
+    b'boom': RuntimeError("parser crashed"),
+}
+
+
+def read_source(source) -> bytes:
+    if isinstance(source, (str, Path)):
+        return Path(source).read_bytes()
+    if hasattr(source, 'read'):
+        source.seek(0)
+        return source.read()
+    return bytes(source)
+
+
+@pytest.fixture(autouse=True)
+def fake_parsers(monkeypatch):
+    """Parse documents to their content, or raise the error it names"""
+    def fake_parse(self, source, extract_images=True, progress=None):
+        content = read_source(source)
+        if content in OUTCOMES:
+            raise OUTCOMES[content]
+        return {'html': f'<p>{content.decode()}</p>', 'images': [], 'styles': ''}
+    
+    monkeypatch.setattr(DocxParser, 'parse', fake_parse)
+    monkeypatch.setattr(OdtParser, 'parse', fake_parse)
+
+
+@pytest.fixture
+def client():
+    return TestClient(main.app)
+
+
+def make_zip(members: dict) -> bytes:
+    """Zip of name -> content (None for a directory entry)"""
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as archive:
+        for name, content in members.items():
+            if content is None:
+                archive.writestr(zipfile.ZipInfo(name), b'')
+            else:
+                archive.writestr(name, content)
+    return buffer.getvalue()
+
+
+def test_per_file_errors_do_not_fail_the_batch(client):
+    response = client.post('/convert/batch', files=[
+        ('files', ('a.docx', b'first')),
+        ('files', ('b.docx', b'bad')),
+        ('files', ('c.txt', b'text')),
+        ('files', ('d.odt', b'boom')),
+        ('files', ('e.odt', b'last')),
+    ])
+    
+    assert response.status_code == 200
+    body = response.json()
+    results = body['results']
+    assert [entry['filename'] for entry in results] == ['a.docx', 'b.docx', 'c.txt', 'd.odt', 'e.odt']
+    assert [entry['status'] for entry in results] == ['success', 'error', 'error', 'error', 'success']
+    assert results[0]['result']['html'] == '<p>first</p>'
+    assert results[4]['result']['html'] == '<p>last</p>'
+    assert results[1]['error'] == "Corrupt document"
+    assert results[2]['error'].startswith('Unsupported file format')
+    # Unexpected failures are not leaked to the client
+    assert results[3]['error'] == 'Internal server error during conversion'
+    assert body['summary'] == {'total': 5, 'succeeded': 2, 'failed': 3}
+
+
+def test_archive_members_are_converted(client):
+    archive = make_zip({'a.docx': b'first', 'docs/b.odt': b'bad'})
+    
+    body = client.post('/convert/batch', files={'files': ('docs.zip', archive)}).json()
+    
+    assert [(entry['filename'], entry['status']) for entry in body['results']] == [
+        ('a.docx', 'success'),
+        ('docs/b.odt', 'error'),
+    ]
+    assert body['summary'] == {'total': 2, 'succeeded': 1, 'failed': 1}
+
+
+def test_invalid_archive_is_rejected(client):
+    response = client.post('/convert/batch', files={'files': ('docs.zip', b'not a zip')})
+    
+    assert response.status_code == 400
+    assert response.json()['detail'] == "Invalid zip archive"
+
+
+def test_metadata_and_hidden_members_are_skipped(client):
+    archive = make_zip({
+        '__MACOSX/._a.docx': b'bad',
+        '.DS_Store': b'bad',
+        'docs/': None,
+        'docs/.~lock.b.odt#': b'bad',
+        'docs/b.odt': b'second',
+        'a.docx': b'first',
+    })
+    
+    body = client.post('/convert/batch', files={'files': ('docs.zip', archive)}).json()
+    
+    assert [entry['filename'] for entry in body['results']] == ['docs/b.odt', 'a.docx']
+    assert body['summary'] == {'total': 2, 'succeeded': 2, 'failed': 0}
+
+
+def test_file_limit_applies_to_lists(client, monkeypatch):
+    monkeypatch.setattr(settings, 'BATCH_MAX_FILES', 2)
+    
+    def upload(count: int):
+        return client.post('/convert/batch', files=[('files', (f'{index}.docx', b'x')) for index in range(count)])
+    
+    assert upload(2).json()['summary']['total'] == 2
+    rejected = upload(3)
+    assert rejected.status_code == 400
+    assert rejected.json()['detail'] == "Batch exceeds maximum of 2 files"
+
+
+def test_file_limit_applies_to_archives(client, monkeypatch):
+    monkeypatch.setattr(settings, 'BATCH_MAX_FILES', 2)
+    
+    def upload(count: int, skipped: int = 0):
+        members = {f'{index}.docx': b'x' for index in range(count)}
+        members.update({f'__MACOSX/._{index}.docx': b'x' for index in range(skipped)})
+        return client.post('/convert/batch', files={'files': ('docs.zip', make_zip(members))})
+    
+    # Skipped members do not count towards the limit
+    assert upload(2, skipped=3).json()['summary']['total'] == 2
+    rejected = upload(3)
+    assert rejected.status_code == 400
+    assert rejected.json()['detail'] == "Archive exceeds maximum of 2 files"
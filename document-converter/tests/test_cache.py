@@ -0,0 +1,206 @@
+"""Two-tier conversion result cache"""
+import json
+import os
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from app.cache import ConversionCache
+from app.config import settings
+
+OPTIONS = {
+    'extension': '.docx',
+    'allowed_tags': ['p', 'strong'],
+    'allowed_attributes': {'a': ['href']},
+    'allowed_styles': ['color'],
+    'extract_images': True,
+}
+
+
+def make_key(content_hash: str = 'a' * 64, **overrides) -> str:
+    options = {**OPTIONS, **overrides}
+    return ConversionCache.make_key(content_hash, **options)
+
+
+def make_result(html: str = '<p>converted</p>') -> dict:
+    return {'html': html, 'metadata': {'format': '.docx', 'cached': False}}
+
+
+def entry_size(result: dict) -> int:
+    return len(json.dumps(result).encode('utf-8'))
+
+
+def travel(monkeypatch, seconds: float):
+    """Make the cache (only) see the clock `seconds` in the future"""
+    now = time.time()
+    monkeypatch.setattr('app.cache.time', SimpleNamespace(time=lambda: now + seconds))
+
+
+def test_key_varies_with_document_and_options():
+    key = make_key()
+    
+    assert make_key() == key
+    assert make_key(allowed_tags=['strong', 'p']) == key
+    assert make_key(content_hash='b' * 64) != key
+    assert make_key(extension='.odt') != key
+    assert make_key(allowed_tags=['p']) != key
+    assert make_key(allowed_attributes={'a': ['href', 'title']}) != key
+    assert make_key(allowed_styles=[]) != key
+    assert make_key(extract_images=False) != key
+
+
+@pytest.mark.parametrize('name, value', [
+    ('PAGEBREAK_MARKER', '<!-- break -->'),
+    ('SANITIZER_ENGINE', 'lxml'),
+    ('SANITIZER_INLINE_STYLES', True),
+    ('ODT_STREAMING_PARSE', False),
+    ('IMAGE_MAX_DIMENSION', 1024),
+    ('IMAGE_PASSTHROUGH_MAX_BYTES', 0),
+    ('IMAGE_PASSTHROUGH_MAX_DIMENSION', 512),
+    ('IMAGE_VARIANT_WIDTHS', [480, 960]),
+    ('IMAGE_VARIANT_FORMATS', ['avif']),
+    ('IMAGE_PLACEHOLDER_SIZE', 0),
+])
+def test_key_varies_with_output_settings(monkeypatch, name, value):
+    key = make_key()
+    
+    monkeypatch.setattr(settings, name, value)
+    
+    assert make_key() != key
+
+
+def test_hit_and_miss_counters(tmp_path):
+    cache = ConversionCache(tmp_path / 'cache')
+    key = make_key()
+    
+    assert cache.get(key) is None
+    cache.set(key, make_result())
+    assert cache.get(key) == make_result()
+    
+    # A fresh instance over the same directory hits the disk tier
+    cold = ConversionCache(tmp_path / 'cache')
+    assert cold.get(key) == make_result()
+    assert cold.get(key) == make_result()
+    
+    assert cache.stats()['misses'] == 1
+    assert cache.stats()['stores'] == 1
+    assert cache.stats()['memory_hits'] == 1
+    assert cold.stats()['disk_hits'] == 1
+    assert cold.stats()['memory_hits'] == 1
+    assert cold.stats()['hit_ratio'] == 1.0
+
+
+def test_results_are_copied(tmp_path):
+    cache = ConversionCache(tmp_path / 'cache')
+    key = make_key()
+    result = make_result()
+    cache.set(key, result)
+    
+    result['html'] = 'changed'
+    cache.get(key)['metadata']['cached'] = True
+    
+    assert cache.get(key) == make_result()
+
+
+def test_disabled_cache_stores_nothing(tmp_path):
+    cache = ConversionCache(tmp_path / 'cache', enabled=False)
+    cache.set(make_key(), make_result())
+    
+    assert cache.get(make_key()) is None
+    assert not (tmp_path / 'cache').exists()
+
+
+def test_entries_expire_after_ttl(tmp_path, monkeypatch):
+    cache = ConversionCache(tmp_path / 'cache', ttl_seconds=60)
+    key = make_key()
+    cache.set(key, make_result())
+    
+    travel(monkeypatch, 30)
+    assert cache.get(key) == make_result()
+    
+    travel(monkeypatch, 120)
+    assert cache.get(key) is None
+    assert cache._entry_path(key).exists() is False
+    assert cache.stats()['memory_entries'] == 0
+
+
+def test_expired_disk_entries_are_not_served(tmp_path):
+    ConversionCache(tmp_path / 'cache', ttl_seconds=60).set(make_key(), make_result())
+    path = ConversionCache(tmp_path / 'cache')._entry_path(make_key())
+    stale = time.time() - 120
+    os.utime(path, (stale, stale))
+    
+    assert ConversionCache(tmp_path / 'cache', ttl_seconds=60).get(make_key()) is None
+    assert not path.exists()
+
+
+def test_disk_budget_evicts_oldest_entries(tmp_path):
+    result = make_result('<p>' + 'x' * 1000 + '</p>')
+    size = entry_size(result)
+    cache = ConversionCache(tmp_path / 'cache', max_memory_entries=1, max_disk_bytes=size * 3)
+    keys = [make_key(content_hash=str(index) * 64) for index in range(5)]
+    
+    for age, key in enumerate(keys):
+        cache.set(key, result)
+        # Order entries by mtime regardless of filesystem timestamp resolution
+        stamp = time.time() - 100 + age
+        os.utime(cache._entry_path(key), (stamp, stamp))
+    
+    on_disk = [key for key in keys if cache._entry_path(key).exists()]
+    assert on_disk == keys[-3:]
+    assert cache.stats()['disk_bytes'] == size * 3
+    assert cache.stats()['evictions'] >= 2
+
+
+def test_memory_tier_is_bounded_by_bytes(tmp_path):
+    small = make_result()
+    large = make_result('<p>' + 'x' * 10000 + '</p>')
+    cache = ConversionCache(
+        tmp_path / 'cache', max_memory_entries=100, max_memory_bytes=entry_size(large) + 10
+    )
+    
+    cache.set(make_key(content_hash='1' * 64), small)
+    cache.set(make_key(content_hash='2' * 64), large)
+    
+    # The large entry pushed the small one out of memory, not off disk
+    assert cache.stats()['memory_entries'] == 1
+    assert cache.stats()['memory_bytes'] == entry_size(large)
+    assert cache.get(make_key(content_hash='1' * 64)) == small
+    assert cache.stats()['disk_hits'] == 1
+
+
+def test_oversized_results_are_kept_on_disk_only(tmp_path):
+    cache = ConversionCache(tmp_path / 'cache', max_memory_bytes=10)
+    cache.set(make_key(), make_result())
+    
+    assert cache.stats()['memory_entries'] == 0
+    assert cache.get(make_key()) == make_result()
+    assert cache.stats()['disk_hits'] == 1
+
+
+@pytest.mark.asyncio
+async def test_lookup_and_store_run_in_a_thread(tmp_path, monkeypatch):
+    cache = ConversionCache(tmp_path / 'cache')
+    threads = []
+    read_disk = cache._read_disk
+    write_disk = cache._write_disk
+    
+    def recording_read(*args):
+        threads.append(threading.current_thread())
+        return read_disk(*args)
+    
+    def recording_write(*args):
+        threads.append(threading.current_thread())
+        return write_disk(*args)
+    
+    monkeypatch.setattr(cache, '_read_disk', recording_read)
+    monkeypatch.setattr(cache, '_write_disk', recording_write)
+    
+    assert await cache.lookup(make_key()) is None
+    await cache.store(make_key(), make_result())
+    assert await ConversionCache(tmp_path / 'cache').lookup(make_key()) == make_result()
+    
+    assert len(threads) == 2
+    assert threading.main_thread() not in threads
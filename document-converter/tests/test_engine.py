@@ -0,0 +1,180 @@
+"""Conversion engines: the process pool gives the same results as threads"""
+import asyncio
+import io
+import pickle
+import sys
+import tempfile
+import zipfile
+from collections import Counter
+from types import SimpleNamespace
+
+import pytest
+
+from app.config import settings
+from app.converters import ProcessPoolEngine, ThreadEngine
+from app.converters.engine import _warm_up, _worker_settings
+
+NAMESPACES = (
+    'xmlns:office="urn:oasis:names:tc:opendocument:xmlns:office:1.0" '
+    'xmlns:style="urn:oasis:names:tc:opendocument:xmlns:style:1.0" '
+    'xmlns:text="urn:oasis:names:tc:opendocument:xmlns:text:1.0" '
+    'xmlns:fo="urn:oasis:names:tc:opendocument:xmlns:xsl-fo-compatible:1.0"'
+)
+
+AUTOMATIC_STYLES = '<style:style style:name="P1"><style:text-properties fo:color="#ff0000"/></style:style>'
+
+
+def make_odt() -> bytes:
+    """A small ODT with a styled paragraph and a page break"""
+    content = (
+        f'<?xml version="1.0" encoding="UTF-8"?>'
+        f'<office:document-content {NAMESPACES}>'
+        f'<office:automatic-styles>{AUTOMATIC_STYLES}</office:automatic-styles>'
+        f'<office:body><office:text>'
+        f'<text:h text:outline-level="1">Title</text:h>'
+        f'<text:p text:style-name="P1">red</text:p>'
+        f'<text:soft-page-break/><text:p>second page</text:p>'
+        f'</office:text></office:body></office:document-content>'
+    )
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as odt:
+        odt.writestr('mimetype', 'application/vnd.oasis.opendocument.text')
+        odt.writestr('content.xml', content)
+        odt.writestr('styles.xml', f'<office:document-styles {NAMESPACES}/>')
+    return buffer.getvalue()
+
+
+SANITIZER_OPTIONS = {
+    'allowed_tags': settings.DEFAULT_ALLOWED_TAGS,
+    'allowed_attributes': settings.DEFAULT_ALLOWED_ATTRIBUTES,
+    'allowed_styles': settings.DEFAULT_ALLOWED_STYLES,
+}
+
+
+async def convert(engine, source) -> dict:
+    return await engine.run(source, '.odt', False, SANITIZER_OPTIONS)
+
+
+@pytest.fixture(scope='module')
+def process_engine():
+    engine = ProcessPoolEngine(workers=1, max_tasks_per_worker=0)
+    engine.start()
+    yield engine
+    engine.shutdown()
+
+
+def spooled(data: bytes):
+    file = tempfile.SpooledTemporaryFile(max_size=10)
+    file.write(data)
+    # Left at the end: the engine must rewind it
+    return file
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize('make_source', [
+    lambda data, path: data,
+    lambda data, path: io.BytesIO(data),
+    lambda data, path: memoryview(data),
+    lambda data, path: spooled(data),
+    lambda data, path: path,
+    lambda data, path: str(path),
+], ids=['bytes', 'buffer', 'memoryview', 'file', 'path', 'str-path'])
+async def test_process_pool_matches_threads(process_engine, tmp_path, make_source):
+    data = make_odt()
+    path = tmp_path / 'document.odt'
+    path.write_bytes(data)
+    
+    expected = await convert(ThreadEngine(), data)
+    result = await convert(process_engine, make_source(data, path))
+    
+    assert result == expected
+    assert '<h1>Title</h1>' in result['html']
+    assert settings.PAGEBREAK_MARKER in result['html']
+
+
+@pytest.mark.asyncio
+async def test_file_objects_are_read_before_pickling(process_engine):
+    # Open files cannot be pickled, so only their bytes may be sent
+    source = spooled(make_odt())
+    with pytest.raises(TypeError):
+        pickle.dumps(source)
+    
+    result = await convert(process_engine, source)
+    
+    assert 'red' in result['html']
+
+
+@pytest.mark.asyncio
+async def test_progress_is_reported_after_the_worker(process_engine):
+    events = []
+    
+    await process_engine.run(
+        make_odt(), '.odt', False, SANITIZER_OPTIONS,
+        progress=lambda stage, **details: events.append((stage, details))
+    )
+    
+    assert events == [('parsed', {'image_count': 0}), ('sanitized', {})]
+
+
+@pytest.mark.asyncio
+async def test_runtime_settings_reach_the_workers(monkeypatch):
+    monkeypatch.setattr(settings, 'SANITIZER_INLINE_STYLES', True)
+    engine = ProcessPoolEngine(workers=1, max_tasks_per_worker=0)
+    try:
+        result = await convert(engine, make_odt())
+    finally:
+        engine.shutdown()
+    
+    assert '<p style="color: #ff0000">red</p>' in result['html']
+
+
+def test_image_threads_are_shared_out_between_workers(monkeypatch):
+    monkeypatch.setattr(settings, 'IMAGE_WORKERS', 8)
+    
+    assert _worker_settings(4)['IMAGE_WORKERS'] == 2
+    assert _worker_settings(16)['IMAGE_WORKERS'] == 1
+    assert _worker_settings(4)['MAX_FILE_SIZE'] == settings.MAX_FILE_SIZE
+    assert settings.IMAGE_WORKERS == 8
+
+
+@pytest.mark.skipif(sys.version_info < (3, 11), reason='max_tasks_per_child needs Python 3.11')
+def test_each_worker_is_replaced_after_max_tasks():
+    engine = ProcessPoolEngine(workers=2, max_tasks_per_worker=2)
+    try:
+        executor = engine._get_executor()
+        pids = [executor.submit(_warm_up).result(timeout=60) for _ in range(6)]
+        assert engine._executor is executor
+    finally:
+        engine.shutdown()
+    
+    # Workers are retired one at a time, after two tasks each
+    assert max(Counter(pids).values()) <= 2
+    assert len(set(pids)) >= 3
+
+
+@pytest.mark.asyncio
+async def test_whole_pool_is_recycled_before_python_3_11(monkeypatch):
+    monkeypatch.setattr('app.converters.engine.sys', SimpleNamespace(version_info=(3, 10)))
+    engine = ProcessPoolEngine(workers=1, max_tasks_per_worker=1)
+    try:
+        await convert(engine, make_odt())
+        first = engine._executor
+        await convert(engine, make_odt())
+        assert engine._executor is not first
+    finally:
+        engine.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_shutdown_waits_for_running_conversions():
+    engine = ProcessPoolEngine(workers=1, max_tasks_per_worker=0)
+    engine.start()
+    processes = list(engine._executor._processes.values())
+    
+    running = asyncio.create_task(convert(engine, make_odt()))
+    await asyncio.sleep(0)
+    await asyncio.to_thread(engine.shutdown)
+    
+    assert 'red' in (await running)['html']
+    assert engine._executor is None
+    assert processes and not any(process.is_alive() for process in processes)
@@ -0,0 +1,99 @@
+"""The event loop must stay responsive while documents are converted"""
+import asyncio
+import time
+
+import httpx
+import pytest
+
+import main
+from app.parsers.docx_parser import DocxParser
+from app.sanitizers import HTMLSanitizer
+
+SLOW_STAGE_SECONDS = 0.5
+HEALTH_LATENCY_BOUND = 0.2
+POLL_INTERVAL = 0.05
+
+
+@pytest.mark.asyncio
+async def test_health_check_answers_during_slow_conversion(monkeypatch):
+    """A slow parse + sanitize must not stall other requests"""
+    def slow_parse(self, source, extract_images=True, progress=None):
+        time.sleep(SLOW_STAGE_SECONDS)
+        return {'html': '<p>slow</p>', 'images': [], 'styles': ''}
+    
+    def slow_sanitize(self, html):
+        time.sleep(SLOW_STAGE_SECONDS)
+        return html
+    
+    monkeypatch.setattr(DocxParser, 'parse', slow_parse)
+    monkeypatch.setattr(HTMLSanitizer, 'sanitize', slow_sanitize)
+    
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url='http://testserver') as client:
+        conversion = asyncio.create_task(client.post(
+            '/convert',
+            files={'file': ('slow.docx', b'not really a docx')}
+        ))
+        
+        # Let the conversion reach the slow stages
+        await asyncio.sleep(0.05)
+        
+        # Measure each poll including the pause before it, so a stall that
+        # happens between two health checks is counted too
+        latencies = []
+        started = time.perf_counter()
+        while not conversion.done():
+            await asyncio.sleep(POLL_INTERVAL)
+            response = await client.get('/')
+            assert response.status_code == 200
+            now = time.perf_counter()
+            latencies.append(now - started - POLL_INTERVAL)
+            started = now
+        
+        result = await conversion
+    
+    assert result.status_code == 200
+    assert result.json()['html'] == '<p>slow</p>'
+    assert len(latencies) >= 5
+    assert max(latencies) < HEALTH_LATENCY_BOUND
+
+
+@pytest.mark.asyncio
+async def test_upload_classification_runs_off_the_loop(monkeypatch):
+    """Image counting reads zip directories; it must not run on the loop
+    
+    Archive members must reach it only once spooled, since seeking in a
+    compressed member decompresses it.
+    """
+    import io
+    import threading
+    import zipfile
+    
+    from app import admission
+    
+    calls = []
+    count_embedded_images = admission.count_embedded_images
+    
+    def recording_count(source):
+        calls.append((threading.current_thread() is threading.main_thread(), type(source)))
+        return count_embedded_images(source)
+    
+    monkeypatch.setattr(admission, 'count_embedded_images', recording_count)
+    monkeypatch.setattr(DocxParser, 'parse', lambda self, source, extract_images=True, progress=None: {
+        'html': '<p>ok</p>', 'images': [], 'styles': ''
+    })
+    
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, 'w', zipfile.ZIP_DEFLATED) as zip_file:
+        zip_file.writestr('a.docx', b'not really a docx' * 1000)
+    
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url='http://testserver') as client:
+        single = await client.post('/convert', files={'file': ('a.docx', b'not really a docx')})
+        batch = await client.post('/convert/batch', files={'files': ('docs.zip', archive.getvalue())})
+    
+    assert single.status_code == 200
+    assert batch.json()['summary']['succeeded'] == 1
+    assert len(calls) == 2
+    assert not any(on_loop for on_loop, _ in calls)
+    assert zipfile.ZipExtFile not in {source_type for _, source_type in calls}
@@ -0,0 +1,166 @@
+"""Asynchronous conversion jobs: lifecycle, progress events, backpressure and expiry"""
+import asyncio
+import json
+import time
+from types import SimpleNamespace
+
+import httpx
+import pytest
+import pytest_asyncio
+
+import main
+from app.jobs import JobManager
+from app.parsers.docx_parser import DocxParser
+
+
+def make_manager(monkeypatch, **options) -> JobManager:
+    manager = JobManager(**{'workers': 1, 'max_queued': 10, 'result_ttl': 60, **options})
+    monkeypatch.setattr(main, 'job_manager', manager)
+    return manager
+
+
+@pytest_asyncio.fixture
+async def client():
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url='http://testserver') as client:
+        yield client
+
+
+@pytest.fixture
+def parse_result(monkeypatch):
+    """Parse every upload to the returned result (or raise it if an exception)"""
+    outcome = {'result': {'html': '<p>job</p>', 'images': [], 'styles': ''}}
+    
+    def fake_parse(self, source, extract_images=True, progress=None):
+        if isinstance(outcome['result'], Exception):
+            raise outcome['result']
+        return dict(outcome['result'])
+    
+    monkeypatch.setattr(DocxParser, 'parse', fake_parse)
+    return outcome
+
+
+async def submit(client, filename: str = 'a.docx') -> httpx.Response:
+    return await client.post('/jobs', files={'file': (filename, b'not really a docx')})
+
+
+async def wait_finished(client, job_id: str) -> dict:
+    for _ in range(500):
+        job = (await client.get(f'/jobs/{job_id}')).json()
+        if job['status'] in ('completed', 'failed'):
+            return job
+        await asyncio.sleep(0.01)
+    raise AssertionError(f"job {job_id} did not finish")
+
+
+def parse_events(body: str) -> list:
+    events = []
+    for block in body.strip().split('\n\n'):
+        name, data = block.split('\n')
+        assert name.startswith('event: ') and data.startswith('data: ')
+        event = json.loads(data[len('data: '):])
+        assert event['stage'] == name[len('event: '):]
+        events.append(event)
+    return events
+
+
+@pytest.mark.asyncio
+async def test_job_lifecycle(monkeypatch, client, parse_result):
+    manager = make_manager(monkeypatch)
+    await manager.start()
+    try:
+        response = await submit(client)
+        assert response.status_code == 202
+        created = response.json()
+        assert created['status'] == 'queued'
+        assert created['status_url'] == f"/jobs/{created['job_id']}"
+        assert created['events_url'] == f"/jobs/{created['job_id']}/events"
+        
+        job = await wait_finished(client, created['job_id'])
+    finally:
+        await manager.stop()
+    
+    assert job['status'] == 'completed'
+    assert job['filename'] == 'a.docx'
+    assert job['result']['html'] == '<p>job</p>'
+    assert job['finished_at'] >= job['created_at']
+    assert job['progress']['stage'] == 'completed'
+    assert manager.stats() == {'queued': 0, 'running': 0, 'completed': 1, 'failed': 0}
+
+
+@pytest.mark.asyncio
+async def test_events_end_with_completed(monkeypatch, client, parse_result):
+    manager = make_manager(monkeypatch)
+    await manager.start()
+    try:
+        job_id = (await submit(client)).json()['job_id']
+        # Subscribed while the job may still be running; the stream replays
+        # what was missed and ends after the final event
+        response = await client.get(f'/jobs/{job_id}/events')
+    finally:
+        await manager.stop()
+    
+    assert response.headers['content-type'].startswith('text/event-stream')
+    events = parse_events(response.text)
+    assert [event['stage'] for event in events] == ['uploaded', 'parsed', 'sanitized', 'completed']
+    assert events[0]['size'] == len(b'not really a docx')
+    assert [event['time'] for event in events] == sorted(event['time'] for event in events)
+
+
+@pytest.mark.asyncio
+async def test_failed_job_reports_error(monkeypatch, client, parse_result):
+    parse_result['result'] = ValueError("Corrupt document")
+    manager = make_manager(monkeypatch)
+    await manager.start()
+    try:
+        job_id = (await submit(client)).json()['job_id']
+        events = parse_events((await client.get(f'/jobs/{job_id}/events')).text)
+        job = (await client.get(f'/jobs/{job_id}')).json()
+    finally:
+        await manager.stop()
+    
+    assert [event['stage'] for event in events] == ['uploaded', 'failed']
+    assert job['status'] == 'failed'
+    assert job['error'] == "Corrupt document"
+    assert 'result' not in job
+
+
+@pytest.mark.asyncio
+async def test_full_queue_is_rejected_with_429(monkeypatch, client, parse_result):
+    # No workers: submitted jobs stay queued
+    manager = make_manager(monkeypatch, workers=0, max_queued=2)
+    await manager.start()
+    try:
+        accepted = [await submit(client) for _ in range(2)]
+        rejected = await submit(client)
+        
+        assert [response.status_code for response in accepted] == [202, 202]
+        assert rejected.status_code == 429
+        assert manager.stats()['queued'] == 2
+    finally:
+        await manager.stop()
+
+
+@pytest.mark.asyncio
+async def test_finished_jobs_expire_after_ttl(monkeypatch, client, parse_result):
+    manager = make_manager(monkeypatch, result_ttl=60)
+    await manager.start()
+    try:
+        job_id = (await submit(client)).json()['job_id']
+        await wait_finished(client, job_id)
+        
+        now = time.time()
+        monkeypatch.setattr('app.jobs.time', SimpleNamespace(time=lambda: now + 30))
+        assert (await client.get(f'/jobs/{job_id}')).status_code == 200
+        
+        monkeypatch.setattr('app.jobs.time', SimpleNamespace(time=lambda: now + 120))
+        assert (await client.get(f'/jobs/{job_id}')).status_code == 404
+        assert (await client.get(f'/jobs/{job_id}/events')).status_code == 404
+        assert manager.stats()['completed'] == 0
+    finally:
+        await manager.stop()
+
+
+@pytest.mark.asyncio
+async def test_unknown_job_is_404(client):
+    assert (await client.get('/jobs/unknown')).status_code == 404
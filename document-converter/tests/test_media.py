@@ -0,0 +1,434 @@
+"""Content-addressed image storage"""
+import base64
+import errno
+import hashlib
+import io
+import os
+import random
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+from PIL import Image, ImageFile
+
+from app import media
+from app.config import settings
+from app.media import INDEX_DIR_NAME, store_image
+
+
+def make_image(size=(64, 48), fmt='PNG', color=(200, 30, 30), **options) -> bytes:
+    buffer = io.BytesIO()
+    Image.new('RGB', size, color).save(buffer, format=fmt, **options)
+    return buffer.getvalue()
+
+
+def make_noise(size, fmt, **options) -> bytes:
+    """Encode a seeded random image, which does not compress well"""
+    pixels = random.Random(0).randbytes(size[0] * size[1] * 3)
+    buffer = io.BytesIO()
+    Image.frombytes('RGB', size, pixels).save(buffer, format=fmt, **options)
+    return buffer.getvalue()
+
+
+def public_file(relative_path: str) -> Path:
+    return Path(settings.PUBLIC_MEDIA_PATH) / relative_path
+
+
+@pytest.fixture
+def processed(monkeypatch):
+    """Count the images that go through process_image"""
+    calls = []
+    process_image = media.process_image
+    
+    def counting(image_data, extension):
+        calls.append(extension)
+        return process_image(image_data, extension)
+    
+    monkeypatch.setattr(media, 'process_image', counting)
+    return calls
+
+
+def test_identical_images_are_stored_once(processed):
+    data = make_image()
+    
+    first = store_image(data, 'image/png')
+    second = store_image(data, 'image/png')
+    
+    assert second == first
+    assert public_file(first['filename']).read_bytes() == data
+    assert (settings.MEDIA_DIR / first['filename']).exists()
+    assert len(list(Path(settings.PUBLIC_MEDIA_PATH).rglob('*.png'))) == 1
+    assert processed == ['png']
+
+
+def test_reuse_goes_through_the_index(processed, monkeypatch):
+    data = make_image()
+    info = store_image(data, 'image/png')
+    
+    entries = [path for path in (settings.MEDIA_DIR / INDEX_DIR_NAME).rglob('*') if path.is_file()]
+    assert len(entries) == 1
+    assert not (Path(settings.PUBLIC_MEDIA_PATH) / INDEX_DIR_NAME).exists()
+    
+    # The index lookup is enough: nothing is decoded or written again
+    written = []
+    monkeypatch.setattr(media, 'write_media', lambda *args: written.append(args))
+    assert store_image(data, 'image/png') == info
+    assert written == []
+    assert processed == ['png']
+
+
+def test_missing_files_are_stored_again(processed):
+    data = make_image()
+    info = store_image(data, 'image/png')
+    
+    public_file(info['filename']).unlink()
+    
+    assert store_image(data, 'image/png') == info
+    assert public_file(info['filename']).read_bytes() == data
+    assert processed == ['png', 'png']
+
+
+def test_processing_settings_are_part_of_the_key(processed, monkeypatch):
+    data = make_image()
+    store_image(data, 'image/png')
+    
+    monkeypatch.setattr(settings, 'IMAGE_PLACEHOLDER_SIZE', 8)
+    store_image(data, 'image/png')
+    
+    assert processed == ['png', 'png']
+
+
+def test_web_images_pass_through_unchanged():
+    data = make_image()
+    
+    info = store_image(data, 'image/png')
+    
+    assert info['processing'] == 'passthrough'
+    assert info['bytes_saved'] == 0
+    assert public_file(info['filename']).read_bytes() == data
+
+
+@pytest.fixture
+def decodes(monkeypatch):
+    """Record the size at which images are decoded"""
+    sizes = []
+    load = ImageFile.ImageFile.load
+    
+    def recording_load(self):
+        if self.tile:
+            sizes.append(self.size)
+        return load(self)
+    
+    monkeypatch.setattr(ImageFile.ImageFile, 'load', recording_load)
+    return sizes
+
+
+def test_passthrough_images_are_not_decoded(decodes, monkeypatch):
+    monkeypatch.setattr(settings, 'IMAGE_PLACEHOLDER_SIZE', 0)
+    
+    info = store_image(make_image(size=(800, 600)), 'image/png')
+    
+    assert info['processing'] == 'passthrough'
+    assert (info['width'], info['height']) == (800, 600)
+    assert decodes == []
+
+
+def test_passthrough_jpeg_placeholders_decode_at_reduced_scale(decodes):
+    info = store_image(make_image(size=(1600, 1200), fmt='JPEG'), 'image/jpeg')
+    
+    assert info['processing'] == 'passthrough'
+    assert info['placeholder']
+    assert decodes == [(200, 150)]
+
+
+def test_images_not_in_their_stored_format_are_transcoded():
+    # A GIF reported as PNG would be served with the wrong type
+    data = make_image(fmt='GIF')
+    
+    info = store_image(data, 'image/png')
+    
+    assert info['processing'] == 'transcoded'
+    with Image.open(public_file(info['filename'])) as img:
+        assert img.format == 'PNG'
+        assert img.size == (64, 48)
+
+
+def test_large_web_images_are_transcoded(monkeypatch):
+    # Uncompressed, and just over the passthrough size limit
+    data = make_image(size=(128, 128), compress_level=0)
+    monkeypatch.setattr(settings, 'IMAGE_PASSTHROUGH_MAX_BYTES', len(data) - 1)
+    
+    info = store_image(data, 'image/png')
+    
+    stored = public_file(info['filename']).read_bytes()
+    assert info['processing'] == 'transcoded'
+    assert info['bytes_saved'] == len(data) - len(stored) > 0
+    with Image.open(io.BytesIO(stored)) as img:
+        assert img.tobytes() == Image.open(io.BytesIO(data)).tobytes()
+
+
+def test_original_is_kept_when_reencoding_is_bigger(monkeypatch):
+    # Noise saved at a low quality only grows when re-encoded at IMAGE_QUALITY
+    data = make_noise((128, 128), 'JPEG', quality=20)
+    monkeypatch.setattr(settings, 'IMAGE_PASSTHROUGH_MAX_BYTES', 0)
+    
+    info = store_image(data, 'image/jpeg')
+    
+    assert info['processing'] == 'passthrough'
+    assert info['bytes_saved'] == 0
+    assert public_file(info['filename']).read_bytes() == data
+
+
+def test_large_photos_are_stored_at_max_dimension():
+    data = make_image(size=(6000, 4000), fmt='JPEG')
+    limit = settings.IMAGE_MAX_DIMENSION
+    
+    info = store_image(data, 'image/jpeg')
+    
+    expected = (limit, round(4000 * limit / 6000))
+    assert info['processing'] == 'transcoded'
+    assert (info['width'], info['height']) == expected
+    with Image.open(public_file(info['filename'])) as img:
+        assert img.format == 'JPEG'
+        assert img.size == expected
+
+
+def srcset_entries(info: dict) -> list:
+    return [candidate.rsplit(' ', 1) for candidate in info['srcset'].split(', ')]
+
+
+def test_variants_are_opt_in(monkeypatch):
+    monkeypatch.setattr(settings, 'IMAGE_VARIANT_WIDTHS', [])
+    
+    info = store_image(make_image(size=(1200, 600), fmt='GIF'), 'image/png')
+    
+    assert info['processing'] == 'transcoded'
+    assert info['variants'] == []
+    assert info['srcset'] == ''
+    assert len([path for path in Path(settings.PUBLIC_MEDIA_PATH).rglob('*') if path.is_file()]) == 1
+
+
+def test_srcset_lists_each_width_in_the_first_format(monkeypatch):
+    monkeypatch.setattr(settings, 'IMAGE_VARIANT_WIDTHS', [960, 480, 2000])
+    monkeypatch.setattr(settings, 'IMAGE_VARIANT_FORMATS', ['webp', 'png'])
+    
+    info = store_image(make_image(size=(1200, 600)), 'image/png')
+    
+    webp = [variant for variant in info['variants'] if variant['content_type'] == 'image/webp']
+    png = [variant for variant in info['variants'] if variant['content_type'] == 'image/png']
+    assert [variant['width'] for variant in webp] == [480, 960, 1200]
+    # The stored PNG is the full-width PNG; the others are listed, not in srcset
+    assert [variant['width'] for variant in png] == [480, 960]
+    assert info['variants'] == webp + png
+    
+    assert srcset_entries(info) == [[variant['url'], f"{variant['width']}w"] for variant in webp]
+    for variant in info['variants']:
+        path = public_file(variant['url'][len(settings.MEDIA_URL_PREFIX) + 1:])
+        assert path.stat().st_size == variant['size']
+        with Image.open(path) as img:
+            assert img.size == (variant['width'], variant['width'] // 2)
+
+
+def test_srcset_includes_the_stored_image_in_its_own_format(monkeypatch):
+    monkeypatch.setattr(settings, 'IMAGE_VARIANT_WIDTHS', [480])
+    monkeypatch.setattr(settings, 'IMAGE_VARIANT_FORMATS', [])
+    
+    info = store_image(make_image(size=(1200, 600)), 'image/png')
+    
+    assert srcset_entries(info) == [
+        [info['variants'][0]['url'], '480w'],
+        [info['url'], '1200w'],
+    ]
+
+
+def test_images_narrower_than_every_width_have_no_srcset(monkeypatch):
+    monkeypatch.setattr(settings, 'IMAGE_VARIANT_WIDTHS', [480, 960])
+    monkeypatch.setattr(settings, 'IMAGE_VARIANT_FORMATS', [])
+    
+    info = store_image(make_image(size=(300, 200)), 'image/png')
+    
+    assert info['variants'] == []
+    assert info['srcset'] == ''
+    assert 'srcset' not in media.img_attributes(info)
+
+
+def test_dimensions_and_placeholder_are_recorded(processed):
+    data = make_image(size=(400, 100))
+    
+    info = store_image(data, 'image/png')
+    
+    assert (info['width'], info['height']) == (400, 100)
+    header, encoded = info['placeholder'].split(',', 1)
+    assert header.startswith('data:image/') and header.endswith(';base64')
+    with Image.open(io.BytesIO(base64.b64decode(encoded))) as img:
+        assert max(img.size) == settings.IMAGE_PLACEHOLDER_SIZE
+        assert img.width == 4 * img.height
+    
+    # Kept in the index, so reused images need no decoding to report them
+    reused = store_image(data, 'image/png')
+    assert processed == ['png']
+    assert (reused['width'], reused['height'], reused['placeholder']) == (400, 100, info['placeholder'])
+    assert 'width="400" height="100"' in media.img_attributes(reused)
+
+
+def test_placeholder_can_be_disabled(monkeypatch):
+    monkeypatch.setattr(settings, 'IMAGE_PLACEHOLDER_SIZE', 0)
+    
+    info = store_image(make_image(), 'image/png')
+    
+    assert info['placeholder'] is None
+    assert (info['width'], info['height']) == (64, 48)
+
+
+def test_unreadable_images_have_no_dimensions():
+    info = store_image(b'not an image', 'image/png')
+    
+    assert info['processing'] == 'unprocessed'
+    assert (info['width'], info['height'], info['placeholder']) == (None, None, None)
+    assert 'width=' not in media.img_attributes(info)
+
+
+@pytest.fixture
+def file_ops(monkeypatch):
+    """Record atomic writes and hardlinks made by the media store"""
+    calls = {'writes': [], 'links': []}
+    write_atomic = media._write_atomic
+    
+    def recording_write(path, data):
+        calls['writes'].append(path)
+        write_atomic(path, data)
+    
+    def recording_link(source, target):
+        calls['links'].append((Path(source), Path(target)))
+        os.link(source, target)
+    
+    monkeypatch.setattr(media, '_write_atomic', recording_write)
+    monkeypatch.setattr('app.media.os', SimpleNamespace(link=recording_link, replace=os.replace, getpid=os.getpid))
+    return calls
+
+
+def test_media_is_written_and_linked_once_per_hash(file_ops):
+    data = make_image()
+    relative_path = media.sharded_path(hashlib.sha256(data).hexdigest(), 'png')
+    
+    paths = [media.write_media(relative_path, data) for _ in range(3)]
+    
+    public, local = public_file(relative_path), settings.MEDIA_DIR / relative_path
+    assert paths == [public] * 3
+    assert file_ops['writes'] == [public]
+    assert file_ops['links'] == [(public, local)]
+    assert public.read_bytes() == data
+    assert os.stat(public).st_ino == os.stat(local).st_ino
+    assert not list(Path(settings.PUBLIC_MEDIA_PATH).rglob('*.tmp'))
+
+
+def test_store_image_writes_each_file_once(file_ops, monkeypatch):
+    monkeypatch.setattr(settings, 'IMAGE_VARIANT_FORMATS', [])
+    data = make_image()
+    
+    info = store_image(data, 'image/png')
+    # Without the index entry the image is processed again, but the file
+    # under its content hash is already there
+    for entry in (settings.MEDIA_DIR / INDEX_DIR_NAME).rglob('*'):
+        if entry.is_file():
+            entry.unlink()
+    store_image(data, 'image/png')
+    
+    media_writes = [path for path in file_ops['writes'] if INDEX_DIR_NAME not in path.parts]
+    assert media_writes == [public_file(info['filename'])]
+    assert len(file_ops['links']) == 1
+
+
+def test_concurrent_writers_leave_one_complete_file():
+    data = make_noise((64, 64), 'PNG')
+    relative_path = media.sharded_path(hashlib.sha256(data).hexdigest(), 'png')
+    
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(lambda _: media.write_media(relative_path, data), range(32)))
+    
+    assert public_file(relative_path).read_bytes() == data
+    assert (settings.MEDIA_DIR / relative_path).read_bytes() == data
+    assert not [path for path in Path(settings.PUBLIC_MEDIA_PATH).rglob('*') if path.name.endswith('.tmp')]
+
+
+def test_media_dir_link_is_optional(monkeypatch):
+    def cross_device(source, target):
+        raise OSError(errno.EXDEV, 'Invalid cross-device link')
+    
+    monkeypatch.setattr('app.media.os', SimpleNamespace(link=cross_device, replace=os.replace, getpid=os.getpid))
+    data = make_image()
+    relative_path = media.sharded_path(hashlib.sha256(data).hexdigest(), 'png')
+    
+    assert media.write_media(relative_path, data).read_bytes() == data
+    assert not (settings.MEDIA_DIR / relative_path).exists()
+
+
+@pytest.fixture
+def slow_store(monkeypatch):
+    """Make store_image slow and track how many calls run at once, per document"""
+    state = {'running': Counter(), 'peak': Counter(), 'total_peak': 0}
+    lock = threading.Lock()
+    
+    def store(image_data, content_type):
+        document = content_type
+        with lock:
+            state['running'][document] += 1
+            state['peak'][document] = max(state['peak'][document], state['running'][document])
+            state['total_peak'] = max(state['total_peak'], sum(state['running'].values()))
+        time.sleep(0.02)
+        with lock:
+            state['running'][document] -= 1
+        if image_data == b'broken':
+            raise OSError("disk full")
+        return {'data': image_data}
+    
+    monkeypatch.setattr(media, 'store_image', store)
+    return state
+
+
+def test_images_per_document_are_capped(slow_store):
+    pipeline = media.ImagePipeline(workers=8, max_parallel_per_document=2)
+    events = []
+    batch = pipeline.batch(total=8, progress=lambda stage, **details: events.append(details))
+    
+    indexes = [batch.submit(bytes([index]), 'doc') for index in range(8)]
+    results = batch.results()
+    
+    assert indexes == list(range(8))
+    assert results == [{'data': bytes([index])} for index in range(8)]
+    assert slow_store['peak']['doc'] == 2
+    assert sorted(event['processed'] for event in events) == list(range(1, 9))
+    assert all(event['total'] == 8 for event in events)
+
+
+def test_documents_share_the_pool_under_their_own_caps(slow_store):
+    pipeline = media.ImagePipeline(workers=8, max_parallel_per_document=2)
+    
+    def convert_document(name: str):
+        batch = pipeline.batch()
+        for index in range(6):
+            batch.submit(bytes([index]), name)
+        return batch.results()
+    
+    with ThreadPoolExecutor(max_workers=3) as documents:
+        results = list(documents.map(convert_document, ['a', 'b', 'c']))
+    
+    assert all(len(result) == 6 for result in results)
+    assert max(slow_store['peak'].values()) == 2
+    # One document's cap does not hold back the others
+    assert slow_store['total_peak'] > 2
+
+
+def test_failed_images_release_their_slot(slow_store):
+    pipeline = media.ImagePipeline(workers=4, max_parallel_per_document=1)
+    batch = pipeline.batch()
+    
+    for data in (b'broken', b'ok', b'broken', b'ok'):
+        batch.submit(data, 'doc')
+    
+    assert batch.results() == [None, {'data': b'ok'}, None, {'data': b'ok'}]
+    assert slow_store['peak']['doc'] == 1
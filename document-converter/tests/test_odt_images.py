@@ -0,0 +1,112 @@
+"""Only the pictures content.xml references are extracted from an ODT"""
+import io
+import zipfile
+
+import pytest
+from PIL import Image
+
+from app import media
+from app.config import settings
+from app.parsers import OdtParser
+
+NAMESPACES = (
+    'xmlns:office="urn:oasis:names:tc:opendocument:xmlns:office:1.0" '
+    'xmlns:text="urn:oasis:names:tc:opendocument:xmlns:text:1.0" '
+    'xmlns:draw="urn:oasis:names:tc:opendocument:xmlns:drawing:1.0" '
+    'xmlns:svg="urn:oasis:names:tc:opendocument:xmlns:svg-compatible:1.0" '
+    'xmlns:xlink="http://www.w3.org/1999/xlink"'
+)
+MANIFEST_NS = 'xmlns:manifest="urn:oasis:names:tc:opendocument:xmlns:manifest:1.0"'
+
+
+def make_png(color) -> bytes:
+    buffer = io.BytesIO()
+    Image.new('RGB', (32, 16), color).save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+PICTURES = {
+    'Pictures/used.png': make_png((255, 0, 0)),
+    'Pictures/a&b.png': make_png((0, 255, 0)),
+    'Pictures/leftover.png': make_png((0, 0, 255)),
+    'Thumbnails/thumbnail.png': make_png((9, 9, 9)),
+}
+
+
+def frame(href: str) -> str:
+    return (
+        f'<text:p><draw:frame svg:width="1in" svg:height="0.5in">'
+        f'<draw:image xlink:href="{href}"/></draw:frame></text:p>'
+    )
+
+
+def make_odt() -> bytes:
+    """ODT whose body shows two of its four packaged pictures"""
+    content = (
+        f'<?xml version="1.0" encoding="UTF-8"?>'
+        f'<office:document-content {NAMESPACES}><office:body><office:text>'
+        f'{frame("Pictures/used.png")}{frame("Pictures/a&amp;b.png")}'
+        f'{frame("Pictures/used.png")}{frame("https://example.com/external.png")}'
+        f'</office:text></office:body></office:document-content>'
+    )
+    entries = ''.join(
+        f'<manifest:file-entry manifest:full-path="{path.replace("&", "&amp;")}" manifest:media-type="image/png"/>'
+        for path in PICTURES
+    )
+    manifest = f'<?xml version="1.0" encoding="UTF-8"?><manifest:manifest {MANIFEST_NS}>{entries}</manifest:manifest>'
+    
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as odt:
+        odt.writestr('mimetype', 'application/vnd.oasis.opendocument.text')
+        odt.writestr('content.xml', content)
+        odt.writestr('styles.xml', f'<office:document-styles {NAMESPACES}/>')
+        odt.writestr('META-INF/manifest.xml', manifest)
+        for path, data in PICTURES.items():
+            odt.writestr(path, data)
+    return buffer.getvalue()
+
+
+@pytest.fixture(params=[True, False], ids=['streaming', 'tree'])
+def parse_mode(request, monkeypatch):
+    """Run each test with both body conversion modes"""
+    monkeypatch.setattr(settings, 'ODT_STREAMING_PARSE', request.param)
+
+
+@pytest.fixture
+def stored(monkeypatch):
+    """Record the image bytes handed to the media store"""
+    calls = []
+    store_image = media.store_image
+    
+    def recording(image_data, content_type):
+        calls.append(image_data)
+        return store_image(image_data, content_type)
+    
+    monkeypatch.setattr(media, 'store_image', recording)
+    return calls
+
+
+def test_only_referenced_pictures_are_extracted(parse_mode, stored):
+    result = OdtParser().parse(make_odt())
+    
+    assert sorted(stored) == sorted([PICTURES['Pictures/used.png'], PICTURES['Pictures/a&b.png']])
+    assert len(result['images']) == 2
+    assert result['html'].count('<img ') == 3
+    for image in result['images']:
+        assert image['url'] in result['html']
+
+
+def test_thumbnails_and_leftovers_are_not_stored(parse_mode):
+    OdtParser().parse(make_odt())
+    
+    stored_files = {path.read_bytes() for path in settings.MEDIA_DIR.rglob('*.png')}
+    assert PICTURES['Thumbnails/thumbnail.png'] not in stored_files
+    assert PICTURES['Pictures/leftover.png'] not in stored_files
+    assert PICTURES['Pictures/used.png'] in stored_files
+
+
+def test_nothing_is_stored_without_image_extraction(parse_mode, stored):
+    result = OdtParser().parse(make_odt(), extract_images=False)
+    
+    assert stored == []
+    assert result['images'] == []
@@ -0,0 +1,228 @@
+"""ODT body structure and styles are converted in one pass over the document"""
+import io
+import logging
+import time
+import zipfile
+
+import pytest
+
+from app.config import settings
+from app.parsers import OdtParser
+
+NAMESPACES = (
+    'xmlns:office="urn:oasis:names:tc:opendocument:xmlns:office:1.0" '
+    'xmlns:style="urn:oasis:names:tc:opendocument:xmlns:style:1.0" '
+    'xmlns:text="urn:oasis:names:tc:opendocument:xmlns:text:1.0" '
+    'xmlns:table="urn:oasis:names:tc:opendocument:xmlns:table:1.0" '
+    'xmlns:fo="urn:oasis:names:tc:opendocument:xmlns:xsl-fo-compatible:1.0"'
+)
+
+NUMBERED_LIST_STYLE = (
+    '<text:list-style style:name="L1">'
+    '<text:list-level-style-number text:level="1"/>'
+    '<text:list-level-style-bullet text:level="2"/>'
+    '</text:list-style>'
+)
+
+
+def make_odt(body: str, automatic_styles: str = '') -> bytes:
+    """Build a minimal ODT package around an office:text body"""
+    content = (
+        f'<?xml version="1.0" encoding="UTF-8"?>'
+        f'<office:document-content {NAMESPACES}>'
+        f'<office:automatic-styles>{automatic_styles}</office:automatic-styles>'
+        f'<office:body><office:text>{body}</office:text></office:body>'
+        f'</office:document-content>'
+    )
+    styles = f'<?xml version="1.0" encoding="UTF-8"?><office:document-styles {NAMESPACES}/>'
+    
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as odt:
+        odt.writestr('mimetype', 'application/vnd.oasis.opendocument.text')
+        odt.writestr('content.xml', content)
+        odt.writestr('styles.xml', styles)
+    return buffer.getvalue()
+
+
+def nested_lists(depth: int) -> str:
+    """A list nested depth levels deep, one item per level"""
+    body = ''
+    for level in reversed(range(depth)):
+        body = f'<text:list><text:list-item><text:p>item-{level}</text:p>{body}</text:list-item></text:list>'
+    return body
+
+
+def nested_tables(depth: int) -> str:
+    """A table nested depth levels deep, one cell per level"""
+    body = ''
+    for level in reversed(range(depth)):
+        body = (
+            f'<table:table><table:table-row><table:table-cell>'
+            f'<text:p>cell-{level}</text:p>{body}'
+            f'</table:table-cell></table:table-row></table:table>'
+        )
+    return body
+
+
+def convert(body: str, automatic_styles: str = '') -> str:
+    """Convert a generated document without extracting images"""
+    return OdtParser().parse(make_odt(body, automatic_styles), extract_images=False)['html']
+
+
+@pytest.fixture(params=[True, False], ids=['streaming', 'tree'])
+def parse_mode(request, monkeypatch):
+    """Run each test with both body conversion modes"""
+    monkeypatch.setattr(settings, 'ODT_STREAMING_PARSE', request.param)
+
+
+def test_nested_lists_convert_each_item_once(parse_mode):
+    html = convert(nested_lists(50))
+    
+    for level in range(50):
+        assert html.count(f'item-{level}<') == 1
+    assert html.count('<ul>') == 50
+    assert html.count('<li>') == 50
+
+
+def test_nested_tables_convert_each_cell_once(parse_mode):
+    html = convert(nested_tables(30))
+    
+    for level in range(30):
+        assert html.count(f'cell-{level}<') == 1
+    assert html.count('<table>') == 30
+    assert html.count('<td>') == 30
+
+
+def test_numbered_lists_continue_numbering(parse_mode):
+    items = '<text:list-item><text:p>a</text:p></text:list-item>' * 3
+    body = (
+        f'<text:list text:style-name="L1">{items}</text:list>'
+        f'<text:p>between</text:p>'
+        f'<text:list text:style-name="L1" text:continue-numbering="true">{items}</text:list>'
+        f'<text:list text:style-name="L1">{items}</text:list>'
+    )
+    html = convert(body, NUMBERED_LIST_STYLE)
+    
+    assert html.count('<ol>') == 2
+    assert html.count('<ol start="4">') == 1
+
+
+def test_list_levels_follow_list_style(parse_mode):
+    body = (
+        '<text:list text:style-name="L1"><text:list-item><text:p>one</text:p>'
+        '<text:list><text:list-item><text:p>bullet</text:p></text:list-item></text:list>'
+        '</text:list-item></text:list>'
+    )
+    html = convert(body, NUMBERED_LIST_STYLE)
+    
+    assert html == '<ol><li>one<ul><li>bullet</li></ul></li></ol>'
+
+
+def test_table_spans_and_covered_cells(parse_mode):
+    body = (
+        '<table:table>'
+        '<table:table-header-rows><table:table-row>'
+        '<table:table-cell table:number-columns-spanned="2"><text:p>head</text:p></table:table-cell>'
+        '<table:covered-table-cell/>'
+        '</table:table-row></table:table-header-rows>'
+        '<table:table-row>'
+        '<table:table-cell table:number-rows-spanned="2"><text:p>tall</text:p></table:table-cell>'
+        '<table:table-cell><text:p>x</text:p></table:table-cell>'
+        '</table:table-row>'
+        '<table:table-row>'
+        '<table:covered-table-cell/>'
+        '<table:table-cell><text:p>y</text:p></table:table-cell>'
+        '</table:table-row>'
+        '</table:table>'
+    )
+    html = convert(body)
+    
+    assert html == (
+        '<table><thead><tr><td colspan="2"><p>head</p></td></tr></thead>'
+        '<tbody><tr><td rowspan="2"><p>tall</p></td><td><p>x</p></td></tr>'
+        '<tr><td><p>y</p></td></tr></tbody></table>'
+    )
+
+
+def test_repeated_rows_and_columns_are_capped(parse_mode):
+    body = (
+        '<table:table>'
+        '<table:table-row table:number-rows-repeated="1048576">'
+        '<table:table-cell table:number-columns-repeated="16384"/>'
+        '</table:table-row>'
+        '</table:table>'
+    )
+    html = convert(body)
+    
+    assert html.count('<tr>') == OdtParser.MAX_REPEATED
+    assert html.count('<td>') == OdtParser.MAX_REPEATED * OdtParser.MAX_REPEATED
+
+
+def test_capped_repeats_are_logged(parse_mode, caplog):
+    body = (
+        '<table:table>'
+        f'<table:table-row table:number-rows-repeated="{OdtParser.MAX_REPEATED}">'
+        '<table:table-cell table:number-columns-repeated="300"><text:p>x</text:p></table:table-cell>'
+        '</table:table-row>'
+        '</table:table>'
+    )
+    with caplog.at_level(logging.WARNING, logger='app.parsers.odt_parser'):
+        html = convert(body)
+    
+    assert html.count('<tr>') == OdtParser.MAX_REPEATED
+    warnings = [record.getMessage() for record in caplog.records if record.levelno == logging.WARNING]
+    assert warnings == [
+        f'table:number-columns-repeated=300 exceeds {OdtParser.MAX_REPEATED}; '
+        f'dropping the other {300 - OdtParser.MAX_REPEATED} repeats'
+    ]
+
+
+def best_time(body: str, repeats: int = 3) -> float:
+    """Fastest of several conversions, to damp scheduler noise"""
+    document = make_odt(body)
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        OdtParser().parse(document, extract_images=False)
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+@pytest.mark.parametrize('generate, depth', [
+    (nested_lists, 100),
+    (nested_tables, 40)
+], ids=['lists', 'tables'])
+def test_conversion_time_grows_linearly_with_nesting(generate, depth):
+    # Quadratic descendant searches would make 4x the nesting ~16x slower
+    small = best_time(generate(depth))
+    large = best_time(generate(depth * 4))
+    
+    assert large / small < 8
+
+
+def test_styles_inherit_from_parent_styles(parse_mode):
+    automatic_styles = (
+        '<style:style style:name="Base"><style:text-properties fo:font-weight="bold"/></style:style>'
+        '<style:style style:name="P1" style:parent-style-name="Base">'
+        '<style:text-properties fo:color="#ff0000"/></style:style>'
+    )
+    html = convert('<text:p text:style-name="P1">red</text:p>', automatic_styles)
+    
+    assert html == '<p style="font-weight: bold; color: #ff0000">red</p>'
+
+
+def test_styles_xml_is_only_read_for_missing_styles(parse_mode, monkeypatch):
+    opened = []
+    original_read = zipfile.ZipFile.read
+    
+    def read(self, name, *args, **kwargs):
+        opened.append(name)
+        return original_read(self, name, *args, **kwargs)
+    
+    monkeypatch.setattr(zipfile.ZipFile, 'read', read)
+    automatic_styles = '<style:style style:name="P1"><style:text-properties fo:color="#00ff00"/></style:style>'
+    convert('<text:p text:style-name="P1">green</text:p>', automatic_styles)
+    assert 'styles.xml' not in opened
+    
+    convert('<text:p text:style-name="Standard">plain</text:p>', automatic_styles)
+    assert 'styles.xml' in opened
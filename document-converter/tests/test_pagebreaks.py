@@ -0,0 +1,156 @@
+"""Page breaks become PAGEBREAK_MARKER in the parsers, in one scan at most"""
+import io
+import re
+import shutil
+import subprocess
+import time
+import zipfile
+
+import pytest
+
+from app.config import settings
+from app.parsers import DocxParser, OdtParser
+from app.sanitizers import HTMLSanitizer
+
+MARKER = settings.PAGEBREAK_MARKER
+
+ODT_NAMESPACES = (
+    'xmlns:office="urn:oasis:names:tc:opendocument:xmlns:office:1.0" '
+    'xmlns:style="urn:oasis:names:tc:opendocument:xmlns:style:1.0" '
+    'xmlns:text="urn:oasis:names:tc:opendocument:xmlns:text:1.0" '
+    'xmlns:table="urn:oasis:names:tc:opendocument:xmlns:table:1.0" '
+    'xmlns:fo="urn:oasis:names:tc:opendocument:xmlns:xsl-fo-compatible:1.0"'
+)
+
+ODT_STYLES = (
+    '<style:style style:name="Before"><style:paragraph-properties fo:break-before="page"/></style:style>'
+    '<style:style style:name="After"><style:paragraph-properties fo:break-after="page"/>'
+    '<style:text-properties fo:color="#0000ff"/></style:style>'
+    '<style:style style:name="Chapter" style:parent-style-name="Before"/>'
+    '<style:style style:name="Table"><style:table-properties fo:break-before="page"/></style:style>'
+)
+
+
+def make_odt(body: str) -> bytes:
+    """Build a minimal ODT package around an office:text body"""
+    content = (
+        f'<?xml version="1.0" encoding="UTF-8"?>'
+        f'<office:document-content {ODT_NAMESPACES}>'
+        f'<office:automatic-styles>{ODT_STYLES}</office:automatic-styles>'
+        f'<office:body><office:text>{body}</office:text></office:body>'
+        f'</office:document-content>'
+    )
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as odt:
+        odt.writestr('mimetype', 'application/vnd.oasis.opendocument.text')
+        odt.writestr('content.xml', content)
+    return buffer.getvalue()
+
+
+def make_docx(body: str) -> bytes:
+    """Build a minimal DOCX package around a w:body"""
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as docx:
+        docx.writestr('[Content_Types].xml', (
+            '<?xml version="1.0" encoding="UTF-8"?>'
+            '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+            '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+            '<Default Extension="xml" ContentType="application/xml"/>'
+            '<Override PartName="/word/document.xml" '
+            'ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/>'
+            '</Types>'
+        ))
+        docx.writestr('_rels/.rels', (
+            '<?xml version="1.0" encoding="UTF-8"?>'
+            '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+            '<Relationship Id="rId1" Target="word/document.xml" '
+            'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument"/>'
+            '</Relationships>'
+        ))
+        docx.writestr('word/document.xml', (
+            '<?xml version="1.0" encoding="UTF-8"?>'
+            '<w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main">'
+            f'<w:body>{body}</w:body></w:document>'
+        ))
+    return buffer.getvalue()
+
+
+def test_odt_break_styles_emit_markers():
+    html = OdtParser().parse(make_odt(
+        '<text:p>one</text:p>'
+        '<text:p text:style-name="Before">two</text:p>'
+        '<text:h text:style-name="Chapter" text:outline-level="2">three</text:h>'
+        '<text:p text:style-name="After">four</text:p>'
+        '<text:soft-page-break/>'
+        '<table:table table:style-name="Table"><table:table-row><table:table-cell>'
+        '<text:p>five</text:p></table:table-cell></table:table-row></table:table>'
+    ), extract_images=False)['html']
+    
+    assert html == (
+        f'<p>one</p>{MARKER}<p>two</p>{MARKER}<h2>three</h2>'
+        f'<p style="color: #0000ff">four</p>{MARKER}{MARKER}'
+        f'{MARKER}<table><tr><td><p>five</p></td></tr></table>'
+    )
+
+
+def test_docx_page_breaks_emit_markers():
+    html = DocxParser().parse(make_docx(
+        '<w:p><w:r><w:t>one</w:t></w:r><w:r><w:br w:type="page"/></w:r><w:r><w:t>two</w:t></w:r></w:p>'
+        '<w:p><w:r><w:br w:type="page"/></w:r></w:p>'
+        '<w:p><w:r><w:t>three</w:t></w:r></w:p>'
+    ), extract_images=False)['html']
+    
+    assert html == f'<p>one{MARKER}two</p>{MARKER}<p>three</p>'
+
+
+@pytest.mark.parametrize('markup, expected', [
+    ('<div style="page-break-after: always"><span style="display: none">&nbsp;</span></div>', MARKER),
+    ('<div style="page-break-after: always"></div>', MARKER),
+    ('<div style="page-break-before: always"></div>', MARKER),
+    ('<br style="page-break-after: always">', MARKER),
+    ('<br style="page-break-before: always">', MARKER),
+    ('<p style="page-break-after: always"></p>', MARKER),
+    ('<p style="page-break-before: always"></p>', MARKER),
+    ('<hr class="pagebreak">', MARKER),
+    ('<hr class="pagebreak" />', MARKER),
+    ('<p><hr class="pagebreak" /></p>', MARKER),
+    ('<div class="page-break"></div>', MARKER),
+    ('<p class="x" style="color: red; page-break-before: always">text</p>', f'<p class="x" style="color: red;">{MARKER}text</p>'),
+    ('<h2 style="PAGE-BREAK-AFTER: always">text</h2>', f'<h2 >{MARKER}text</h2>'),
+])
+def test_pagebreak_markup_is_normalized(markup, expected):
+    assert OdtParser()._process_pagebreaks(f'<p>a</p>{markup}<p>b</p>') == f'<p>a</p>{expected}<p>b</p>'
+
+
+def test_final_cleanup_spaces_and_dedupes_markers():
+    sanitizer = HTMLSanitizer(['p'], {}, [])
+    html = sanitizer._final_cleanup(
+        f'\n<p>a</p>  {MARKER}\n\n{MARKER} {MARKER}<p>b</p>  \n \n\n  <p>c</p> \n<p>d</p>{MARKER}  '
+    )
+    
+    assert html == f'<p>a</p>\n{MARKER}\n<p>b</p>\n\n  <p>c</p>\n<p>d</p>\n{MARKER}'
+
+
+@pytest.mark.parametrize('run', [' ', '\n', ' \n', f' {MARKER} ', f' {MARKER[:-3]}'])
+def test_final_cleanup_is_linear_in_whitespace_runs(run):
+    sanitizer = HTMLSanitizer(['p'], {}, [])
+    timings = []
+    for size in (5000, 20000):
+        html = f'<p>a</p>{run * size}<p>b</p>'
+        start = time.perf_counter()
+        sanitizer._final_cleanup(html)
+        timings.append(time.perf_counter() - start)
+    
+    # 4x the input may take at most ~4x the time (with slack for noise)
+    assert timings[1] < max(timings[0], 0.001) * 12
+
+
+def test_cleanup_pattern_compiles_on_the_minimum_python():
+    # README: Python 3.10+. Possessive quantifiers and atomic groups are 3.11+
+    pattern = HTMLSanitizer(['p'], {}, [])._cleanup_pattern.pattern
+    assert not re.search(r'(?<!\\)(?:[*+?}]\+|\(\?>)', pattern)
+    
+    python = shutil.which('python3.10')
+    if python is None or subprocess.run([python, '-c', ''], capture_output=True).returncode:
+        pytest.skip('no Python 3.10 interpreter')
+    subprocess.run([python, '-c', 'import re, sys; re.compile(sys.argv[1])', pattern], check=True)
@@ -0,0 +1,251 @@
+"""Conversion results split into pages at PAGEBREAK_MARKER"""
+import hashlib
+from collections import OrderedDict
+
+import pytest
+from fastapi.testclient import TestClient
+from lxml import html as lxml_html
+
+from app.cache import ConversionCache
+from app.config import settings
+from app import pagination
+from app.pagination import get_page, paginate_result, split_pages
+
+MARKER = settings.PAGEBREAK_MARKER
+
+IMAGES = [
+    {'url': '/media/a.png', 'width': 10},
+    {'url': '/media/b.png', 'width': 20},
+]
+
+
+@pytest.fixture(autouse=True)
+def page_cache(monkeypatch):
+    """Give each test an empty page cache"""
+    monkeypatch.setattr(pagination, '_pages', OrderedDict())
+
+
+def make_result(html: str, images=None, conversion_id: str = None) -> dict:
+    result = {
+        'html': html,
+        'metadata': {'format': 'odt', 'has_pagebreaks': MARKER in html, 'cached': False}
+    }
+    if conversion_id:
+        result['metadata']['conversion_id'] = conversion_id
+    if images:
+        result['images'] = images
+    return result
+
+
+def test_split_at_markers():
+    pages = split_pages(f'<p>one</p>\n{MARKER}\n<p>two</p>\n{MARKER}\n<p>three</p>')
+    
+    assert [page['html'] for page in pages] == ['<p>one</p>', '<p>two</p>', '<p>three</p>']
+
+
+def test_without_markers_is_one_page():
+    assert split_pages('<p>only</p>') == [{'html': '<p>only</p>', 'images': []}]
+    assert split_pages('') == [{'html': '', 'images': []}]
+
+
+def test_blank_pages_are_dropped():
+    pages = split_pages(f'{MARKER}\n<p>one</p>\n{MARKER}\n<p> </p>\n{MARKER}\n<p>two</p>\n{MARKER}')
+    
+    assert [page['html'] for page in pages] == ['<p>one</p>', '<p>two</p>']
+
+
+def test_open_elements_are_reopened():
+    html = (
+        f'<div class="body"><ul><li>a</li>{MARKER}<li>b<br>c</li></ul>'
+        f'<p>tail</p></div><p>after</p>'
+    )
+    pages = split_pages(html)
+    
+    assert [page['html'] for page in pages] == [
+        '<div class="body"><ul><li>a</li></ul></div>',
+        '<div class="body"><ul><li>b<br>c</li></ul><p>tail</p></div><p>after</p>',
+    ]
+    for page in pages:
+        # Every page parses back to itself, i.e. it is balanced
+        root = lxml_html.fragment_fromstring(page['html'], create_parent='div')
+        assert lxml_html.tostring(root, encoding='unicode') == f'<div>{page["html"]}</div>'
+
+
+def test_images_follow_their_page():
+    html = (
+        f'<p><img src="/media/a.png" alt=""></p>{MARKER}'
+        f'<p>text</p>{MARKER}'
+        f'<p><img src="/media/b.png" alt=""><img src="/media/a.png" alt="">'
+        f'<img src="/media/b.png" alt=""></p>'
+    )
+    pages = split_pages(html, IMAGES)
+    
+    assert [page['images'] for page in pages] == [
+        [IMAGES[0]],
+        [],
+        [IMAGES[1], IMAGES[0]],
+    ]
+
+
+@pytest.mark.asyncio
+async def test_paginate_result_returns_the_first_page():
+    key = hashlib.sha256(b'document').hexdigest()
+    result = make_result(f'<p><img src="/media/b.png"></p>{MARKER}<p>two</p>', IMAGES, key)
+    
+    assert await paginate_result(result) == {
+        'conversion_id': key,
+        'page': 1,
+        'page_count': 2,
+        'html': '<p><img src="/media/b.png"></p>',
+        'images': [IMAGES[1]],
+        'metadata': result['metadata'],
+    }
+
+
+@pytest.mark.asyncio
+async def test_get_page_from_cache(tmp_path):
+    cache = ConversionCache(tmp_path / 'cache')
+    key = hashlib.sha256(b'document').hexdigest()
+    cache.set(key, make_result(f'<p>one</p>{MARKER}<p>two</p>'))
+    
+    assert await get_page(key, 2, cache) == {
+        'conversion_id': key,
+        'page': 2,
+        'page_count': 2,
+        'html': '<p>two</p>',
+        'images': [],
+    }
+    assert await get_page(key, 0, cache) is None
+    assert await get_page(key, 3, cache) is None
+    assert await get_page(hashlib.sha256(b'other').hexdigest(), 1, cache) is None
+
+
+@pytest.fixture
+def counted(monkeypatch, tmp_path):
+    """Count the cache lookups and splits behind page fetches"""
+    cache = ConversionCache(tmp_path / 'cache')
+    calls = {'lookup': 0, 'split': 0}
+    lookup = cache.lookup
+    
+    async def counting_lookup(key):
+        calls['lookup'] += 1
+        return await lookup(key)
+    
+    def counting_split(html, images=None):
+        calls['split'] += 1
+        return split_pages(html, images)
+    
+    monkeypatch.setattr(cache, 'lookup', counting_lookup)
+    monkeypatch.setattr(pagination, 'split_pages', counting_split)
+    return cache, calls
+
+
+@pytest.mark.asyncio
+async def test_document_is_split_once_for_all_pages(counted):
+    cache, calls = counted
+    key = hashlib.sha256(b'document').hexdigest()
+    result = make_result(MARKER.join(f'<p>{index}</p>' for index in range(50)), conversion_id=key)
+    cache.set(key, result)
+    
+    first = await paginate_result(result)
+    pages = [await get_page(key, page, cache) for page in range(2, 51)]
+    
+    assert first['page_count'] == 50
+    assert [page['html'] for page in pages] == [f'<p>{index}</p>' for index in range(1, 50)]
+    assert calls == {'lookup': 0, 'split': 1}
+
+
+@pytest.mark.asyncio
+async def test_pages_are_split_on_first_fetch_and_evicted(counted, monkeypatch):
+    cache, calls = counted
+    monkeypatch.setattr(settings, 'PAGE_CACHE_ENTRIES', 1)
+    first, second = (hashlib.sha256(name).hexdigest() for name in (b'first', b'second'))
+    cache.set(first, make_result(f'<p>one</p>{MARKER}<p>two</p>'))
+    cache.set(second, make_result('<p>only</p>'))
+    
+    assert (await get_page(first, 2, cache))['html'] == '<p>two</p>'
+    assert (await get_page(first, 1, cache))['html'] == '<p>one</p>'
+    assert calls == {'lookup': 1, 'split': 1}
+    
+    # Only one conversion's pages are kept: the first is split again
+    assert (await get_page(second, 1, cache))['html'] == '<p>only</p>'
+    assert (await get_page(first, 1, cache))['html'] == '<p>one</p>'
+    assert calls == {'lookup': 3, 'split': 3}
+    assert list(pagination._pages) == [first]
+
+
+@pytest.mark.asyncio
+async def test_get_page_rejects_invalid_ids(tmp_path):
+    cache = ConversionCache(tmp_path / 'cache')
+    
+    assert await get_page('../../etc/passwd', 1, cache) is None
+    assert await get_page('A' * 64, 1, cache) is None
+
+
+def test_page_endpoint(monkeypatch, tmp_path):
+    import main
+    
+    cache = ConversionCache(tmp_path / 'cache')
+    key = hashlib.sha256(b'document').hexdigest()
+    cache.set(key, make_result(f'<p>one</p>{MARKER}<p>two</p>'))
+    monkeypatch.setattr('app.pagination.conversion_cache', cache)
+    client = TestClient(main.app)
+    
+    response = client.get(f'/conversions/{key}/pages/1')
+    assert response.status_code == 200
+    assert response.json()['html'] == '<p>one</p>'
+    assert response.json()['page_count'] == 2
+    
+    assert client.get(f'/conversions/{key}/pages/3').status_code == 404
+    assert client.get('/conversions/unknown/pages/1').status_code == 404
+
+
+@pytest.fixture
+def enabled_cache(tmp_path, monkeypatch):
+    """Replace the shared (disabled) result cache with an enabled one"""
+    cache = ConversionCache(tmp_path / 'shared-cache')
+    for module in ('main', 'app.converters.base', 'app.pagination'):
+        monkeypatch.setattr(f'{module}.conversion_cache', cache)
+    return cache
+
+
+def test_paginated_convert_then_fetch_pages(enabled_cache, monkeypatch):
+    import main
+    from app.parsers.docx_parser import DocxParser
+    
+    monkeypatch.setattr(DocxParser, 'parse', lambda self, source, extract_images=True, progress=None: {
+        'html': f'<p>one</p>{MARKER}<p>two</p>{MARKER}<p>three</p>', 'images': [], 'styles': ''
+    })
+    client = TestClient(main.app)
+    
+    first = client.post('/convert', files={'file': ('a.docx', b'doc')}, data={'paginate': 'true'}).json()
+    assert first['page'] == 1
+    assert first['page_count'] == 3
+    assert first['html'] == '<p>one</p>'
+    assert 'pages' not in first
+    assert first['conversion_id'] == first['metadata']['conversion_id']
+    
+    third = client.get(f"/conversions/{first['conversion_id']}/pages/3").json()
+    assert third['html'] == '<p>three</p>'
+    
+    # Without paginate the whole document is returned, with its id
+    full = client.post('/convert', files={'file': ('a.docx', b'doc')}).json()
+    assert full['html'].startswith('<p>one</p>')
+    assert full['metadata']['conversion_id'] == first['conversion_id']
+
+
+def test_pagination_needs_the_cache(monkeypatch):
+    import main
+    from app.parsers.docx_parser import DocxParser
+    
+    monkeypatch.setattr(DocxParser, 'parse', lambda self, source, extract_images=True, progress=None: {
+        'html': '<p>one</p>', 'images': [], 'styles': ''
+    })
+    client = TestClient(main.app)
+    
+    response = client.post('/convert', files={'file': ('a.docx', b'doc')}, data={'paginate': 'true'})
+    assert response.status_code == 400
+    
+    # No id is handed out for a result that cannot be fetched back
+    response = client.post('/convert', files={'file': ('a.docx', b'doc')})
+    assert 'conversion_id' not in response.json()['metadata']
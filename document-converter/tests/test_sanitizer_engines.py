@@ -0,0 +1,180 @@
+"""The lxml sanitizer engine applies the same policy as the bleach engine"""
+import re
+
+import pytest
+from lxml import html as lxml_html
+
+from app.config import settings
+from app.sanitizers import HTMLSanitizer
+
+CORPUS = [
+    # Typical converter output
+    '<h1>Title</h1><p>Intro with <strong>bold</strong>, <em>italic</em> and <u>underline</u>.</p>',
+    '<p style="text-align: center; margin-left: 0.5in">Centered</p>',
+    '<p><span style="font-weight: bold; color: #ff0000">red</span> text</p>',
+    '<ol start="3"><li>three<ul><li>bullet</li></ul></li><li>four</li></ol>',
+    '<table><thead><tr><td colspan="2"><p>head</p></td></tr></thead>'
+    '<tbody><tr><td rowspan="2"><p>tall</p></td><td><p>x</p></td></tr></tbody></table>',
+    '<table><tr><td>no tbody</td></tr></table>',
+    '<p><img src="/media/ab/cd/abcd.png" srcset="/media/ab/cd/abcd-480.webp 480w" '
+    'sizes="100vw" width="800" height="600" loading="lazy" decoding="async" alt=""></p>',
+    '<p>line<br>break</p><hr><blockquote>quoted</blockquote><pre>  code\n  block</pre>',
+    '<p>a &amp; b &lt; c &gt; d &nbsp; "quotes" \'apostrophes\' é</p>',
+    
+    # Page breaks
+    '<p>one</p><!-- pagebreak --><p>two</p>',
+    '<p>one</p><!-- pagebreak --><!-- pagebreak --><p>two</p><!-- pagebreak -->',
+    '<p><!-- pagebreak --></p><div><!-- pagebreak --></div>',
+    '<p>before</p><!-- a comment --><p>after</p>',
+    
+    # Empty elements
+    '<p></p><div> </div><p>&nbsp;</p><p>\n</p><p><!-- comment only --></p>',
+    '<p><br></p><div><p></p></div><div><span></span></div>',
+    '<div><foo><p></p></foo></div><p><bar></bar></p><p><bar>text</bar></p>',
+    '<p><img src="/media/a.png" alt=""></p>',
+    
+    # Disallowed tags and attributes
+    '<script>alert(1)</script><p>after script</p>',
+    '<style>p { color: red }</style><p>after style</p>',
+    '<custom><nested>text</nested> tail</custom>',
+    '<p onclick="steal()" data-x="1" title="t">handlers</p>',
+    '<h2 id="anchor" class="title" align="center">kept id and class</h2>',
+    
+    # URIs
+    '<a href="https://example.com/?a=1&amp;b=2" title="t" target="_blank" rel="noopener">ok</a>',
+    '<a href="javascript:alert(1)">js</a><a href=" JaVa\tScRiPt:alert(1)">obfuscated</a>',
+    '<a href="#section">anchor</a><a href="/relative/path">relative</a><a href="mailto:a@example.com">mail</a>',
+    '<a href="ftp://example.com/file">ftp</a><a href="vbscript:x">vb</a>',
+    '<img src="data:image/png;base64,AAAA" alt="inline">',
+    
+    # Styles
+    '<p style="color: red; position: fixed; width: 10px; height: 1e3px">mixed</p>',
+    '<p style="width: 50%; margin: -2.5em; padding: calc(1px)">units</p>',
+    '<span style="background-color: url(x); color: expression(alert(1))">unsafe</span>',
+    '<span style="font-family: Arial; COLOR: blue; ; invalid">case and junk</span>',
+    '<div style="">empty style</div><div style="position: absolute">nothing allowed</div>',
+    '<span style="font-family: \'x onmouseover=alert(1) y\'">quoted value</span>',
+    '<p style=\'font-family: "Arial"; color: red\'>double quotes</p>',
+    '<p style="font-family: &quot;Times New Roman&quot;, serif; position: fixed">entity quotes</p>',
+    '<span style="color: red&quot; onclick=&quot;x">escaped breakout</span>',
+    '<span style="font-family: &quot;a&quot;, \'b\'">both quotes</span>',
+    
+    # Whitespace
+    '<ul><li>x</li></ul>\n\n\n<p>y   </p>\n  \n<p>z</p>',
+    'bare text <b>bold</b> more text',
+    '',
+]
+
+
+def canonical(html: str):
+    """Parse sanitizer output into a comparable tree
+    
+    The engines use different HTML parsers, so the corpus sticks to markup
+    both parse the same way (no misnested or misplaced table parts).
+    Serialization details (void-element slashes, attribute order, the
+    tbody html5lib inserts, whitespace runs) do not matter to a browser.
+    """
+    root = lxml_html.fragment_fromstring(html, create_parent='div')
+    for tbody in root.findall('.//tbody'):
+        if not tbody.attrib:
+            tbody.drop_tag()
+    return _node(root)
+
+
+def _node(element):
+    if not isinstance(element.tag, str):
+        return ('#comment', element.text)
+    return (
+        element.tag,
+        sorted(element.attrib.items()),
+        _squash(element.text),
+        [(_node(child), _squash(child.tail)) for child in element]
+    )
+
+
+def _squash(text):
+    return re.sub(r'\s+', ' ', text or '')
+
+
+def make_sanitizer(engine: str) -> HTMLSanitizer:
+    return HTMLSanitizer(
+        settings.DEFAULT_ALLOWED_TAGS,
+        settings.DEFAULT_ALLOWED_ATTRIBUTES,
+        settings.DEFAULT_ALLOWED_STYLES,
+        engine=engine
+    )
+
+
+@pytest.fixture
+def inline_styles(monkeypatch):
+    monkeypatch.setattr(settings, 'SANITIZER_INLINE_STYLES', True)
+
+
+@pytest.mark.parametrize('styles', [False, True])
+@pytest.mark.parametrize('html', CORPUS)
+def test_engines_agree(html, styles, monkeypatch):
+    monkeypatch.setattr(settings, 'SANITIZER_INLINE_STYLES', styles)
+    expected = make_sanitizer('bleach').sanitize(html)
+    actual = make_sanitizer('lxml').sanitize(html)
+    
+    assert canonical(actual) == canonical(expected)
+
+
+def test_engines_agree_without_allowed_styles(inline_styles):
+    for html in CORPUS:
+        engines = [
+            HTMLSanitizer(['p', 'span', 'div'], {'*': ['style']}, [], engine=engine)
+            for engine in ('bleach', 'lxml')
+        ]
+        expected, actual = (sanitizer.sanitize(html) for sanitizer in engines)
+        
+        assert canonical(actual) == canonical(expected)
+
+
+def test_engines_agree_on_whole_document(inline_styles):
+    html = '\n'.join(CORPUS * 20)
+    expected = make_sanitizer('bleach').sanitize(html)
+    actual = make_sanitizer('lxml').sanitize(html)
+    
+    assert canonical(actual) == canonical(expected)
+
+
+@pytest.mark.parametrize('engine', ['bleach', 'lxml'])
+def test_policy_is_applied(engine):
+    html = make_sanitizer(engine).sanitize(
+        '<p style="color: red; position: fixed">a</p><!-- pagebreak -->'
+        '<p></p><a href="javascript:x" onclick="y">b</a><script>c</script>'
+    )
+    
+    # Inline styles are dropped by default, as they always were
+    assert html == (
+        '<p>a</p>\n'
+        f'{settings.PAGEBREAK_MARKER}\n'
+        '<a>b</a>c'
+    )
+
+
+@pytest.mark.parametrize('engine', ['bleach', 'lxml'])
+def test_allowed_styles_are_kept_when_enabled(engine, inline_styles):
+    html = make_sanitizer(engine).sanitize('<p style="color: red; position: fixed">a</p>')
+    
+    assert html == '<p style="color: red">a</p>'
+
+
+@pytest.mark.parametrize('engine', ['bleach', 'lxml'])
+def test_quotes_in_styles_stay_inside_the_attribute(engine, inline_styles):
+    html = make_sanitizer(engine).sanitize(
+        '<span style="font-family: \'x onmouseover=alert(1) y\'">hi</span>'
+        '<p style=\'font-family: "Arial"; color: red\'>a</p>'
+    )
+    root = lxml_html.fragment_fromstring(html, create_parent='div')
+    span, paragraph = root
+    
+    assert dict(span.attrib) == {'style': "font-family: 'x onmouseover=alert(1) y'"}
+    assert dict(paragraph.attrib) == {'style': 'font-family: "Arial"; color: red'}
+
+
+def test_engine_follows_setting(monkeypatch):
+    monkeypatch.setattr(settings, 'SANITIZER_ENGINE', 'lxml')
+    
+    assert HTMLSanitizer([], {}, []).engine == 'lxml'
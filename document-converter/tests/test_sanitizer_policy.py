@@ -0,0 +1,56 @@
+"""Sanitizer policies are compiled once and shared"""
+import pytest
+
+from app.config import settings
+from app.sanitizers import HTMLSanitizer, get_policy
+from app.sanitizers import policy as policy_module
+
+
+def test_equal_whitelists_share_a_policy():
+    policy = get_policy(['p', 'strong', 'em'], {'*': ['class']}, ['color'])
+    
+    assert get_policy([' EM', 'p', 'strong', 'p'], {'*': ['class']}, ['Color']) is policy
+    assert HTMLSanitizer(['em', 'strong', 'p'], {'*': ['class']}, ['color']).policy is policy
+    assert get_policy(['p'], {'*': ['class']}, ['color']) is not policy
+
+
+def test_policy_cache_is_bounded(monkeypatch):
+    monkeypatch.setattr(settings, 'SANITIZER_POLICY_CACHE_SIZE', 2)
+    first = get_policy(['h1'], {}, [])
+    get_policy(['h2'], {}, [])
+    get_policy(['h3'], {}, [])
+    
+    assert len(policy_module._policies) <= 2
+    assert get_policy(['h1'], {}, []) is not first
+
+
+@pytest.mark.parametrize('value', [
+    'javascript:alert(1)',
+    'EXPRESSION (alert(1))',
+    '@import "x.css"',
+    'url (x.png)',
+    'behavior: x',
+    '-moz-binding: x'
+])
+def test_dangerous_values_are_rejected(value):
+    policy = get_policy(['p'], {}, ['color'])
+    
+    assert not policy.validate_css_value('color', value)
+
+
+def test_declarations_are_validated_once(monkeypatch):
+    policy = get_policy(['p'], {'*': ['style']}, ['color', 'width'])
+    calls = []
+    pattern = policy_module.DANGEROUS_CSS_VALUE
+    
+    class CountingPattern:
+        def search(self, value):
+            calls.append(value)
+            return pattern.search(value)
+    
+    monkeypatch.setattr(policy_module, 'DANGEROUS_CSS_VALUE', CountingPattern())
+    policy._declarations.clear()
+    for _ in range(3):
+        assert policy.clean_style('color: red; width: 10px; width: 1e3px') == 'color: red; width: 10px'
+    
+    assert len(calls) == 3
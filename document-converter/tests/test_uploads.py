@@ -0,0 +1,124 @@
+"""Uploads are parsed from Starlette's temp file; only jobs copy them"""
+import hashlib
+import io
+import tempfile
+
+import httpx
+import pytest
+from starlette.datastructures import UploadFile
+
+import main
+from app.config import settings
+from app.converters import DocumentConverter
+from app.parsers.docx_parser import DocxParser
+
+CONTENT = b'not really a docx' * 1000
+
+
+@pytest.fixture
+def parsed_sources(monkeypatch):
+    """Record what the parser is handed and whether TEMP_DIR was used"""
+    sources = []
+    
+    def fake_parse(self, source, extract_images=True, progress=None):
+        source.seek(0)
+        sources.append((type(source), source.read(), list(settings.TEMP_DIR.iterdir())))
+        return {'html': '<p>ok</p>', 'images': [], 'styles': ''}
+    
+    monkeypatch.setattr(DocxParser, 'parse', fake_parse)
+    return sources
+
+
+def make_upload(content: bytes = CONTENT, rolled: bool = False) -> UploadFile:
+    file = tempfile.SpooledTemporaryFile(max_size=len(content) // 2 if rolled else len(content) * 2)
+    file.write(content)
+    file.seek(0)
+    return UploadFile(file=file, filename='a.docx', size=len(content))
+
+
+@pytest.mark.asyncio
+async def test_convert_parses_the_upload_in_place(parsed_sources, monkeypatch):
+    monkeypatch.setattr(settings, 'IN_MEMORY_MAX_SIZE', 100)
+    
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url='http://testserver') as client:
+        response = await client.post('/convert', files={'file': ('a.docx', CONTENT)})
+    
+    assert response.status_code == 200
+    [(source_type, content, temp_files)] = parsed_sources
+    assert source_type is tempfile.SpooledTemporaryFile
+    assert content == CONTENT
+    assert temp_files == []
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize('rolled', [False, True])
+async def test_spool_hashes_without_copying(rolled):
+    upload = make_upload(rolled=rolled)
+    upload.file.read(10)
+    
+    document = await DocumentConverter().spool(upload)
+    
+    assert document['source'] is upload.file
+    assert document['source'].tell() == 0
+    assert document['size'] == len(CONTENT)
+    assert document['content_hash'] == hashlib.sha256(CONTENT).hexdigest()
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize('in_memory_max', [len(CONTENT) * 2, 100])
+async def test_persisted_spool_copies_the_upload(monkeypatch, in_memory_max):
+    monkeypatch.setattr(settings, 'IN_MEMORY_MAX_SIZE', in_memory_max)
+    upload = make_upload()
+    
+    document = await DocumentConverter().spool(upload, persist=True)
+    upload.file.close()
+    
+    try:
+        if isinstance(document['source'], io.BytesIO):
+            assert document['source'].getvalue() == CONTENT
+        else:
+            assert document['source'].read_bytes() == CONTENT
+        assert document['content_hash'] == hashlib.sha256(CONTENT).hexdigest()
+    finally:
+        DocumentConverter.discard(document)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize('declared_size', [len(CONTENT), None])
+async def test_size_limit_is_enforced(monkeypatch, declared_size):
+    monkeypatch.setattr(settings, 'MAX_FILE_SIZE', len(CONTENT) - 1)
+    upload = make_upload()
+    upload.size = declared_size
+    
+    with pytest.raises(ValueError, match='File size exceeds'):
+        await DocumentConverter().spool(upload)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize('path, files', [
+    ('/convert', 1),
+    ('/jobs', 1),
+    ('/convert/batch', 2),
+])
+async def test_oversized_content_length_is_rejected_before_parsing(monkeypatch, parsed_sources, path, files):
+    monkeypatch.setattr(settings, 'MAX_FILE_SIZE', 1000)
+    monkeypatch.setattr(settings, 'BATCH_MAX_FILES', 1)
+    form_parses = []
+    monkeypatch.setattr('starlette.requests.Request.form', lambda *args, **kwargs: form_parses.append(args))
+    content = b'x' * (main.MULTIPART_OVERHEAD + 2000)
+    
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url='http://testserver') as client:
+        response = await client.post(path, files=[('file' if files == 1 else 'files', ('a.docx', content))] * files)
+    
+    assert response.status_code == 413
+    assert 'File size exceeds' in response.json()['detail']
+    assert form_parses == []
+    assert parsed_sources == []
+
+
+def test_upload_limits_cover_multipart_overhead_only():
+    assert main.upload_size_limit('/convert') == settings.MAX_FILE_SIZE + main.MULTIPART_OVERHEAD
+    assert main.upload_size_limit('/convert/batch') == settings.BATCH_MAX_FILES * main.upload_size_limit('/jobs')
+    assert main.upload_size_limit('/conversions/x/pages/1') is None